@@ -0,0 +1,15 @@
+"""
+Gunicorn configuration for Smart Shop E-commerce Platform
+
+Loaded automatically by `gunicorn project.wsgi` (see Procfile).
+"""
+
+import os
+
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges from the shared Prometheus directory."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
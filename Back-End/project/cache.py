@@ -0,0 +1,277 @@
+"""
+Two-tier Cache for Smart Shop E-commerce Platform
+
+    L1  in-process LRU with TTL (per worker, bounded, microsecond hits)
+    L2  settings.TIERED_CACHE["L2"] cache alias, "shared" by default:
+        Redis with REDIS_URL, a directory with SHARED_CACHE_DIR, otherwise a
+        LocMem stand-in (single process: development and tests)
+
+`tiered_cache.get_or_set(key, compute, ttl)` protects expensive rebuilds
+against stampedes:
+
+    - probabilistic early expiry (XFetch): each reader may volunteer to
+      rebuild shortly before expiry, with a probability that grows as expiry
+      approaches and with how long the last rebuild took, so one request
+      refreshes a hot key while everyone else keeps getting hits
+    - single-flight: within a worker, concurrent callers for a key share one
+      rebuild (a per-key lock); across workers, only the holder of a short
+      L2 lock (cache.add) rebuilds. The others serve the previous value,
+      kept in L2 for STALE_TTL seconds past expiry, or wait for the
+      winner's result when there is none.
+
+L1 entries live at most L1_TTL seconds, which bounds how long a worker can
+serve a value another worker has already replaced. Keys should embed
+whatever identifies the data version (e.g. an ETag from store/conditional.py)
+so a write simply moves readers to a new key.
+
+Usable from any app:
+
+    from project.cache import tiered_cache
+    data = tiered_cache.get_or_set(f"shop-view:{etag}", build, ttl=300)
+"""
+
+import math
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import record_cache
+
+DEFAULTS = {
+    "L2": "shared",
+    "L1_MAX_ENTRIES": 512,
+    "L1_TTL": 5,
+    "STALE_TTL": 60,
+    "LOCK_TIMEOUT": 10,
+    "BETA": 1.0,
+}
+
+# Delete a lock only if it still holds our token
+RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def release_lock(cache, lock_key, token):
+    """
+    Delete `lock_key` from `cache` if it still holds `token`. Tokens must be
+    ints (secrets.randbits(63)): RedisCache stores ints raw but pickles
+    strings, and the Lua compare works on the raw value.
+    """
+    redis_cache = getattr(cache, "_cache", None)
+    if redis_cache is not None and hasattr(redis_cache, "get_client"):
+        client = redis_cache.get_client(lock_key, write=True)
+        client.eval(RELEASE_LUA, 1, cache.make_and_validate_key(lock_key), token)
+    elif cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+def get_tiered_config():
+    return {**DEFAULTS, **getattr(settings, "TIERED_CACHE", {})}
+
+
+class LRUCache:
+    """Thread-safe LRU map whose entries also expire after a TTL."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """L1 LRU in front of an L2 Django cache, with stampede-safe get_or_set."""
+
+    def __init__(self, alias=None, namespace="tiered"):
+        config = get_tiered_config()
+        self.alias = alias
+        self.namespace = namespace
+        self.l1 = LRUCache(config["L1_MAX_ENTRIES"])
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    @property
+    def l2(self):
+        return caches[self.alias or get_tiered_config()["L2"]]
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    # Entries are (value, expires_at, rebuild_seconds); expires_at is wall-clock
+    # so every worker agrees on it.
+
+    def _get_entry(self, key):
+        entry = self.l1.get(key)
+        if entry is not None:
+            record_cache("tiered_l1", hit=True)
+            return entry
+        record_cache("tiered_l1", hit=False)
+
+        entry = self.l2.get(key)
+        record_cache("tiered_l2", hit=entry is not None)
+        if entry is not None:
+            self._fill_l1(key, entry)
+        return entry
+
+    def _fill_l1(self, key, entry):
+        remaining = entry[1] - time.time()
+        if remaining > 0:
+            self.l1.set(key, entry, min(remaining, get_tiered_config()["L1_TTL"]))
+
+    def _store(self, key, value, ttl, rebuild_seconds):
+        config = get_tiered_config()
+        entry = (value, time.time() + ttl, rebuild_seconds)
+        self.l2.set(key, entry, timeout=ttl + config["STALE_TTL"])
+        self._fill_l1(key, entry)
+        return entry
+
+    # -------------------------------------------------------------------------
+    # public API
+    # -------------------------------------------------------------------------
+
+    def get(self, key, default=None):
+        entry = self._get_entry(self._key(key))
+        if entry is None or entry[1] <= time.time():
+            return default
+        return entry[0]
+
+    def is_fresh(self, key):
+        """Whether `key` has an unexpired value, without recording a lookup."""
+        key = self._key(key)
+        entry = self.l1.get(key)
+        if entry is None:
+            entry = self.l2.get(key)
+            if entry is not None:
+                self._fill_l1(key, entry)
+        return entry is not None and entry[1] > time.time()
+
+    def set(self, key, value, ttl):
+        self._store(self._key(key), value, ttl, 0.0)
+
+    def delete(self, key):
+        key = self._key(key)
+        self.l1.delete(key)
+        self.l2.delete(key)
+
+    def get_or_set(self, key, compute, ttl, beta=None):
+        """
+        Return the cached value for `key`, calling `compute()` (at most once
+        per worker, and normally once across workers) when it needs a rebuild.
+        """
+        config = get_tiered_config()
+        beta = config["BETA"] if beta is None else beta
+        key = self._key(key)
+
+        entry = self._get_entry(key)
+        if entry is not None and not self._should_rebuild(entry, beta):
+            return entry[0]
+
+        flight = self._flight_lock(key)
+        # With something to serve (fresh or stale) never wait for another thread
+        if entry is not None:
+            acquired = flight.acquire(blocking=False)
+        else:
+            acquired = flight.acquire(timeout=config["LOCK_TIMEOUT"])
+        if not acquired:
+            return entry[0] if entry is not None else compute()
+        try:
+            # The thread we waited for may have stored a newer value meanwhile
+            current = self.l1.get(key) or self.l2.get(key)
+            if current is not None and current[1] > (entry[1] if entry else time.time()):
+                return current[0]
+            return self._rebuild_across_workers(key, compute, ttl, entry, config)
+        finally:
+            flight.release()
+            with self._flights_lock:
+                if self._flights.get(key) is flight and not flight.locked():
+                    del self._flights[key]
+
+    def _should_rebuild(self, entry, beta):
+        # XFetch: rebuild early with probability rising towards expires_at
+        _, expires_at, rebuild_seconds = entry
+        now = time.time()
+        if now >= expires_at:
+            return True
+        if not rebuild_seconds or not beta:
+            return False
+        return now - rebuild_seconds * beta * math.log(random.random() or 1e-12) >= expires_at
+
+    def _flight_lock(self, key):
+        with self._flights_lock:
+            lock = self._flights.get(key)
+            if lock is None:
+                lock = self._flights[key] = threading.Lock()
+            return lock
+
+    def _rebuild_across_workers(self, key, compute, ttl, stale, config):
+        lock_key = f"{key}:lock"
+        lock_timeout = config["LOCK_TIMEOUT"]
+        # An int is stored as-is by RedisCache, so the Lua script can compare it
+        token = secrets.randbits(63)
+        if not self.l2.add(lock_key, token, timeout=lock_timeout):
+            token = None
+            if stale is not None:
+                return stale[0]
+            # Nothing to serve yet: wait for the worker that holds the lock
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = self.l2.get(key)
+                if entry is not None:
+                    self._fill_l1(key, entry)
+                    return entry[0]
+            # Lock holder died or is very slow; build it ourselves
+
+        try:
+            start = time.perf_counter()
+            value = compute()
+            self._store(key, value, ttl, time.perf_counter() - start)
+            return value
+        finally:
+            if token is not None:
+                self._release_lock(lock_key, token)
+
+    def _release_lock(self, lock_key, token):
+        # A rebuild slower than LOCK_TIMEOUT may find the lock already taken
+        # over by another worker; leave that one alone
+        release_lock(self.l2, lock_key, token)
+
+
+tiered_cache = TieredCache()
@@ -0,0 +1,172 @@
+"""
+Request Coalescing for Smart Shop E-commerce Platform
+
+@coalesce() makes concurrent identical GET requests share one execution of
+the view. Requests are identical when they hit the same view with the same
+URL arguments, the same query parameters (order-insensitive) and the same
+auth class (anonymous / authenticated / staff).
+
+    - within a worker, the first request runs the view; the others wait on
+      an Event and replay its result
+    - across workers, the running request also holds a short lock in the
+      REQUEST_COALESCE_CACHE alias ("shared"); requests in other workers
+      that find the lock poll for the holder's result instead of running
+      the view themselves
+
+Only successful (200) DRF responses are shared; followers replay the data,
+status and headers into a fresh Response. If the leader fails or times out
+the followers simply run the view themselves.
+
+Views that serve a tiered_cache entry (project/cache.py) pass its key as
+`tiered_key` (a string, or a callable taking the view's arguments): while
+that entry is fresh in L1 or L2 the view runs directly, without touching
+the shared-cache lock, and coalescing only kicks in on a miss.
+
+Only use it on views whose output depends on nothing but the key above,
+e.g. the public catalog listings. Place it below @permission_classes and
+@throttle_classes so it sees the authenticated DRF request.
+"""
+
+import hashlib
+import secrets
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from .cache import release_lock, tiered_cache
+from .metrics import record_cache
+
+# Query parameters that never change the payload
+IGNORED_PARAMS = {"__profile"}
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot = None
+
+
+def coalesce_key(request, view_name, args=(), kwargs=None):
+    """Key for `request`: view, URL args, sorted query params and auth class."""
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        if key not in IGNORED_PARAMS
+        for value in request.query_params.getlist(key)
+    )
+    user = request.user
+    if user and user.is_staff:
+        auth = "staff"
+    elif user and user.is_authenticated:
+        auth = "user"
+    else:
+        auth = "anon"
+    raw = "|".join([
+        view_name,
+        auth,
+        repr(args),
+        repr(sorted((kwargs or {}).items())),
+        urlencode(params),
+    ])
+    return hashlib.sha1(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def _snapshot(response):
+    if not isinstance(response, Response) or response.status_code != 200 or response.exception:
+        return None
+    return response.status_code, response.data, dict(response.items())
+
+
+def _replay(snapshot):
+    status_code, data, headers = snapshot
+    return Response(data, status=status_code, headers=headers)
+
+
+def _run_across_workers(key, call):
+    """
+    Run `call` unless another worker is already running it for `key`.
+    Returns (response, snapshot, shared) where `shared` means replayed.
+    """
+    cache = caches[getattr(settings, "REQUEST_COALESCE_CACHE", "shared")]
+    timeout = getattr(settings, "REQUEST_COALESCE_TIMEOUT", 5)
+    lock_key = f"coalesce:lock:{key}"
+
+    token = secrets.randbits(63)
+    if not cache.add(lock_key, token, timeout=timeout):
+        # Wait for the holder's result, published under its own token
+        holder = cache.get(lock_key)
+        deadline = time.monotonic() + timeout
+        while holder and time.monotonic() < deadline:
+            time.sleep(0.02)
+            snapshot = cache.get(f"coalesce:result:{holder}")
+            if snapshot is not None:
+                return _replay(snapshot), snapshot, True
+            if cache.get(lock_key) != holder:
+                break
+        response = call()
+        return response, _snapshot(response), False
+
+    try:
+        response = call()
+        snapshot = _snapshot(response)
+        if snapshot is not None:
+            cache.set(f"coalesce:result:{token}", snapshot, timeout=timeout)
+        return response, snapshot, False
+    finally:
+        # A view slower than the lock timeout may find the lock taken over
+        # by another worker; leave that one alone
+        release_lock(cache, lock_key, token)
+
+
+def coalesce(view_name=None, tiered_key=None):
+    """Share one in-flight execution between identical concurrent GET requests."""
+
+    def decorator(view_func):
+        name = view_name or f"{view_func.__module__}.{view_func.__name__}"
+
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view_func(request, *args, **kwargs)
+
+            if tiered_key is not None:
+                cached = tiered_key(request, *args, **kwargs) if callable(tiered_key) else tiered_key
+                if tiered_cache.is_fresh(cached):
+                    return view_func(request, *args, **kwargs)
+
+            key = coalesce_key(request, name, args, kwargs)
+            with _flights_lock:
+                flight = _flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _flights[key] = _Flight()
+
+            if not leader:
+                timeout = getattr(settings, "REQUEST_COALESCE_TIMEOUT", 5)
+                if flight.done.wait(timeout) and flight.snapshot is not None:
+                    record_cache("coalesce", hit=True)
+                    return _replay(flight.snapshot)
+                return view_func(request, *args, **kwargs)
+
+            try:
+                response, flight.snapshot, shared = _run_across_workers(
+                    key, lambda: view_func(request, *args, **kwargs)
+                )
+                record_cache("coalesce", hit=shared)
+                return response
+            finally:
+                with _flights_lock:
+                    _flights.pop(key, None)
+                flight.done.set()
+
+        return inner
+
+    return decorator
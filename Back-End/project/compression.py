@@ -0,0 +1,243 @@
+"""
+Response Compression for Smart Shop E-commerce Platform
+
+WhiteNoise already serves pre-compressed static files, but API payloads
+(product lists, shop view, admin order lists) went out as plain JSON.
+CompressionMiddleware negotiates the best encoding from Accept-Encoding:
+
+    zstd  → requires the optional `zstandard` package
+    br    → requires the optional `brotli` (or `brotlicffi`) package
+    gzip  → always available (stdlib zlib)
+
+Behaviour is driven by settings.API_COMPRESSION:
+    MIN_SIZE   Responses smaller than this many bytes are left untouched
+    ENCODINGS  Server preference order, first accepted + available wins
+    LEVELS     Per content-type levels; types not listed are never compressed
+
+HTML is deliberately not listed: compressing pages that mix a secret (the
+CSRF token) with reflected input leaks the secret through the compressed
+size (BREACH). For the same reason a response that sets the CSRF cookie,
+or whose view asked for the CSRF token, is never compressed.
+
+Streaming responses are compressed chunk by chunk and flushed after every
+chunk, so clients keep receiving data incrementally.
+"""
+
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+DEFAULT_COMPRESSION = {
+    "MIN_SIZE": 1024,
+    "ENCODINGS": ["zstd", "br", "gzip"],
+    "LEVELS": {
+        "application/json": {"zstd": 3, "br": 4, "gzip": 6},
+        "application/javascript": {"zstd": 3, "br": 4, "gzip": 6},
+        "text/css": {"zstd": 3, "br": 4, "gzip": 6},
+        "text/csv": {"zstd": 6, "br": 5, "gzip": 6},
+    },
+}
+
+
+# =============================================================================
+# CODECS
+# Every compressor exposes compress(data), flush() and finish() so the
+# middleware can treat all encodings the same way.
+# =============================================================================
+
+
+class _GzipCompressor:
+    def __init__(self, level):
+        # wbits=31 → gzip container (16) with a 32K window (15)
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class _BrotliCompressor:
+    def __init__(self, level):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+    def finish(self):
+        return self._obj.finish()
+
+
+class _ZstdCompressor:
+    def __init__(self, level):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._obj.compress(data)
+
+    def flush(self):
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._obj.flush()
+
+
+CODECS = {"gzip": _GzipCompressor}
+if brotli is not None:
+    CODECS["br"] = _BrotliCompressor
+if zstandard is not None:
+    CODECS["zstd"] = _ZstdCompressor
+
+
+def parse_accept_encoding(header):
+    """Return {coding: q} for every coding the client accepts (q > 0)."""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return {coding: q for coding, q in accepted.items() if q > 0}
+
+
+def get_compression_config():
+    config = dict(DEFAULT_COMPRESSION)
+    config.update(getattr(settings, "API_COMPRESSION", {}))
+    return config
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Negotiated zstd / brotli / gzip compression for API responses.
+    Place it right after WhiteNoiseMiddleware so it sees the final body.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        config = get_compression_config()
+        self.min_size = config["MIN_SIZE"]
+        self.encodings = [e for e in config["ENCODINGS"] if e in CODECS]
+        self.levels = config["LEVELS"]
+
+    def _levels_for(self, content_type):
+        media_type = content_type.split(";")[0].strip().lower()
+        return self.levels.get(media_type)
+
+    @staticmethod
+    def _carries_csrf_token(request, response):
+        # get_token() marks the request when a view renders the token
+        return (
+            request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+            or settings.CSRF_COOKIE_NAME in response.cookies
+        )
+
+    def _negotiate(self, request, levels):
+        accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        wildcard = accepted.get("*", 0)
+        best, best_q = None, 0
+        for encoding in self.encodings:
+            if encoding not in levels:
+                continue
+            q = accepted.get(encoding, wildcard)
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or response.status_code == 206:
+            return response
+
+        levels = self._levels_for(response.get("Content-Type", ""))
+        if levels is None or self._carries_csrf_token(request, response):
+            return response
+
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        # The body now depends on the request's Accept-Encoding
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = self._negotiate(request, levels)
+        if encoding is None:
+            return response
+
+        codec = CODECS[encoding]
+        level = levels[encoding]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._compress_async(
+                    response.streaming_content, codec(level)
+                )
+            else:
+                response.streaming_content = self._compress_stream(
+                    response.streaming_content, codec(level)
+                )
+            del response.headers["Content-Length"]
+        else:
+            compressor = codec(level)
+            compressed = compressor.compress(response.content) + compressor.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # A strong ETag must not survive a change of representation
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+
+        response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _compress_stream(chunks, compressor):
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    @staticmethod
+    async def _compress_async(chunks, compressor):
+        async for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
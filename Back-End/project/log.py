@@ -0,0 +1,135 @@
+"""
+Logging Helpers for Smart Shop E-commerce Platform
+
+Used from settings.LOGGING:
+
+    QueueHandler     the only handler loggers write to. Records go onto a
+                     bounded in-memory queue; a QueueListener thread feeds
+                     the real console / file handlers, so slow disk I/O on
+                     the log volume never blocks a request thread. When the
+                     queue is full, records are dropped (and counted) rather
+                     than waited on.
+    JsonFormatter    one JSON object per line (LOG_FORMAT=json) for log
+                     shippers; `extra={...}` fields are included.
+    SamplingFilter   keeps a fraction of INFO-and-below records from
+                     high-volume loggers such as `store.activity`;
+                     warnings and errors always pass.
+
+The QueueHandler relies on dictConfig's built-in queue support (Python
+3.12+): its "handlers" list names the handlers the listener writes to.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else came in through `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_exception_formatter = logging.Formatter()
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Non-blocking queue handler that starts its listener on first use."""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.listener = None  # set by dictConfig
+        self.dropped = 0
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # The pid check restarts the thread in workers forked after startup
+        if self.listener is None or self._listener_pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self.listener._thread = None
+            self.listener.start()
+            if self._listener_pid is None:
+                atexit.register(self.stop_listener)
+            self._listener_pid = os.getpid()
+
+    def stop_listener(self):
+        """Flush whatever is still queued (runs at interpreter exit)."""
+        if self.listener is not None and self._listener_pid == os.getpid():
+            self.listener.stop()
+            self._listener_pid = None
+
+    def prepare(self, record):
+        # The base class folds the traceback into msg and drops exc_info, so
+        # formatters on the listener side could no longer tell them apart.
+        # Keep the rendered traceback in exc_text, which Formatter.format and
+        # JsonFormatter both read.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        self._ensure_listener()
+        super().emit(record)
+
+
+def bounded_queue(maxsize=10000):
+    """Queue factory for dictConfig: {"()": "project.log.bounded_queue"}."""
+    return queue.Queue(maxsize)
+
+
+class JsonFormatter(logging.Formatter):
+    """Render records as single-line JSON."""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "process": record.process,
+            "thread": record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Pass `rate` of the INFO (and lower) records; warnings and above always pass."""
+
+    def __init__(self, rate=1.0, name=""):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        if random.random() < self.rate:
+            record.sample_rate = self.rate
+            return True
+        return False
@@ -0,0 +1,148 @@
+"""
+Prometheus Metrics for Smart Shop E-commerce Platform
+
+Exposes an internal `/metrics` endpoint in the Prometheus text format:
+
+    http_request_duration_seconds{route,method}     latency histogram
+    http_responses_total{route,method,status}       status codes
+    http_request_db_queries{route}                  queries per request
+    cache_requests_total{cache,result}              hit / miss per cache
+    orders_created_total                            successful checkouts
+    checkout_failures_total{reason}                 e.g. reason="stock"
+    emails_queued_total{kind}                       activation / reset mails
+    email_failures_total{kind}
+
+`route` is the URL name from store/urls.py / users/urls.py, so labels stay
+bounded no matter how many product ids or slugs are requested.
+
+Multiprocess mode (gunicorn with several workers): set the environment
+variable PROMETHEUS_MULTIPROC_DIR to an empty shared directory before the
+workers start; gunicorn.conf.py cleans up after dead workers.
+
+Access must be configured explicitly, otherwise every scrape gets a 403:
+    METRICS_TOKEN        requests must carry `Authorization: Bearer <token>`
+    METRICS_ALLOWED_IPS  source addresses (REMOTE_ADDR) allowed without a
+                         token; behind a reverse proxy on the same host
+                         REMOTE_ADDR is the proxy's, so use the token there
+"""
+
+import hmac
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.cache import never_cache
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+# =============================================================================
+# METRIC DEFINITIONS
+# =============================================================================
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "API request latency by route",
+    ["route", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+RESPONSES = Counter(
+    "http_responses_total",
+    "API responses by route and status code",
+    ["route", "method", "status"],
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL queries executed per request",
+    ["route"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by cache and result (hit / miss)",
+    ["cache", "result"],
+)
+
+ORDERS_CREATED = Counter("orders_created_total", "Orders successfully created")
+CHECKOUT_FAILURES = Counter(
+    "checkout_failures_total", "Checkout attempts that failed", ["reason"]
+)
+EMAILS_QUEUED = Counter("emails_queued_total", "Transactional emails queued", ["kind"])
+EMAIL_FAILURES = Counter("email_failures_total", "Transactional emails that failed", ["kind"])
+
+
+def record_cache(cache, hit):
+    """Count one cache lookup; hit ratio = hit / (hit + miss)."""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+
+class MetricsMiddleware:
+    """
+    Time every request and label it by URL name.
+    Must sit ABOVE QueryBudgetMiddleware, which provides request.db_queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, "resolver_match", None)
+        route = (match.url_name or match.view_name) if match else "unmatched"
+        if route == "metrics":
+            return response
+
+        REQUEST_LATENCY.labels(route=route, method=request.method).observe(elapsed)
+        RESPONSES.labels(
+            route=route, method=request.method, status=str(response.status_code)
+        ).inc()
+        db_queries = getattr(request, "db_queries", None)
+        if db_queries is not None:
+            DB_QUERIES.labels(route=route).observe(db_queries)
+        return response
+
+
+# =============================================================================
+# ENDPOINT
+# =============================================================================
+
+
+def _is_allowed(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if token:
+        supplied = request.META.get("HTTP_AUTHORIZATION", "")
+        return hmac.compare_digest(supplied, f"Bearer {token}")
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", [])
+    return request.META.get("REMOTE_ADDR") in allowed_ips
+
+
+@never_cache
+def metrics_view(request):
+    """Prometheus scrape target (internal only)."""
+    if not _is_allowed(request):
+        return HttpResponseForbidden("Forbidden")
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Aggregate the per-worker files instead of this worker's memory
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,256 @@
+"""
+On-demand Request Profiling for Smart Shop E-commerce Platform
+
+ProfilingMiddleware runs selected requests under a profiler and writes the
+result to settings.PROFILING_DIR, next to a `.sql.json` file listing every
+query the request ran (fingerprint, duration, offset into the request).
+
+A request is profiled when either:
+    - it carries a signed token from `manage.py profile_token`, as
+      `?__profile=<token>` or `X-Profile: <token>` (admin-only by
+      construction: minting a token needs SECRET_KEY)
+    - it is picked by sampling, 1 in PROFILING_SAMPLE_RATE requests
+
+PROFILING_FORMAT selects the output:
+    pstats      cProfile stats (`python -m pstats`, snakeviz)
+    speedscope  evented flamechart for https://www.speedscope.app, with each
+                SQL query shown as a `SQL: <fingerprint>` frame
+
+With PROFILING_ENABLED False the middleware removes itself at startup
+(MiddlewareNotUsed), so a disabled profiler costs nothing per request.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signing import BadSignature, TimestampSigner
+from django.db import connection
+
+from .query_budget import fingerprint
+
+logger = logging.getLogger("project.profiling")
+
+PROFILE_PARAM = "__profile"
+PROFILE_HEADER = "HTTP_X_PROFILE"
+
+_signer = TimestampSigner(salt="project.profiling")
+
+# Only one profiler can be active per process; concurrent requests just run
+_lock = threading.Lock()
+
+
+def make_profile_token():
+    """Token accepted by ProfilingMiddleware for PROFILING_TOKEN_MAX_AGE seconds."""
+    return _signer.sign("profile")
+
+
+def _valid_token(value):
+    try:
+        return _signer.unsign(
+            value, max_age=getattr(settings, "PROFILING_TOKEN_MAX_AGE", 3600)
+        ) == "profile"
+    except BadSignature:
+        return False
+
+
+# =============================================================================
+# SPEEDSCOPE TRACER
+# =============================================================================
+
+
+class SpeedscopeTracer:
+    """sys.setprofile hook recording open/close events in speedscope's evented format."""
+
+    def __init__(self):
+        self.frames = []
+        self.frame_index = {}
+        self.events = []
+        self.stack = []
+        self.start = None
+
+    def _frame(self, key, name, file=None, line=None):
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            frame = {"name": name}
+            if file:
+                frame.update(file=file, line=line)
+            self.frames.append(frame)
+        return index
+
+    def _open(self, index):
+        self.stack.append(index)
+        self.events.append({"type": "O", "frame": index, "at": self._now()})
+
+    def _close(self):
+        if self.stack:
+            index = self.stack.pop()
+            self.events.append({"type": "C", "frame": index, "at": self._now()})
+
+    def _now(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def __call__(self, frame, event, arg):
+        if frame.f_code in _TRACER_CODE:
+            # mark()/unmark() are called from traced code; keep them invisible
+            return
+        if event == "call":
+            code = frame.f_code
+            name = getattr(code, "co_qualname", code.co_name)
+            self._open(self._frame(code, name, code.co_filename, code.co_firstlineno))
+        elif event == "c_call":
+            name = getattr(arg, "__qualname__", None) or repr(arg)
+            module = getattr(arg, "__module__", None)
+            self._open(self._frame(("c", module, name), f"{module}.{name}" if module else name))
+        elif event in ("return", "c_return", "c_exception"):
+            self._close()
+
+    def mark(self, name):
+        """Open a synthetic frame (closed with unmark), e.g. around a query."""
+        self._open(self._frame(("mark", name), name))
+
+    def unmark(self):
+        self._close()
+
+    def enable(self):
+        self.start = time.perf_counter()
+        sys.setprofile(self)
+
+    def disable(self):
+        sys.setprofile(None)
+        while self.stack:
+            self._close()
+
+    def dump(self, path, name):
+        end = self.events[-1]["at"] if self.events else 0
+        document = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "smart-shop",
+            "shared": {"frames": self.frames},
+            "profiles": [{
+                "type": "evented",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": end,
+                "events": self.events,
+            }],
+        }
+        with open(path, "w") as fh:
+            json.dump(document, fh)
+
+
+_TRACER_CODE = {
+    method.__code__
+    for method in (
+        SpeedscopeTracer.mark,
+        SpeedscopeTracer.unmark,
+        SpeedscopeTracer._open,
+        SpeedscopeTracer._close,
+        SpeedscopeTracer._frame,
+        SpeedscopeTracer._now,
+    )
+}
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+
+class ProfilingMiddleware:
+    """Profile token-bearing or sampled requests; absent entirely when disabled."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0)
+        self.output_format = getattr(settings, "PROFILING_FORMAT", "pstats")
+        self.directory = getattr(settings, "PROFILING_DIR", "profiles")
+
+    def __call__(self, request):
+        if not self._should_profile(request) or not _lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request)
+        finally:
+            _lock.release()
+
+    def _should_profile(self, request):
+        token = request.GET.get(PROFILE_PARAM) or request.META.get(PROFILE_HEADER)
+        if token:
+            return _valid_token(token)
+        return bool(self.sample_rate) and random.randrange(self.sample_rate) == 0
+
+    def _profile(self, request):
+        if self.output_format == "speedscope":
+            profiler = SpeedscopeTracer()
+        else:
+            profiler = cProfile.Profile()
+
+        queries = []
+        start = time.perf_counter()
+
+        def time_query(execute, sql, params, many, context):
+            mark = isinstance(profiler, SpeedscopeTracer)
+            query_start = time.perf_counter()
+            if mark:
+                profiler.mark(f"SQL: {fingerprint(sql)[:120]}")
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if mark:
+                    profiler.unmark()
+                queries.append({
+                    "sql": fingerprint(sql),
+                    "at_ms": round((query_start - start) * 1000, 3),
+                    "ms": round((time.perf_counter() - query_start) * 1000, 3),
+                })
+
+        with connection.execute_wrapper(time_query):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        match = getattr(request, "resolver_match", None)
+        route = (match.url_name if match else None) or "unmatched"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{route}-{duration_ms:.0f}ms-{uuid.uuid4().hex[:6]}"
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, name)
+            if isinstance(profiler, SpeedscopeTracer):
+                profiler.dump(f"{base}.speedscope.json", f"{request.method} {request.path}")
+            else:
+                profiler.dump_stats(f"{base}.prof")
+            with open(f"{base}.sql.json", "w") as fh:
+                json.dump({
+                    "method": request.method,
+                    "path": request.path,
+                    "route": route,
+                    "status": response.status_code,
+                    "duration_ms": round(duration_ms, 3),
+                    "db_ms": round(sum(q["ms"] for q in queries), 3),
+                    "queries": queries,
+                }, fh, indent=2)
+        except OSError:
+            logger.exception("Could not write profile %s", name)
+            return response
+
+        logger.info("Profiled %s %s in %.1fms -> %s", request.method, request.path, duration_ms, name)
+        response["X-Profile"] = name
+        return response
@@ -0,0 +1,195 @@
+"""
+Per-request SQL Query Budget for Smart Shop E-commerce Platform
+
+QueryBudgetMiddleware wraps every request in `connection.execute_wrapper`
+and records:
+    - query count and total DB time
+    - normalized SQL fingerprints, so repeated shapes (N+1 fan-outs such as
+      per-product `reviews`/`images` lookups) are reported together
+
+Results are emitted as response headers and in the `project.queries` log:
+    X-DB-Queries:  <count>
+    Server-Timing: db;dur=<ms>;desc="<count> queries"
+
+Each view (by URL name) has a query budget from settings.QUERY_BUDGETS,
+falling back to QUERY_BUDGET_DEFAULT. Exceeding it logs a warning in
+production and raises QueryBudgetExceeded when QUERY_BUDGET_RAISE is True
+(tests). QueryBudgetTestMixin gives test cases the same check per endpoint.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+logger = logging.getLogger("project.queries")
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN \((?:\?|%s)(?:, (?:\?|%s))*\)")
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view runs more queries than its budget allows."""
+
+
+def fingerprint(sql):
+    """Normalize SQL so queries differing only in literals share a key."""
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+# Fallbacks when settings.QUERY_BUDGET_DEFAULT / QUERY_N1_THRESHOLD are unset
+DEFAULT_BUDGET = 30
+DEFAULT_N1_THRESHOLD = 5
+
+
+def budget_for(url_name):
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return budgets.get(url_name, getattr(settings, "QUERY_BUDGET_DEFAULT", DEFAULT_BUDGET))
+
+
+def duplicate_fingerprints(fingerprints):
+    """Fingerprints repeated at least QUERY_N1_THRESHOLD times."""
+    threshold = getattr(settings, "QUERY_N1_THRESHOLD", DEFAULT_N1_THRESHOLD)
+    return {fp: n for fp, n in Counter(fingerprints).items() if n >= threshold}
+
+
+class QueryRecorder:
+    """execute_wrapper that collects timing and fingerprints per query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints.append(fingerprint(sql))
+
+
+# =============================================================================
+# MIDDLEWARE
+# =============================================================================
+
+
+class QueryBudgetMiddleware:
+    """Count queries per request and enforce per-view budgets."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        duration_ms = recorder.duration * 1000
+        response["X-DB-Queries"] = str(recorder.count)
+        timing = f'db;dur={duration_ms:.2f};desc="{recorder.count} queries"'
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+
+        # Other instrumentation (metrics, profiling) reads the totals from here
+        request.db_queries = recorder.count
+        request.db_time = recorder.duration
+
+        match = getattr(request, "resolver_match", None)
+        url_name = match.url_name if match else None
+        duplicates = duplicate_fingerprints(recorder.fingerprints)
+
+        logger.debug(
+            "%s %s [%s] %d queries in %.2fms",
+            request.method, request.path, url_name, recorder.count, duration_ms,
+        )
+        for sql, repeats in duplicates.items():
+            logger.warning(
+                "Possible N+1 in %s: %d x %s", url_name or request.path, repeats, sql
+            )
+
+        if url_name is not None:
+            budget = budget_for(url_name)
+            if recorder.count > budget:
+                message = (
+                    f"{url_name} ran {recorder.count} queries "
+                    f"(budget {budget}) for {request.method} {request.path}"
+                )
+                if getattr(settings, "QUERY_BUDGET_RAISE", False):
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+
+        return response
+
+
+# =============================================================================
+# TEST HELPERS
+# =============================================================================
+
+
+def iter_url_names(patterns=None):
+    """Yield every named route in the project, e.g. to check budget coverage."""
+    if patterns is None:
+        patterns = get_resolver().url_patterns
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            yield pattern.name
+
+
+class QueryBudgetTestMixin:
+    """
+    Mixin for django.test.TestCase.
+
+        self.assertQueryBudget("products")
+        self.assertQueryBudget("user-order", args=[order.id], user=customer)
+        self.assertQueryBudget("orders-add", method="post", status_code=201, ...)
+
+    A response with another status fails the test: an error page usually
+    runs far fewer queries than the real thing.
+    """
+
+    def assertQueryBudget(self, url_name, args=None, method="get", user=None,
+                          data=None, budget=None, status_code=200, **extra):
+        from django.test.utils import CaptureQueriesContext, override_settings
+        from rest_framework_simplejwt.tokens import RefreshToken
+
+        if user is not None:
+            token = RefreshToken.for_user(user).access_token
+            extra["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        if method != "get":
+            extra.setdefault("content_type", "application/json")
+        url = reverse(url_name, args=args)
+        budget = budget_for(url_name) if budget is None else budget
+
+        with override_settings(QUERY_BUDGET_RAISE=False):
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(self.client, method)(url, data=data, **extra)
+
+        self.assertEqual(
+            response.status_code, status_code,
+            f"{url_name}: status {response.status_code}, expected {status_code}",
+        )
+        count = len(captured.captured_queries)
+        if count > budget:
+            repeated = duplicate_fingerprints(
+                fingerprint(q["sql"]) for q in captured.captured_queries
+            )
+            details = "\n".join(f"  {n} x {sql}" for sql, n in repeated.items())
+            self.fail(
+                f"{url_name}: {count} queries, budget is {budget}\n{details}"
+            )
+        return response
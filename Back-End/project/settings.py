@@ -62,7 +62,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "project.metrics.MetricsMiddleware",
+    "project.query_budget.QueryBudgetMiddleware",
+    "project.profiling.ProfilingMiddleware",
+    "project.slow_queries.SlowQueryMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "project.compression.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -154,6 +159,224 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Serve MEDIA_URL from Django outside DEBUG (no web server / CDN in front)
+SERVE_MEDIA = os.environ.get("SERVE_MEDIA", "False").lower() in ("true", "1", "yes")
+
+# store/images.py: resized copies of product images, generated in a thread
+# pool after the upload commits and stored under MEDIA_ROOT/<PATH>/
+IMAGE_DERIVATIVES = {
+    "ENABLED": os.environ.get("IMAGE_DERIVATIVES", "True").lower() in ("true", "1", "yes"),
+    "SIZES": {"thumb": (150, 150), "card": (400, 400), "detail": (1024, 1024)},
+    "FORMATS": {
+        "webp": {"quality": 80, "method": 4},
+        "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+    },
+    "WORKERS": int(os.environ.get("IMAGE_DERIVATIVE_WORKERS", "2")),
+    "PATH": "derivatives",
+}
+
+# project/uploads.py: files stay in memory up to FILE_UPLOAD_MAX_MEMORY_SIZE,
+# then spill to a temporary file; image fields are validated as they stream
+FILE_UPLOAD_HANDLERS = ["project.uploads.StreamingUploadHandler"]
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+DATA_UPLOAD_MAX_NUMBER_FILES = 30
+UPLOAD_LIMITS = {
+    "MAX_FILE_SIZE": int(os.environ.get("UPLOAD_MAX_FILE_SIZE", 10 * 1024 * 1024)),
+    "MAX_REQUEST_SIZE": int(os.environ.get("UPLOAD_MAX_REQUEST_SIZE", 100 * 1024 * 1024)),
+    "IMAGE_FIELDS": ("image", "images", "profile_picture"),
+    "IMAGE_FORMATS": ("JPEG", "PNG", "GIF", "WEBP"),
+    "MAX_PIXELS": 40_000_000,
+    "SAVE_WORKERS": 4,  # gallery images written to storage in parallel
+}
+
+# =============================================================================
+# PRODUCT RANKING (see store/ranking.py)
+# =============================================================================
+
+# Top products order by a Bayesian average rating plus recent sales;
+# changing these takes effect for all products on `manage.py rebuild_rankings`
+RANKING = {
+    "PRIOR_MEAN": 3.5,
+    "PRIOR_WEIGHT": 10,
+    "SALES_WEIGHT": 0.25,
+    "SALES_WINDOW_DAYS": 30,
+}
+
+# =============================================================================
+# CATALOG INDEX (see store/catalog_index.py)
+# =============================================================================
+
+# Per-worker in-memory index answering the product listing; off by default.
+# Listings may lag writes by up to REFRESH_INTERVAL seconds when enabled.
+CATALOG_INDEX = {
+    "ENABLED": os.environ.get("CATALOG_INDEX", "False").lower() in ("true", "1", "yes"),
+    "REFRESH_INTERVAL": 5,
+    "FULL_REFRESH_INTERVAL": 600,
+    "KEYWORD_SEARCH": True,
+}
+
+# =============================================================================
+# RESPONSE COMPRESSION
+# =============================================================================
+
+# zstd and br are used only when the optional `zstandard` / `brotli`
+# packages are installed; gzip is always available. HTML stays uncompressed
+# (BREACH), see project/compression.py.
+API_COMPRESSION = {
+    "MIN_SIZE": int(os.environ.get("COMPRESSION_MIN_SIZE", "1024")),
+    "ENCODINGS": ["zstd", "br", "gzip"],
+    "LEVELS": {
+        "application/json": {"zstd": 3, "br": 4, "gzip": 6},
+        "application/javascript": {"zstd": 3, "br": 4, "gzip": 6},
+        "text/css": {"zstd": 3, "br": 4, "gzip": 6},
+        "text/csv": {"zstd": 6, "br": 5, "gzip": 6},
+    },
+}
+
+# =============================================================================
+# HTTP CACHE POLICIES (see store/cache_policy.py)
+# =============================================================================
+
+CACHE_POLICIES = {
+    "catalog": {
+        "public": True,
+        "max_age": int(os.environ.get("CATALOG_MAX_AGE", "60")),
+        "s_maxage": int(os.environ.get("CATALOG_S_MAXAGE", "300")),
+        "stale_while_revalidate": 60,
+    },
+    "private": {"private": True, "no_cache": True},
+    "admin": {"private": True, "no_store": True},
+}
+
+# Header the reverse proxy purges by: Surrogate-Key (Fastly), xkey (varnish)
+SURROGATE_KEY_HEADER = os.environ.get("SURROGATE_KEY_HEADER", "Surrogate-Key")
+
+# =============================================================================
+# QUERY BUDGETS (see project/query_budget.py)
+# =============================================================================
+
+# Max SQL queries per request, keyed by URL name. Unlisted views get the default.
+QUERY_BUDGET_DEFAULT = 30
+QUERY_BUDGETS = {
+    "products": 8,
+    "top-products": 6,
+    "shop-view": 6,
+    "product-detail": 6,
+    "product-reviews": 4,
+    "related-products": 2,
+    "my-products": 8,
+    "categories": 4,
+    "tags": 3,
+    "orders": 6,
+    "myorders": 6,
+    "seller_orders": 6,
+    "user-order": 6,
+    "cart-get": 4,
+    "wishlist-get": 4,
+    "store-settings": 6,
+    "dashboard-stats": 8,
+    "users": 5,
+    "user-detail": 4,
+    "users-profile": 4,
+}
+
+# Raise instead of logging when a budget is exceeded (enable in tests)
+QUERY_BUDGET_RAISE = os.environ.get("QUERY_BUDGET_RAISE", "False").lower() in ("true", "1", "yes")
+
+# Identical query shapes repeated this many times are reported as a likely N+1
+QUERY_N1_THRESHOLD = 5
+
+# =============================================================================
+# SLOW QUERY LOG (see project/slow_queries.py)
+# =============================================================================
+
+# Queries at or above this many milliseconds are logged with their plan (0 disables)
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_EXPLAIN = True
+# Rolling window for `manage.py slow_queries` and for re-capturing plans
+SLOW_QUERY_WINDOW = 3600
+SLOW_QUERY_LOG_FILE = os.path.join(BASE_DIR, "logs", "slow_queries.log")
+SLOW_QUERY_LOG_BACKUPS = 5
+
+# =============================================================================
+# METRICS (see project/metrics.py)
+# =============================================================================
+
+# /metrics is internal: either a bearer token or a source IP allow-list, and
+# closed until one is set. Behind a reverse proxy on the same host every
+# request comes from 127.0.0.1, so use METRICS_TOKEN there.
+# Set PROMETHEUS_MULTIPROC_DIR in the environment for multi-worker servers.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_ALLOWED_IPS = [
+    ip.strip()
+    for ip in os.environ.get("METRICS_ALLOWED_IPS", "").split(",")
+    if ip.strip()
+]
+
+# =============================================================================
+# REQUEST PROFILING (see project/profiling.py)
+# =============================================================================
+
+# Off by default: the middleware then removes itself at startup.
+# Profile a request with `?__profile=<token>` (token: manage.py profile_token),
+# or sample 1 in PROFILING_SAMPLE_RATE requests (0 disables sampling).
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "False").lower() in ("true", "1", "yes")
+PROFILING_SAMPLE_RATE = int(os.environ.get("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_FORMAT = os.environ.get("PROFILING_FORMAT", "pstats")  # pstats | speedscope
+PROFILING_DIR = os.environ.get("PROFILING_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILING_TOKEN_MAX_AGE = 3600
+
+# =============================================================================
+# CACHES
+# =============================================================================
+
+# "default" stays per-process. "shared" must be visible to every worker:
+# set REDIS_URL (requires the optional `redis` package) in production, or
+# SHARED_CACHE_DIR for several workers on one host. Without either it is a
+# per-process LocMem stand-in (development, tests).
+REDIS_URL = os.environ.get("REDIS_URL")
+SHARED_CACHE_DIR = os.environ.get("SHARED_CACHE_DIR")
+
+if REDIS_URL:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "smartshop",
+    }
+elif SHARED_CACHE_DIR:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": SHARED_CACHE_DIR,
+    }
+else:
+    SHARED_CACHE = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    }
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": SHARED_CACHE,
+}
+
+# project/cache.py: in-process L1 LRU in front of the "shared" L2
+TIERED_CACHE = {
+    "L2": "shared",
+    "L1_MAX_ENTRIES": 512,
+    "L1_TTL": 5,  # seconds a worker may serve a value another worker replaced
+    "STALE_TTL": 60,  # expired values kept to serve while one worker rebuilds
+    "LOCK_TIMEOUT": 10,
+}
+
+# Cache alias holding GCRA throttle state
+THROTTLE_CACHE = "shared"
+
+# project/coalesce.py: cross-worker lock / result hand-off, and how long a
+# request waits for an identical in-flight one before running it itself
+REQUEST_COALESCE_CACHE = "shared"
+REQUEST_COALESCE_TIMEOUT = 5
 
 # =============================================================================
 # REST FRAMEWORK & JWT CONFIGURATION
@@ -166,12 +389,16 @@ REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "project.throttling.AnonGCRAThrottle",
+        "project.throttling.UserGCRAThrottle",
     ],
     "DEFAULT_THROTTLE_RATES": {
         "anon": "100/hour",
         "user": "1000/hour",
+        # Scoped limits for expensive endpoints (project/throttling.py)
+        "search": "60/min",
+        "export": "10/hour",
+        "checkout": "20/hour",
     },
     "EXCEPTION_HANDLER": "rest_framework.views.exception_handler",
 }
@@ -260,6 +487,13 @@ if not DEBUG:
 # LOGGING CONFIGURATION
 # =============================================================================
 
+# Log lines as text or one JSON object per line (see project/log.py)
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text")
+# Fraction of INFO cart / wishlist events (logger "store.activity") to keep
+LOG_ACTIVITY_SAMPLE_RATE = float(os.environ.get("LOG_ACTIVITY_SAMPLE_RATE", "1.0"))
+
+# Loggers only write to the "queue" handlers; a background QueueListener
+# thread does the console / file I/O off the request path.
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -268,40 +502,85 @@ LOGGING = {
             "format": "{levelname} {asctime} {module} {process:d} {thread:d} {message}",
             "style": "{",
         },
+        "message": {
+            "format": "{message}",
+            "style": "{",
+        },
+        "json": {
+            "()": "project.log.JsonFormatter",
+        },
+    },
+    "filters": {
+        "sample_activity": {
+            "()": "project.log.SamplingFilter",
+            "rate": LOG_ACTIVITY_SAMPLE_RATE,
+        },
     },
     "handlers": {
         "console": {
             "class": "logging.StreamHandler",
-            "formatter": "verbose",
+            "formatter": "json" if LOG_FORMAT == "json" else "verbose",
         },
         "file": {
             "class": "logging.handlers.RotatingFileHandler",
             "filename": os.path.join(BASE_DIR, "logs", "django.log"),
             "maxBytes": 1024 * 1024 * 15,  # 15MB
             "backupCount": 10,
-            "formatter": "verbose",
+            "formatter": "json" if LOG_FORMAT == "json" else "verbose",
+        },
+        "slow_queries": {
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": SLOW_QUERY_LOG_FILE,
+            "maxBytes": 1024 * 1024 * 5,  # 5MB
+            "backupCount": SLOW_QUERY_LOG_BACKUPS,
+            "formatter": "message",
+        },
+        "queue": {
+            "class": "project.log.QueueHandler",
+            "queue": {"()": "project.log.bounded_queue", "maxsize": 10000},
+            "handlers": ["console", "file"],
+            "respect_handler_level": True,
+        },
+        "queue_slow_queries": {
+            "class": "project.log.QueueHandler",
+            "queue": {"()": "project.log.bounded_queue", "maxsize": 1000},
+            "handlers": ["slow_queries"],
         },
     },
     "root": {
-        "handlers": ["console", "file"],
+        "handlers": ["queue"],
         "level": "INFO",
     },
     "loggers": {
         "django": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": os.getenv("DJANGO_LOG_LEVEL", "INFO"),
             "propagate": False,
         },
         "store": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": "DEBUG" if DEBUG else "INFO",
             "propagate": False,
         },
+        "store.activity": {
+            "filters": ["sample_activity"],
+        },
         "users": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": "DEBUG" if DEBUG else "INFO",
             "propagate": False,
         },
+        "project": {
+            "handlers": ["queue"],
+            "level": "DEBUG" if DEBUG else "INFO",
+            "propagate": False,
+        },
+        # JSON lines read back by `manage.py slow_queries`
+        "project.slow_queries": {
+            "handlers": ["queue_slow_queries"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
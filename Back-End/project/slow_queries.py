@@ -0,0 +1,202 @@
+"""
+Slow Query Log for Smart Shop E-commerce Platform
+
+SlowQueryMiddleware wraps every request in `connection.execute_wrapper` and
+reports each query slower than settings.SLOW_QUERY_MS:
+
+    - a warning in the `project.queries` log with the calling view, the
+      normalized SQL fingerprint and the query plan
+      (`EXPLAIN QUERY PLAN` on SQLite, `EXPLAIN` on PostgreSQL / MySQL)
+    - one JSON line in SLOW_QUERY_LOG_FILE (logger `project.slow_queries`)
+
+`manage.py slow_queries` aggregates those lines per fingerprint over a
+rolling window (SLOW_QUERY_WINDOW seconds by default) and lists the worst
+offenders. Plans are captured once per fingerprint per window and process,
+so a hot slow query is not EXPLAINed on every request.
+
+SlowQueryLog can also be installed by hand, e.g. in a management command:
+
+    with connection.execute_wrapper(SlowQueryLog(view="seed_store")):
+        ...
+"""
+
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connection, transaction
+
+from .query_budget import fingerprint
+
+logger = logging.getLogger("project.queries")
+record_logger = logging.getLogger("project.slow_queries")
+
+EXPLAIN_PREFIX = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+
+# fingerprint -> (captured_at, plan); shared by all threads of the process
+_plans = {}
+_plans_lock = threading.Lock()
+_MAX_PLANS = 1000
+
+
+def explain(db, sql, params):
+    """Query plan for a SELECT as text, or None if it can't be explained."""
+    prefix = EXPLAIN_PREFIX.get(db.vendor)
+    if not prefix or not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return None
+    # In a savepoint: on PostgreSQL a failing EXPLAIN would otherwise abort
+    # the request's own transaction, e.g. a checkout in add_order_items
+    try:
+        with transaction.atomic(using=db.alias), db.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError as exc:
+        logger.debug("EXPLAIN failed: %s", exc)
+        return None
+    if db.vendor == "sqlite":
+        # (id, parent, notused, detail): indent children under their parent
+        depth = {0: -1}
+        lines = []
+        for row_id, parent, _, detail in rows:
+            depth[row_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[row_id] + detail)
+        return "\n".join(lines)
+    return "\n".join(" ".join(str(col) for col in row) for row in rows)
+
+
+class SlowQueryLog:
+    """execute_wrapper that reports queries slower than SLOW_QUERY_MS."""
+
+    def __init__(self, request=None, view=None):
+        self.request = request
+        self.view = view
+        self.threshold = getattr(settings, "SLOW_QUERY_MS", 100)
+        self.window = getattr(settings, "SLOW_QUERY_WINDOW", 3600)
+        self.capture_plans = getattr(settings, "SLOW_QUERY_EXPLAIN", True)
+        self._explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self._explaining:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if duration_ms >= self.threshold:
+                self.report(sql, params, many, duration_ms, context["connection"])
+
+    def calling_view(self):
+        if self.view:
+            return self.view
+        match = getattr(self.request, "resolver_match", None)
+        if match:
+            return match.view_name
+        return getattr(self.request, "path", None) or "unknown"
+
+    def plan_for(self, db, sql, params, fp):
+        now = time.time()
+        with _plans_lock:
+            cached = _plans.get(fp)
+        if cached and now - cached[0] < self.window:
+            return cached[1]
+
+        self._explaining = True
+        try:
+            plan = explain(db, sql, params)
+        except Exception as exc:
+            plan = f"EXPLAIN failed: {exc}"
+        finally:
+            self._explaining = False
+
+        with _plans_lock:
+            if len(_plans) >= _MAX_PLANS:
+                _plans.clear()
+            _plans[fp] = (now, plan)
+        return plan
+
+    def report(self, sql, params, many, duration_ms, db):
+        fp = fingerprint(sql)
+        view = self.calling_view()
+        plan = None
+        if self.capture_plans and not many:
+            plan = self.plan_for(db, sql, params, fp)
+
+        logger.warning(
+            "Slow query %.1fms in %s: %s%s",
+            duration_ms, view, fp, f"\n{plan}" if plan else "",
+        )
+        record_logger.info(json.dumps({
+            "ts": round(time.time(), 3),
+            "ms": round(duration_ms, 3),
+            "view": view,
+            "fingerprint": fp,
+            "plan": plan,
+        }))
+
+
+class SlowQueryMiddleware:
+    """Install SlowQueryLog for the duration of each request."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "SLOW_QUERY_MS", 100):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with connection.execute_wrapper(SlowQueryLog(request)):
+            return self.get_response(request)
+
+
+# =============================================================================
+# AGGREGATION
+# =============================================================================
+
+
+def read_slow_queries(path, since=None, backups=None):
+    """Yield JSON records from the slow query log and its rotated files."""
+    if backups is None:
+        backups = getattr(settings, "SLOW_QUERY_LOG_BACKUPS", 5)
+    for candidate in [f"{path}.{i}" for i in range(backups, 0, -1)] + [path]:
+        try:
+            fh = open(candidate)
+        except FileNotFoundError:
+            continue
+        with fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or record.get("ts", 0) >= since:
+                    yield record
+
+
+def aggregate(records):
+    """Per-fingerprint count / total / max, the views it came from and a plan."""
+    stats = {}
+    for record in records:
+        entry = stats.setdefault(record["fingerprint"], {
+            "fingerprint": record["fingerprint"],
+            "count": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "views": {},
+            "plan": None,
+            "last_seen": 0,
+        })
+        entry["count"] += 1
+        entry["total_ms"] += record["ms"]
+        entry["max_ms"] = max(entry["max_ms"], record["ms"])
+        entry["views"][record["view"]] = entry["views"].get(record["view"], 0) + 1
+        entry["last_seen"] = max(entry["last_seen"], record["ts"])
+        if record.get("plan"):
+            entry["plan"] = record["plan"]
+    return list(stats.values())
@@ -0,0 +1,100 @@
+"""
+Content-addressed Media Storage for Smart Shop E-commerce Platform
+
+ContentAddressedStorage names every file by the SHA-256 of its bytes:
+
+    cas/<2 hex>/<2 hex>/<sha256><original extension>
+
+so uploading the same photo twice, for two products or as a gallery image
+and a profile picture, stores one blob. The digest computed by
+project/uploads.py while the upload streamed is reused; other content is
+hashed here. Writes go to a temporary name beside the target and are
+renamed into place, so a half-written blob is never visible and racing
+uploads of the same bytes are harmless.
+
+Product.image, ProductImage.image and Profile.profile_picture use it
+(`storage=media_storage`); store/media.py counts the rows pointing at each
+blob and deletes it when the last one goes.
+
+A blob's URL never changes content, so `serve_media` sends it with
+`Cache-Control: public, max-age=31536000, immutable`. In production the
+web server should do the same for MEDIA_URL + "cas/", e.g. for nginx:
+
+    location /media/cas/ { alias <MEDIA_ROOT>/cas/; expires max; add_header Cache-Control "public, immutable"; }
+"""
+
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+PREFIX = "cas/"
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+
+def content_digest(content):
+    """SHA-256 of a Django File; uses the digest taken during upload when present."""
+    digest = getattr(content, "sha256", None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def blob_name(digest, name):
+    """Storage name for content with `digest`, keeping the extension of `name`."""
+    extension = os.path.splitext(name)[1].lower()
+    return f"{PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(PREFIX)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that stores each distinct content once, under its hash."""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        name = blob_name(content_digest(content), name)
+        if self.exists(name):
+            try:
+                # Fresh mtime: gc_media leaves recently written files alone
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass  # Released and deleted since the check: write it again
+        return super().save(name, content, max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The name *is* the content: an existing file is the same file
+        return name
+
+    def _save(self, name, content):
+        partial = f"{name}.{uuid.uuid4().hex}.part"
+        partial = super()._save(partial, content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+_media_storage = ContentAddressedStorage()
+
+
+def media_storage():
+    """Storage callable for FileField(storage=...); keeps migrations free of paths."""
+    return _media_storage
+
+
+def serve_media(request, path, document_root=None):
+    """django.views.static.serve, with far-future caching for content-addressed files."""
+    response = serve(request, path, document_root=document_root)
+    if is_content_addressed(path) and response.status_code == 200:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    return response
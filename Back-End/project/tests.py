@@ -0,0 +1,708 @@
+"""
+Project Tests for Smart Shop E-commerce Platform
+"""
+
+import gzip
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cache import TieredCache, tiered_cache
+from .coalesce import coalesce, coalesce_key
+from . import slow_queries
+from .log import JsonFormatter, QueueHandler, SamplingFilter
+from .profiling import ProfilingMiddleware, make_profile_token
+from .compression import CODECS, CompressionMiddleware, parse_accept_encoding
+from .throttling import (
+    GCRA_LUA,
+    AnonGCRAThrottle,
+    CheckoutThrottle,
+    ExportThrottle,
+    SearchThrottle,
+    UserGCRAThrottle,
+    gcra,
+)
+
+SCOPED_THROTTLES = [AnonGCRAThrottle, UserGCRAThrottle, SearchThrottle, ExportThrottle, CheckoutThrottle]
+
+
+def throttle_rates(**rates):
+    """REST_FRAMEWORK settings with some DEFAULT_THROTTLE_RATES replaced."""
+    return {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], **rates},
+    }
+
+
+class GCRATests(SimpleTestCase):
+    """gcra() on the LocMem path: burst capacity, Retry-After and refill."""
+
+    def setUp(self):
+        self.cache = LocMemCache("gcra-tests", {})
+        self.cache.clear()
+        self.now = 1_000_000.0
+        patcher = mock.patch("project.throttling.time.time", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def spend(self, key="client", num_requests=3, duration=60):
+        return gcra(self.cache, key, num_requests, duration)
+
+    def test_allows_a_full_burst_then_denies(self):
+        self.assertEqual([self.spend()[0] for _ in range(3)], [True, True, True])
+        self.assertFalse(self.spend()[0])
+
+    def test_retry_after_is_the_time_until_the_next_token(self):
+        for _ in range(3):
+            self.spend()
+        self.assertEqual(self.spend(), (False, 20.0))
+        self.now += 5
+        self.assertEqual(self.spend(), (False, 15.0))
+
+    def test_tokens_refill_at_the_configured_rate(self):
+        for _ in range(3):
+            self.spend()
+        self.now += 20
+        self.assertEqual(self.spend(), (True, 0.0))
+        self.assertFalse(self.spend()[0])
+        self.now += 60
+        self.assertEqual([self.spend()[0] for _ in range(4)], [True, True, True, False])
+
+    def test_denied_requests_do_not_spend_tokens(self):
+        for _ in range(10):
+            self.spend()
+        self.now += 20
+        self.assertTrue(self.spend()[0])
+
+    def test_keys_are_independent(self):
+        for _ in range(3):
+            self.spend("a")
+        self.assertFalse(self.spend("a")[0])
+        self.assertTrue(self.spend("b")[0])
+
+
+class GCRARedisScriptTests(SimpleTestCase):
+    """gcra() hands RedisCache keys to the Lua script, registered once per client."""
+
+    def test_calls_script_with_interval_and_burst(self):
+        client = mock.Mock(spec=["register_script"])
+        client.register_script.return_value.side_effect = [[1, b"0"], [0, b"12.5"]]
+        cache = mock.Mock()
+        cache._cache.get_client.return_value = client
+        cache.make_and_validate_key.return_value = ":1:client"
+
+        self.assertEqual(gcra(cache, "client", 4, 60), (True, 0.0))
+        self.assertEqual(gcra(cache, "client", 4, 60), (False, 12.5))
+
+        client.register_script.assert_called_once_with(GCRA_LUA)
+        client.register_script.return_value.assert_called_with(keys=[":1:client"], args=[15.0, 4])
+
+
+@skipUnless(settings.REDIS_URL, "needs a Redis server (REDIS_URL)")
+class GCRARedisTests(SimpleTestCase):
+    """The Lua script against a real Redis server."""
+
+    def setUp(self):
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.key = f"gcra-tests-{time.monotonic_ns()}"
+
+    def test_burst_retry_after_and_refill(self):
+        self.assertEqual([gcra(self.cache, self.key, 3, 0.6)[0] for _ in range(3)], [True, True, True])
+        allowed, retry_after = gcra(self.cache, self.key, 3, 0.6)
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+        self.assertLessEqual(retry_after, 0.2)
+        time.sleep(retry_after + 0.05)
+        self.assertTrue(gcra(self.cache, self.key, 3, 0.6)[0])
+
+
+class ThrottleRateTests(SimpleTestCase):
+    """Every throttle scope has a rate in settings, parsed the DRF way."""
+
+    def test_scopes_read_rates_from_settings(self):
+        rates = settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]
+        for throttle_class in SCOPED_THROTTLES:
+            with self.subTest(scope=throttle_class.scope):
+                throttle = throttle_class()
+                self.assertEqual(throttle.rate, rates[throttle_class.scope])
+                self.assertEqual(
+                    (throttle.num_requests, throttle.duration), throttle.parse_rate(rates[throttle_class.scope])
+                )
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(search="7/min"))
+    def test_rates_are_read_live(self):
+        throttle = SearchThrottle()
+        self.assertEqual((throttle.num_requests, throttle.duration), (7, 60))
+
+
+class ThrottledViewTests(TestCase):
+    """Each throttle scope answers 429 with Retry-After once its bucket is empty."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user("customer", "customer@example.com", "pass")
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True)
+
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
+
+    def login(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    def assertThrottledAfter(self, allowed, request):
+        for _ in range(allowed):
+            self.assertNotEqual(request().status_code, 429)
+        response = request()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response["Retry-After"]), 0)
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(anon="2/min"))
+    def test_anon(self):
+        self.assertThrottledAfter(2, lambda: self.client.get(reverse("products")))
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(user="2/min"))
+    def test_user(self):
+        self.login(self.customer)
+        self.assertThrottledAfter(2, lambda: self.client.get(reverse("products")))
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(search="2/min"))
+    def test_search(self):
+        self.login(self.customer)
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("products")).status_code, 200)
+        self.assertThrottledAfter(2, lambda: self.client.get(reverse("products"), {"keyword": "phone"}))
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(export="1/hour"))
+    def test_export(self):
+        self.login(self.admin)
+        self.assertThrottledAfter(1, lambda: self.client.get(reverse("export_orders_csv")))
+
+    @override_settings(REST_FRAMEWORK=throttle_rates(checkout="1/hour"))
+    def test_checkout(self):
+        self.login(self.customer)
+        self.assertThrottledAfter(
+            1, lambda: self.client.post(reverse("orders-add"), {}, content_type="application/json")
+        )
+
+
+class TieredCacheTests(SimpleTestCase):
+    """TieredCache: L1/L2 fallthrough, stale serving, XFetch and single-flight."""
+
+    def setUp(self):
+        self.cache = TieredCache(namespace="tiered-tests")
+        self.cache.l2.clear()
+        self.calls = 0
+
+    def compute(self, value="fresh", delay=0):
+        def build():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return build
+
+    def put_l2(self, key, value, expires_in, rebuild_seconds=0.0):
+        self.cache.l2.set(self.cache._key(key), (value, time.time() + expires_in, rebuild_seconds), 60)
+
+    def test_l1_falls_through_to_l2_and_refills(self):
+        self.cache.set("k", "value", ttl=60)
+        self.cache.l1.clear()
+        self.assertEqual(self.cache.get("k"), "value")
+        self.assertEqual(self.cache.l1.get(self.cache._key("k"))[0], "value")
+
+        self.cache.l2.clear()
+        self.assertEqual(self.cache.get("k"), "value")
+
+    def test_miss_computes_and_stores_in_both_tiers(self):
+        self.assertEqual(self.cache.get_or_set("k", self.compute(), ttl=60), "fresh")
+        self.assertEqual(self.cache.get_or_set("k", self.compute("other"), ttl=60), "fresh")
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.l2.get(self.cache._key("k"))[0], "fresh")
+        self.assertEqual(self.cache.l1.get(self.cache._key("k"))[0], "fresh")
+
+    def test_serves_stale_while_another_worker_rebuilds(self):
+        self.put_l2("k", "stale", expires_in=-1)
+        self.cache.l2.add(self.cache._key("k:lock"), 1)
+        self.assertEqual(self.cache.get_or_set("k", self.compute(), ttl=60), "stale")
+        self.assertEqual(self.calls, 0)
+
+    def test_expired_entry_is_rebuilt_by_the_lock_holder(self):
+        self.put_l2("k", "stale", expires_in=-1)
+        self.assertEqual(self.cache.get_or_set("k", self.compute(), ttl=60), "fresh")
+        self.assertIsNone(self.cache.l2.get(self.cache._key("k:lock")))
+
+    def test_xfetch_rebuilds_early_only_when_the_draw_says_so(self):
+        self.put_l2("k", "cached", expires_in=5, rebuild_seconds=1.0)
+        with mock.patch("project.cache.random.random", return_value=1.0):
+            self.assertEqual(self.cache.get_or_set("k", self.compute(), ttl=60), "cached")
+        self.cache.l1.clear()
+        with mock.patch("project.cache.random.random", return_value=1e-9):
+            self.assertEqual(self.cache.get_or_set("k", self.compute(), ttl=60), "fresh")
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        start = threading.Barrier(8)
+        results = []
+
+        def read():
+            start.wait()
+            results.append(self.cache.get_or_set("k", self.compute(delay=0.2), ttl=60))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["fresh"] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_does_not_release_a_lock_taken_over_by_another_worker(self):
+        lock_key = self.cache._key("k:lock")
+
+        def slow_build():
+            # Our lock expired mid-rebuild and another worker took it
+            self.cache.l2.set(lock_key, 42)
+            return "fresh"
+
+        self.assertEqual(self.cache.get_or_set("k", slow_build, ttl=60), "fresh")
+        self.assertEqual(self.cache.l2.get(lock_key), 42)
+
+
+class CoalesceTests(SimpleTestCase):
+    """@coalesce runs a view once for concurrent identical misses."""
+
+    def setUp(self):
+        self.shared = caches[settings.REQUEST_COALESCE_CACHE]
+        self.shared.clear()
+        caches[settings.THROTTLE_CACHE].clear()
+        tiered_cache.delete("coalesce-tests")
+        self.calls = 0
+        self.factory = APIRequestFactory()
+
+    def make_view(self, delay=0, **options):
+        @api_view(["GET"])
+        @permission_classes([AllowAny])
+        @coalesce("coalesce-tests", **options)
+        def view(request):
+            self.calls += 1
+            time.sleep(delay)
+            return Response({"items": [1, 2, 3]})
+        return view
+
+    def test_concurrent_misses_run_the_view_once(self):
+        view = self.make_view(delay=0.2)
+        start = threading.Barrier(8)
+        responses = []
+
+        def read():
+            start.wait()
+            responses.append(view(self.factory.get("/coalesce-tests/", {"page": 1})))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([response.status_code for response in responses], [200] * 8)
+        self.assertEqual([response.data for response in responses], [{"items": [1, 2, 3]}] * 8)
+
+    def test_fresh_tiered_entry_skips_the_shared_lock(self):
+        view = self.make_view(tiered_key="coalesce-tests")
+        with mock.patch.object(self.shared, "add", wraps=self.shared.add) as add:
+            view(self.factory.get("/coalesce-tests/"))
+            self.assertEqual(add.call_count, 1)
+
+            tiered_cache.set("coalesce-tests", {"items": [1, 2, 3]}, ttl=60)
+            tiered_cache.l1.clear()
+            view(self.factory.get("/coalesce-tests/"))
+            view(self.factory.get("/coalesce-tests/"))
+            self.assertEqual(add.call_count, 1)
+        self.assertEqual(self.calls, 3)
+
+    def test_lock_taken_over_by_another_worker_is_left_alone(self):
+        lock_key = None
+
+        @api_view(["GET"])
+        @permission_classes([AllowAny])
+        @coalesce("coalesce-tests")
+        def view(request):
+            # The lock expired mid-request and another worker took it
+            nonlocal lock_key
+            lock_key = f"coalesce:lock:{coalesce_key(request, 'coalesce-tests')}"
+            self.assertIsNotNone(self.shared.get(lock_key))
+            self.shared.set(lock_key, 12345)
+            return Response({"items": []})
+
+        view(self.factory.get("/coalesce-tests/"))
+        self.assertEqual(self.shared.get(lock_key), 12345)
+
+        # Our own lock is still released
+        self.shared.delete(lock_key)
+        self.make_view()(self.factory.get("/coalesce-tests/"))
+        self.assertIsNone(self.shared.get(lock_key))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Accept-Encoding negotiation, minimum size, Vary and the BREACH guard."""
+
+    body = b'{"products": [' + b", ".join([b'{"name": "Phone", "price": "199.00"}'] * 100) + b"]}"
+
+    def respond(self, accept_encoding="gzip", content_type="application/json", body=None, view=None):
+        def get_response(request):
+            if view:
+                view(request)
+            return HttpResponse(self.body if body is None else body, content_type=content_type)
+
+        request = RequestFactory().get("/api/products/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(get_response)(request)
+
+    def test_compresses_json_with_an_accepted_encoding(self):
+        response = self.respond("gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_negotiation_honours_q_values(self):
+        self.assertEqual(parse_accept_encoding("gzip;q=0.5, br, identity;q=0"), {"gzip": 0.5, "br": 1.0})
+        self.assertEqual(self.respond("*")["Content-Encoding"], self.respond("zstd, br, gzip")["Content-Encoding"])
+        for header in ("", "identity", "gzip;q=0", "*;q=0", "deflate"):
+            with self.subTest(accept_encoding=header):
+                response = self.respond(header)
+                self.assertFalse(response.has_header("Content-Encoding"))
+                self.assertEqual(response.content, self.body)
+                self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    @skipUnless("br" in CODECS, "needs the optional brotli package")
+    def test_client_preference_beats_server_order(self):
+        self.assertEqual(self.respond("br;q=0.5, gzip")["Content-Encoding"], "gzip")
+        self.assertEqual(self.respond("br, gzip")["Content-Encoding"], "br")
+
+    def test_small_responses_are_left_alone(self):
+        response = self.respond(body=b'{"ok": true}')
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertFalse(response.has_header("Vary"))
+
+    @override_settings(API_COMPRESSION={"MIN_SIZE": 64})
+    def test_min_size_comes_from_settings(self):
+        body = b'{"name": "' + b"x" * 100 + b'"}'
+        self.assertEqual(self.respond(body=body)["Content-Encoding"], "gzip")
+        self.assertFalse(self.respond(body=body[:60]).has_header("Content-Encoding"))
+
+    def test_html_is_never_compressed(self):
+        response = self.respond(content_type="text/html; charset=utf-8")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertFalse(response.has_header("Vary"))
+
+    def test_responses_carrying_a_csrf_token_are_not_compressed(self):
+        response = self.respond(view=get_token)
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_strong_etag_becomes_weak(self):
+        def get_response(request):
+            response = HttpResponse(self.body, content_type="application/json")
+            response["ETag"] = '"abc"'
+            return response
+
+        request = RequestFactory().get("/api/products/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(CompressionMiddleware(get_response)(request)["ETag"], 'W/"abc"')
+
+
+class MetricsAccessTests(SimpleTestCase):
+    """/metrics is closed unless a token or an IP allow-list is configured."""
+
+    def scrape(self, **extra):
+        return self.client.get(reverse("metrics"), **extra)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_ALLOWED_IPS=[])
+    def test_closed_by_default(self):
+        self.assertEqual(self.scrape(REMOTE_ADDR="127.0.0.1").status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None, METRICS_ALLOWED_IPS=["10.0.0.5"])
+    def test_ip_allow_list(self):
+        response = self.scrape(REMOTE_ADDR="10.0.0.5")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"http_request_duration_seconds", response.content)
+        self.assertEqual(self.scrape(REMOTE_ADDR="127.0.0.1").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="s3cret", METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_token_is_required_once_set(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.scrape(REMOTE_ADDR="127.0.0.1").status_code, 403)
+
+
+class SlowQueryLogTests(TestCase):
+    """SlowQueryLog: threshold, one EXPLAIN per fingerprint, failures contained."""
+
+    def setUp(self):
+        slow_queries._plans.clear()
+
+    def run_queries(self, *usernames):
+        with connection.execute_wrapper(slow_queries.SlowQueryLog(view="tests")):
+            for username in usernames:
+                list(User.objects.filter(username=username))
+
+    def records(self, *usernames):
+        with self.assertLogs("project.slow_queries", "INFO") as logs:
+            self.run_queries(*usernames)
+        return [json.loads(record.getMessage()) for record in logs.records]
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_reports_queries_over_the_threshold(self):
+        [record] = self.records("alice")
+        self.assertEqual(record["view"], "tests")
+        self.assertIn('FROM "auth_user" WHERE "auth_user"."username" = %s', record["fingerprint"])
+        self.assertIn("auth_user", record["plan"])
+
+    @override_settings(SLOW_QUERY_MS=60_000)
+    def test_fast_queries_are_not_reported(self):
+        with self.assertNoLogs("project.slow_queries", "INFO"):
+            self.run_queries("alice")
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_plans_are_captured_once_per_fingerprint(self):
+        with mock.patch("project.slow_queries.explain", wraps=slow_queries.explain) as explain:
+            records = self.records("alice", "bob", "carol")
+        self.assertEqual(explain.call_count, 1)
+        self.assertEqual(len({record["fingerprint"] for record in records}), 1)
+        self.assertEqual(len({record["plan"] for record in records}), 1)
+
+    def test_failed_explain_keeps_the_transaction_usable(self):
+        with transaction.atomic():
+            self.assertIsNone(slow_queries.explain(connection, "SELECT * FROM no_such_table", []))
+            self.assertFalse(connection.needs_rollback)
+            self.assertEqual(User.objects.count(), 0)
+
+
+class SlowQueryReportTests(SimpleTestCase):
+    """manage.py slow_queries aggregates the log per fingerprint."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, "slow_queries.log")
+
+    def write(self, *records):
+        with open(self.path, "w") as fh:
+            for record in records:
+                fh.write(json.dumps(record) + "\n")
+            fh.write("not json\n")
+
+    def report(self, *args):
+        out = io.StringIO()
+        call_command("slow_queries", "--file", self.path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_aggregates_and_sorts(self):
+        now = time.time()
+        self.write(
+            {"ts": now, "ms": 150, "view": "products", "fingerprint": "SELECT a", "plan": "SCAN a"},
+            {"ts": now, "ms": 250, "view": "products", "fingerprint": "SELECT a", "plan": None},
+            {"ts": now, "ms": 120, "view": "orders", "fingerprint": "SELECT a", "plan": None},
+            {"ts": now, "ms": 900, "view": "export", "fingerprint": "SELECT b", "plan": None},
+            {"ts": now - 7200, "ms": 5000, "view": "old", "fingerprint": "SELECT old", "plan": None},
+        )
+        output = self.report("--plans")
+        self.assertLess(output.index("SELECT b"), output.index("SELECT a"))
+        self.assertIn("#2  3 x, total 520ms, avg 173.3ms, max 250.0ms", output)
+        self.assertIn("views: products x2, orders x1", output)
+        self.assertIn("      | SCAN a", output)
+        self.assertNotIn("SELECT old", output)
+
+        by_count = self.report("--sort", "count", "--limit", "1")
+        self.assertIn("SELECT a", by_count)
+        self.assertNotIn("SELECT b", by_count)
+
+    def test_empty_window(self):
+        self.write({"ts": time.time() - 7200, "ms": 500, "view": "v", "fingerprint": "SELECT 1", "plan": None})
+        self.assertIn("No queries over", self.report("--window", "60"))
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Token / sampled requests are profiled to pstats or speedscope files."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        overrides = override_settings(
+            PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_FORMAT="pstats",
+            PROFILING_DIR=self.directory,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def view(self, request):
+        User.objects.count()
+        return HttpResponse("ok")
+
+    def call(self, **extra):
+        return ProfilingMiddleware(self.view)(RequestFactory().get("/api/products/", **extra))
+
+    def files(self, suffix):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(suffix)]
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_middleware_removes_itself(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(self.view)
+
+    def test_requests_without_a_token_are_not_profiled(self):
+        response = self.call()
+        self.assertFalse(response.has_header("X-Profile"))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_signed_token_in_query_or_header(self):
+        token = make_profile_token()
+        self.assertTrue(self.call(data={"__profile": token}).has_header("X-Profile"))
+        self.assertTrue(self.call(HTTP_X_PROFILE=token).has_header("X-Profile"))
+        self.assertFalse(self.call(HTTP_X_PROFILE=token + "x").has_header("X-Profile"))
+        self.assertFalse(self.call(HTTP_X_PROFILE="profile").has_header("X-Profile"))
+
+    @override_settings(PROFILING_TOKEN_MAX_AGE=60)
+    def test_tokens_expire(self):
+        with mock.patch("django.core.signing.time.time", return_value=time.time() - 120):
+            token = make_profile_token()
+        self.assertFalse(self.call(HTTP_X_PROFILE=token).has_header("X-Profile"))
+        with mock.patch("django.core.signing.time.time", return_value=time.time() - 30):
+            token = make_profile_token()
+        self.assertTrue(self.call(HTTP_X_PROFILE=token).has_header("X-Profile"))
+
+    @override_settings(PROFILING_SAMPLE_RATE=4)
+    def test_sampling(self):
+        with mock.patch("project.profiling.random.randrange", return_value=0) as randrange:
+            self.assertTrue(self.call().has_header("X-Profile"))
+        randrange.assert_called_with(4)
+        with mock.patch("project.profiling.random.randrange", return_value=3):
+            self.assertFalse(self.call().has_header("X-Profile"))
+
+    def test_pstats_output(self):
+        name = self.call(HTTP_X_PROFILE=make_profile_token())["X-Profile"]
+        self.assertIn("-unmatched-", name)
+        [prof] = self.files(".prof")
+        self.assertTrue(os.path.basename(prof).startswith(name))
+        stats = pstats.Stats(prof)
+        self.assertTrue(any(func[2] == "view" for func in stats.stats))
+
+        [sql] = self.files(".sql.json")
+        with open(sql) as fh:
+            summary = json.load(fh)
+        self.assertEqual((summary["method"], summary["path"], summary["status"]), ("GET", "/api/products/", 200))
+        self.assertEqual(len(summary["queries"]), 1)
+        self.assertIn('FROM "auth_user"', summary["queries"][0]["sql"])
+
+    @override_settings(PROFILING_FORMAT="speedscope")
+    def test_speedscope_output(self):
+        self.call(HTTP_X_PROFILE=make_profile_token())
+        [path] = self.files(".speedscope.json")
+        with open(path) as fh:
+            document = json.load(fh)
+        self.assertEqual(document["name"], "GET /api/products/")
+        names = [frame["name"] for frame in document["shared"]["frames"]]
+        self.assertIn("ProfilingMiddlewareTests.view", names)
+        self.assertTrue(any(name.startswith("SQL: SELECT COUNT(*)") for name in names))
+        events = document["profiles"][0]["events"]
+        self.assertEqual(
+            sum(1 for event in events if event["type"] == "O"),
+            sum(1 for event in events if event["type"] == "C"),
+        )
+        self.assertEqual([event["at"] for event in events], sorted(event["at"] for event in events))
+        self.assertEqual(len(self.files(".sql.json")), 1)
+
+
+class LoggingTests(SimpleTestCase):
+    """JSON formatting, sampling and the non-blocking queue handler."""
+
+    def record(self, level=logging.INFO, exc_info=None, **extra):
+        return logging.makeLogRecord({
+            "name": "store.activity", "levelno": level, "levelname": logging.getLevelName(level),
+            "msg": "order %s placed", "args": (42,), "exc_info": exc_info, **extra,
+        })
+
+    def exc_info(self):
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            return sys.exc_info()
+
+    def test_json_formatter_includes_extra_fields_and_exception(self):
+        line = JsonFormatter().format(self.record(level=logging.ERROR, exc_info=self.exc_info(), order_id=42))
+        payload = json.loads(line)
+        self.assertEqual(payload["message"], "order 42 placed")
+        self.assertEqual((payload["level"], payload["logger"]), ("ERROR", "store.activity"))
+        self.assertEqual(payload["order_id"], 42)
+        self.assertIn("ValueError: boom", payload["exc_info"])
+        self.assertNotIn("\n", line)
+
+    def test_sampling_filter(self):
+        self.assertTrue(SamplingFilter(rate=1).filter(self.record()))
+        sampler = SamplingFilter(rate=0.25)
+        self.assertTrue(sampler.filter(self.record(level=logging.WARNING)))
+        with mock.patch("project.log.random.random", return_value=0.1):
+            kept = self.record()
+            self.assertTrue(sampler.filter(kept))
+            self.assertEqual(kept.sample_rate, 0.25)
+        with mock.patch("project.log.random.random", return_value=0.5):
+            self.assertFalse(sampler.filter(self.record(level=logging.DEBUG)))
+
+    def test_full_queue_drops_records(self):
+        handler = QueueHandler(queue.Queue(maxsize=2))
+        for _ in range(5):
+            handler.handle(self.record())
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+    def test_queued_records_keep_exception_separate(self):
+        handler = QueueHandler(queue.Queue())
+        handler.handle(self.record(level=logging.ERROR, exc_info=self.exc_info()))
+        queued = handler.queue.get_nowait()
+        self.assertEqual(queued.getMessage(), "order 42 placed")
+        self.assertIsNone(queued.exc_info)
+
+        payload = json.loads(JsonFormatter().format(queued))
+        self.assertEqual(payload["message"], "order 42 placed")
+        self.assertIn("ValueError: boom", payload["exc_info"])
+        text = logging.Formatter("%(levelname)s %(message)s").format(queued)
+        self.assertTrue(text.startswith("ERROR order 42 placed\nTraceback"))
+
+    def test_listener_writes_json_through_the_queue(self):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(JsonFormatter())
+        handler = QueueHandler(queue.Queue())
+        handler.listener = logging.handlers.QueueListener(handler.queue, target)
+        handler.handle(self.record(level=logging.ERROR, exc_info=self.exc_info()))
+        handler.stop_listener()
+        payload = json.loads(stream.getvalue())
+        self.assertEqual(payload["message"], "order 42 placed")
+        self.assertIn("ValueError: boom", payload["exc_info"])
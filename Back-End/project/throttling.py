@@ -0,0 +1,169 @@
+"""
+GCRA Throttling for Smart Shop E-commerce Platform
+
+Drop-in replacements for DRF's Anon/User/ScopedRateThrottle. Instead of a
+timestamp history list per client, each key holds a single number: its
+"theoretical arrival time" (TAT) from the Generic Cell Rate Algorithm, i.e.
+a token bucket of `num_requests` tokens that refills at `num_requests` per
+period. Rates use the usual DRF syntax ("100/hour") from
+DEFAULT_THROTTLE_RATES.
+
+State lives in the cache alias settings.THROTTLE_CACHE, which should be
+shared between workers (Redis via REDIS_URL, see CACHES). A check is one
+atomic cache operation:
+
+    RedisCache      a Lua script (EVALSHA) reads and updates the TAT on the
+                    server, using the Redis clock
+    LocMemCache     get + set under a process-wide lock (that cache is
+                    per-process anyway)
+    anything else   get + set, best effort
+
+Scoped throttles for expensive endpoints:
+
+    SearchThrottle    "search"   product lists with ?keyword=
+    ExportThrottle    "export"   orders export
+    CheckoutThrottle  "checkout" order creation
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+GCRA_LUA = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval
+local allow_at = new_tat - interval * burst
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+_local_lock = threading.Lock()
+
+
+def gcra(cache, key, num_requests, duration):
+    """
+    Spend one token for `key`. Returns (allowed, retry_after_seconds).
+    `num_requests` per `duration` seconds, bursts of up to `num_requests`.
+    """
+    interval = duration / num_requests
+
+    client = _redis_client(cache, key)
+    if client is not None:
+        script = _redis_script(client)
+        allowed, retry_after = script(keys=[cache.make_and_validate_key(key)], args=[interval, num_requests])
+        return bool(int(allowed)), float(retry_after)
+
+    lock = _local_lock if isinstance(cache, LocMemCache) else None
+    if lock:
+        lock.acquire()
+    try:
+        now = time.time()
+        tat = max(cache.get(key, now), now)
+        new_tat = tat + interval
+        allow_at = new_tat - interval * num_requests
+        if now < allow_at:
+            return False, allow_at - now
+        cache.set(key, new_tat, timeout=new_tat - now)
+        return True, 0.0
+    finally:
+        if lock:
+            lock.release()
+
+
+def _redis_client(cache, key):
+    # django.core.cache.backends.redis.RedisCache exposes its client here
+    redis_cache = getattr(cache, "_cache", None)
+    if redis_cache is None or not hasattr(redis_cache, "get_client"):
+        return None
+    return redis_cache.get_client(key, write=True)
+
+
+def _redis_script(client):
+    script = getattr(client, "_gcra_script", None)
+    if script is None:
+        script = client._gcra_script = client.register_script(GCRA_LUA)
+    return script
+
+
+# =============================================================================
+# THROTTLE CLASSES
+# =============================================================================
+
+
+class GCRAThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle with O(1) GCRA state in the shared throttle cache."""
+
+    retry_after = None
+
+    def get_rate(self):
+        # Read live so rate changes (and override_settings) apply without a restart
+        return api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        cache = caches[getattr(settings, "THROTTLE_CACHE", "default")]
+        allowed, self.retry_after = gcra(cache, self.key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class AnonGCRAThrottle(GCRAThrottle):
+    """Anonymous clients, keyed by IP (like AnonRateThrottle)."""
+
+    scope = "anon"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class UserGCRAThrottle(GCRAThrottle):
+    """Authenticated users by id, anonymous clients by IP (like UserRateThrottle)."""
+
+    scope = "user"
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+class SearchThrottle(UserGCRAThrottle):
+    """Keyword searches only; plain catalog browsing is not counted."""
+
+    scope = "search"
+
+    def get_cache_key(self, request, view):
+        if not request.query_params.get("keyword"):
+            return None
+        return super().get_cache_key(request, view)
+
+
+class ExportThrottle(UserGCRAThrottle):
+    scope = "export"
+
+
+class CheckoutThrottle(UserGCRAThrottle):
+    scope = "checkout"
@@ -0,0 +1,217 @@
+"""
+Streaming Uploads for Smart Shop E-commerce Platform
+
+StreamingUploadHandler replaces Django's memory / temporary-file handler
+pair (settings.FILE_UPLOAD_HANDLERS). Each uploaded file:
+
+    - stays in memory only up to FILE_UPLOAD_MAX_MEMORY_SIZE, then spills
+      to a temporary file, so a request holds at most that much per file in
+      RAM however large or numerous the uploads are
+    - is hashed (SHA-256) as it streams; the digest is on `file.sha256`
+    - is capped at UPLOAD_LIMITS["MAX_FILE_SIZE"]; the whole body at
+      UPLOAD_LIMITS["MAX_REQUEST_SIZE"] (checked against Content-Length up
+      front and again as bytes arrive)
+    - when it comes in one of UPLOAD_LIMITS["IMAGE_FIELDS"], must be an
+      image in IMAGE_FORMATS: the magic bytes are checked on the first chunk
+      and the header is parsed (format and dimensions only, nothing decoded)
+      as soon as enough of it has arrived. Results are on `file.image_format`
+      and `file.image_size`.
+
+Rejections stop the upload mid-stream: UploadTooLarge (413) or
+InvalidImageUpload (400).
+
+`save_files()` writes several pending FileFields to storage in parallel,
+e.g. gallery images before a bulk_create.
+"""
+
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+DEFAULTS = {
+    "MAX_FILE_SIZE": 10 * 1024 * 1024,
+    "MAX_REQUEST_SIZE": 100 * 1024 * 1024,
+    "IMAGE_FIELDS": ("image", "images", "profile_picture"),
+    "IMAGE_FORMATS": ("JPEG", "PNG", "GIF", "WEBP"),
+    "MAX_PIXELS": 40_000_000,
+    "HEADER_BYTES": 256 * 1024,
+    "SAVE_WORKERS": 4,
+}
+
+# Leading bytes of each accepted format; anything else is rejected on the first chunk
+MAGIC = {
+    "JPEG": (b"\xff\xd8\xff",),
+    "PNG": (b"\x89PNG\r\n\x1a\n",),
+    "GIF": (b"GIF87a", b"GIF89a"),
+    "WEBP": (b"RIFF",),
+}
+
+
+def get_upload_limits():
+    return {**DEFAULTS, **getattr(settings, "UPLOAD_LIMITS", {})}
+
+
+# Also SuspiciousOperation so plain Django views (admin) answer 400, not 500
+class UploadRejected(APIException, SuspiciousOperation):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Upload rejected."
+    default_code = "upload_rejected"
+
+
+class UploadTooLarge(UploadRejected):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload too large."
+    default_code = "upload_too_large"
+
+
+class InvalidImageUpload(UploadRejected):
+    default_detail = "Not a supported image."
+    default_code = "invalid_image"
+
+
+def _mb(size):
+    return f"{size / (1024 * 1024):g}MB"
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """Spool, hash, size-check and (for image fields) validate each file as it streams."""
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.limits = get_upload_limits()
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.limits["MAX_REQUEST_SIZE"]:
+            raise UploadTooLarge(f"Request body exceeds {_mb(self.limits['MAX_REQUEST_SIZE'])}.")
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = io.BytesIO()
+        self.spooled = False
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.is_image = self.field_name in self.limits["IMAGE_FIELDS"]
+        self.header = bytearray()
+        self.image_info = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        self.received += len(raw_data)
+        if self.size > self.limits["MAX_FILE_SIZE"]:
+            self._reject(UploadTooLarge(
+                f"{self.file_name} exceeds the {_mb(self.limits['MAX_FILE_SIZE'])} per-file limit."
+            ))
+        if self.received > self.limits["MAX_REQUEST_SIZE"]:
+            self._reject(UploadTooLarge(f"Request body exceeds {_mb(self.limits['MAX_REQUEST_SIZE'])}."))
+
+        self.sha256.update(raw_data)
+        if self.is_image and self.image_info is None:
+            self._inspect_header(raw_data)
+
+        if not self.spooled and self.size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            self._spool()
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.is_image and self.image_info is None:
+            self._reject(InvalidImageUpload(f"{self.file_name} is not a readable image."))
+
+        if self.spooled:
+            uploaded = self.file
+            uploaded.size = file_size
+        else:
+            uploaded = InMemoryUploadedFile(
+                file=self.file,
+                field_name=self.field_name,
+                name=self.file_name,
+                content_type=self.content_type,
+                size=file_size,
+                charset=self.charset,
+                content_type_extra=self.content_type_extra,
+            )
+        uploaded.seek(0)
+        uploaded.sha256 = self.sha256.hexdigest()
+        uploaded.image_format, uploaded.image_size = self.image_info or (None, None)
+        del self.file  # the parser closes `handler.file` on StopUpload
+        return uploaded
+
+    def upload_interrupted(self):
+        if getattr(self, "file", None) is not None:
+            self.file.close()
+            del self.file
+
+    def _spool(self):
+        spooled = TemporaryUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra
+        )
+        spooled.write(self.file.getvalue())
+        self.file = spooled
+        self.spooled = True
+
+    def _inspect_header(self, raw_data):
+        if not self.header:
+            head = raw_data[:12]
+            if not any(head.startswith(magic) for fmt in self.limits["IMAGE_FORMATS"] for magic in MAGIC.get(fmt, ())):
+                self._reject(InvalidImageUpload(f"{self.file_name} is not a supported image type."))
+            if head.startswith(b"RIFF") and head[8:12] != b"WEBP":
+                self._reject(InvalidImageUpload(f"{self.file_name} is not a supported image type."))
+
+        self.header += raw_data[: self.limits["HEADER_BYTES"] - len(self.header)]
+        try:
+            # Image.open() only parses the header; pixel data is never decoded here
+            with Image.open(io.BytesIO(self.header)) as image:
+                fmt, size = image.format, image.size
+        except Image.DecompressionBombError:
+            self._reject(InvalidImageUpload(f"{self.file_name} has too many pixels to process."))
+        except (UnidentifiedImageError, OSError, SyntaxError):
+            # Header not complete yet (large EXIF blocks), unless we've read all we allow
+            if len(self.header) >= self.limits["HEADER_BYTES"]:
+                self._reject(InvalidImageUpload(f"{self.file_name} is not a readable image."))
+            return
+
+        if fmt not in self.limits["IMAGE_FORMATS"]:
+            self._reject(InvalidImageUpload(f"{self.file_name} is not a supported image type."))
+        if size[0] * size[1] > self.limits["MAX_PIXELS"]:
+            self._reject(InvalidImageUpload(f"{self.file_name} is {size[0]}x{size[1]} pixels, too large to process."))
+        self.image_info = (fmt, size)
+        self.header = bytearray()
+
+    def _reject(self, error):
+        self.upload_interrupted()
+        raise error
+
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+
+def save_files(instances, field_name):
+    """
+    Save the pending (uncommitted) `field_name` file of each instance to
+    storage in parallel. Model.save() / bulk_create() then skip them.
+    """
+    pending = [
+        getattr(instance, field_name)
+        for instance in instances
+        if getattr(instance, field_name) and not getattr(instance, field_name)._committed
+    ]
+    if not pending:
+        return
+
+    def save(field_file):
+        field_file.save(field_file.name, field_file.file, save=False)
+
+    workers = min(get_upload_limits()["SAVE_WORKERS"], len(pending))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload-save") as pool:
+        # list() re-raises the first storage error, if any
+        list(pool.map(save, pending))
@@ -13,10 +13,13 @@ The root-level inclusion has been removed.
 """
 
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from project.metrics import metrics_view
+from project.storage import serve_media
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
@@ -25,8 +28,20 @@ urlpatterns = [
 
     # Store endpoints — all prefixed with /api/
     path('api/', include('store.urls')),
+
+    # Prometheus scrape target (internal only, see project/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
+# Media (content-addressed files get immutable cache headers, see project/storage.py)
+if settings.DEBUG or settings.SERVE_MEDIA:
+    urlpatterns += [
+        re_path(
+            r"^%s(?P<path>.*)$" % settings.MEDIA_URL.lstrip("/"),
+            serve_media,
+            {"document_root": settings.MEDIA_ROOT},
+        ),
+    ]
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "store"
+
+    def ready(self):
+        from . import images, media
+
+        images.connect_signals()
+        media.connect_signals()
@@ -0,0 +1,134 @@
+"""
+HTTP Cache Policy for Smart Shop E-commerce Platform
+
+Declarative per-view Cache-Control so browsers and a reverse proxy
+(nginx / varnish / a CDN) can absorb catalog traffic:
+
+    @cache_policy("catalog", surrogate_keys=product_surrogate_keys)
+    @api_view(["GET"])
+    ...
+
+Named policies live in settings.CACHE_POLICIES:
+    catalog  → public reads, short browser TTL, longer shared (s-maxage) TTL
+    private  → per-user data (cart, wishlist, my orders), browser only
+    admin    → never stored anywhere
+
+Every response carries `Vary: Authorization, Accept-Encoding`. A "catalog"
+response served to an authenticated request is downgraded to "private",
+because staff and owners may see products the public cannot; so is any
+non-200/304 catalog response, so 404s are never shared.
+
+`surrogate_keys` extracts product/category ids from the response data and
+emits them (space separated) in the surrogate-key header so the proxy can
+purge by key when a product or category changes.
+"""
+
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+
+DEFAULT_CACHE_POLICIES = {
+    "catalog": {"public": True, "max_age": 60, "s_maxage": 300, "stale_while_revalidate": 60},
+    "private": {"private": True, "no_cache": True},
+    "admin": {"no_store": True, "private": True},
+}
+
+# Header names understood by common proxies: Surrogate-Key (Fastly),
+# xkey (varnish-modules), Cache-Tag (Cloudflare)
+SURROGATE_KEY_HEADER = getattr(settings, "SURROGATE_KEY_HEADER", "Surrogate-Key")
+MAX_SURROGATE_KEYS = 256
+
+
+def get_policy(name):
+    policies = dict(DEFAULT_CACHE_POLICIES)
+    policies.update(getattr(settings, "CACHE_POLICIES", {}))
+    return policies[name]
+
+
+def cache_policy(name, surrogate_keys=None):
+    """
+    Apply the named policy to every response of a view.
+
+    Place it ABOVE @api_view so it also covers 304s and DRF error responses.
+    """
+    get_policy(name)  # fail fast on unknown policy names at import time
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            if response.has_header("Cache-Control"):
+                return response
+
+            policy = get_policy(name)
+            if policy.get("public") and (
+                "HTTP_AUTHORIZATION" in request.META
+                or response.status_code not in (200, 304)
+            ):
+                policy = get_policy("private")
+
+            patch_cache_control(response, **policy)
+            patch_vary_headers(response, ("Authorization", "Accept-Encoding"))
+
+            if surrogate_keys and response.status_code == 200:
+                keys = list(dict.fromkeys(surrogate_keys(getattr(response, "data", None))))
+                if keys:
+                    response[SURROGATE_KEY_HEADER] = " ".join(keys[:MAX_SURROGATE_KEYS])
+            return response
+
+        return inner
+
+    return decorator
+
+
+# =============================================================================
+# SURROGATE KEY EXTRACTORS
+# =============================================================================
+
+
+def _iter_products(data):
+    """Yield every serialized product dict found in the response data."""
+    if isinstance(data, list):
+        for item in data:
+            yield from _iter_products(item)
+    elif isinstance(data, dict):
+        if "id" in data and "final_price" in data:
+            yield data
+            return
+        for value in data.values():
+            if isinstance(value, (list, dict)):
+                yield from _iter_products(value)
+
+
+def product_surrogate_keys(data):
+    yield "products"
+    for product in _iter_products(data):
+        yield f"product-{product['id']}"
+        if product.get("category"):
+            yield f"category-{product['category']}"
+
+
+def review_surrogate_keys(data):
+    yield "products"
+    yield f"product-{data['id']}"
+
+
+def category_surrogate_keys(data):
+    yield "categories"
+    for category in data or []:
+        yield f"category-{category['id']}"
+
+
+def shop_view_surrogate_keys(data):
+    yield from category_surrogate_keys(data)
+    yield from product_surrogate_keys(data)
+
+
+def tag_surrogate_keys(data):
+    yield "tags"
+
+
+def settings_surrogate_keys(data):
+    yield "settings"
@@ -0,0 +1,386 @@
+"""
+In-process Catalog Index for Smart Shop E-commerce Platform
+
+Optional (settings.CATALOG_INDEX["ENABLED"]). Each worker keeps the columns
+get_products filters and sorts on as NumPy arrays, one row per product:
+
+    id, category, approval status, is_active, price, final price (cents),
+    stock, rating, units sold, created_at, updated_at  (+ lowercased search text)
+
+A listing request is then answered without touching the products table:
+boolean masks select the rows (visibility, category, stock band, price
+range, keyword), a presorted permutation per views.PRODUCT_SORTS entry
+gives the order, and only the requested page of
+ids is hydrated from the database. The conditional-GET validators
+(count + newest updated_at of the result) come from the same arrays.
+
+Freshness: every REFRESH_INTERVAL seconds a background thread loads the
+products whose updated_at passed the index's watermark and swaps in a new
+snapshot (readers never see a half-updated one). Deletes don't move the
+watermark, so a changed row count, or FULL_REFRESH_INTERVAL, triggers a
+full rebuild. Results may therefore lag writes by about REFRESH_INTERVAL
+seconds. Until the first snapshot exists, `search()` returns None and
+the caller queries SQL as before.
+
+Memory is about 110 bytes per product (with every sort in use) plus twice
+its search text; set "KEYWORD_SEARCH": False to leave keyword queries to
+SQL and drop the text.
+"""
+
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+
+from project.metrics import record_cache
+
+from .conditional import make_etag
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": False,
+    "REFRESH_INTERVAL": 5,
+    "FULL_REFRESH_INTERVAL": 600,
+    "KEYWORD_SEARCH": True,
+    # Seconds re-read before the watermark on each refresh (slow commits)
+    "WATERMARK_LAG": 30,
+    # Refresh in a daemon thread; False refreshes inline (tests, scripts)
+    "BACKGROUND": True,
+}
+
+APPROVAL_CODES = {code: i for i, (code, _) in enumerate(Product.APPROVAL_CHOICES)}
+# Separates one product's text from the next; never typed into a search box
+ROW_SEPARATOR = "\x00"
+
+FIELDS = (
+    "id", "category_id", "category__name", "approval_status", "is_active", "price",
+    "effective_price", "count_in_stock", "rating", "units_sold_recent", "created_at",
+    "updated_at",
+)
+TEXT_FIELDS = ("name", "description", "brand")
+COLUMNS = (
+    "ids", "category", "approval", "active", "price", "final_price",
+    "stock", "rating", "units_sold", "created_at", "updated_at",
+)
+
+
+def get_index_config():
+    return {**DEFAULTS, **getattr(settings, "CATALOG_INDEX", {})}
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _micros(value):
+    # Exact: validators compare these with updated_at to the microsecond
+    return (value - EPOCH) // MICROSECOND
+
+
+def _cents(value):
+    return int(value * 100)
+
+
+def _columns(rows):
+    """values_list(*FIELDS) rows -> dict of column arrays."""
+    column = dict(zip(FIELDS, zip(*rows))) if rows else {field: () for field in FIELDS}
+    return {
+        "ids": np.array(column["id"], dtype=np.int64),
+        "category": np.array([c if c is not None else -1 for c in column["category_id"]], dtype=np.int64),
+        "approval": np.array([APPROVAL_CODES.get(a, -1) for a in column["approval_status"]], dtype=np.int8),
+        "active": np.array(column["is_active"], dtype=bool),
+        # Whole cents: price filters compare exactly, like the SQL decimals
+        "price": np.array([_cents(p) for p in column["price"]], dtype=np.int64),
+        "final_price": np.array([_cents(p) for p in column["effective_price"]], dtype=np.int64),
+        "stock": np.array(column["count_in_stock"], dtype=np.int64),
+        "rating": np.array(column["rating"], dtype=np.float64),
+        "units_sold": np.array(column["units_sold_recent"], dtype=np.int64),
+        "created_at": np.array([_micros(c) for c in column["created_at"]], dtype=np.int64),
+        "updated_at": np.array([_micros(u) for u in column["updated_at"]], dtype=np.int64),
+    }
+
+
+class CatalogSnapshot:
+    """Immutable column arrays for every product, sorted by id."""
+
+    def __init__(self, columns, texts, categories, watermark):
+        self.columns = columns
+        self.texts = texts  # per-product search text, or None
+        self.categories = categories  # slug -> id
+        self.watermark = watermark
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+        if texts is not None:
+            self.text = ROW_SEPARATOR.join(texts)
+            lengths = np.fromiter((len(t) + 1 for t in texts), dtype=np.int64, count=len(texts))
+            self.text_starts = np.cumsum(lengths) - lengths
+
+        self._orderings = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    # -------------------------------------------------------------------------
+    # queries
+    # -------------------------------------------------------------------------
+
+    def ordering(self, sort):
+        """
+        Positions in views.PRODUCT_SORTS[sort] order, sorted on first use.
+        Ties break on id in the same direction as the SQL ordering.
+        """
+        if sort not in self._orderings:
+            keys = {
+                "newest": (-self.ids, -self.created_at),
+                "price_asc": (self.ids, self.final_price),
+                "price_desc": (-self.ids, -self.final_price),
+                "top_rated": (-self.ids, -self.rating),
+                "best_selling": (-self.ids, -self.units_sold),
+            }[sort]
+            self._orderings[sort] = np.lexsort(keys)
+        return self._orderings[sort]
+
+    def select(self, staff, approval_status=None, category_slug=None, stock_status=None,
+               keyword=None, sort="newest", min_price=None, max_price=None):
+        """
+        Product ids matching the get_products filters, in display order, and
+        the newest updated_at among them (datetime or None). None when the
+        query can't be answered here (keyword search disabled).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if not staff:
+            mask &= (self.approval == APPROVAL_CODES["approved"]) & self.active
+        elif approval_status and approval_status != "all":
+            mask &= self.approval == APPROVAL_CODES.get(approval_status, -2)
+
+        if keyword:
+            if self.texts is None:
+                return None
+            mask &= self._keyword_mask(keyword.lower())
+
+        if category_slug and category_slug != "all":
+            mask &= self.category == self.categories.get(category_slug, -2)
+
+        if stock_status == "in-stock":
+            mask &= self.stock > 5
+        elif stock_status == "low-stock":
+            mask &= (self.stock > 0) & (self.stock <= 5)
+        elif stock_status == "out-of-stock":
+            mask &= self.stock == 0
+
+        # Decimal bounds: >= 9.995 means >= 1000 cents, <= 9.995 means <= 999
+        if min_price is not None:
+            mask &= self.final_price >= math.ceil(min_price * 100)
+        if max_price is not None:
+            mask &= self.final_price <= math.floor(max_price * 100)
+
+        order = self.ordering(sort)
+        positions = order[mask[order]]
+        last_modified = None
+        if len(positions):
+            last_modified = EPOCH + int(self.updated_at[positions].max()) * MICROSECOND
+        return self.ids[positions], last_modified
+
+    def _keyword_mask(self, keyword):
+        """Rows whose text contains `keyword` (str.find scans at C speed)."""
+        mask = np.zeros(len(self), dtype=bool)
+        if ROW_SEPARATOR in keyword:
+            return mask
+        start = 0
+        while True:
+            start = self.text.find(keyword, start)
+            if start < 0:
+                return mask
+            row = int(np.searchsorted(self.text_starts, start, side="right")) - 1
+            mask[row] = True
+            # One hit per row is enough: continue with the next row
+            if row + 1 == len(self):
+                return mask
+            start = int(self.text_starts[row + 1])
+
+    def merge(self, rows, texts, categories, watermark):
+        """New snapshot with `rows` (values_list(*FIELDS)) inserted or replaced."""
+        changed = _columns(rows)
+        count = len(self)
+        positions = np.searchsorted(self.ids, changed["ids"])
+        exists = (positions < count) & (self.ids[np.minimum(positions, max(count - 1, 0))] == changed["ids"]) \
+            if count else np.zeros(len(rows), dtype=bool)
+
+        columns = {}
+        for name in COLUMNS:
+            column = self.columns[name].copy()
+            column[positions[exists]] = changed[name][exists]
+            columns[name] = np.concatenate([column, changed[name][~exists]])
+        order = np.argsort(columns["ids"], kind="stable")
+        columns = {name: column[order] for name, column in columns.items()}
+
+        merged_texts = None
+        if self.texts is not None:
+            merged_texts = list(self.texts)
+            for position, text in zip(positions[exists], np.array(texts, dtype=object)[exists]):
+                merged_texts[position] = text
+            merged_texts += [text for text, new in zip(texts, ~exists) if new]
+            merged_texts = [merged_texts[i] for i in order]
+        return CatalogSnapshot(columns, merged_texts, categories, watermark)
+
+
+# =============================================================================
+# BUILD & REFRESH
+# =============================================================================
+
+
+def _product_text(name, description, brand, category_name):
+    # Same fields as the SQL keyword filter in views._filter_products
+    return "\n".join(part or "" for part in (name, description, brand, category_name)).lower()
+
+
+def _load(queryset, keyword_search):
+    fields = FIELDS + TEXT_FIELDS if keyword_search else FIELDS
+    rows, texts = [], [] if keyword_search else None
+    for row in queryset.order_by("pk").values_list(*fields).iterator(chunk_size=5000):
+        rows.append(row[: len(FIELDS)])
+        if keyword_search:
+            name, description, brand = row[len(FIELDS):]
+            texts.append(_product_text(name, description, brand, row[2]))
+    return rows, texts
+
+
+def _watermark():
+    return Product.objects.order_by("-updated_at").values_list("updated_at", flat=True).first()
+
+
+def _categories():
+    return dict(Category.objects.exclude(slug__isnull=True).values_list("slug", "id"))
+
+
+def build_snapshot():
+    """Load every product into a new snapshot."""
+    started = time.monotonic()
+    # Taken first: rows written while loading are loaded again next refresh
+    watermark = _watermark()
+    rows, texts = _load(Product.objects.all(), get_index_config()["KEYWORD_SEARCH"])
+    snapshot = CatalogSnapshot(_columns(rows), texts, _categories(), watermark)
+    logger.info("Catalog index built: %d products in %.2fs", len(snapshot), time.monotonic() - started)
+    return snapshot
+
+
+def refresh_snapshot(snapshot):
+    """`snapshot` with the products updated since its watermark merged in."""
+    config = get_index_config()
+    watermark = _watermark()
+    rows, texts = [], []
+    if snapshot.watermark is not None:
+        # Overlap: a transaction may commit a row stamped before the watermark
+        since = snapshot.watermark - timedelta(seconds=config["WATERMARK_LAG"])
+        rows, texts = _load(Product.objects.filter(updated_at__gte=since), config["KEYWORD_SEARCH"])
+    elif watermark is not None:
+        return build_snapshot()
+
+    if rows:
+        changed = _columns(rows)
+        positions = np.searchsorted(snapshot.ids, changed["ids"])
+        known = positions < len(snapshot)
+        same = np.zeros(len(rows), dtype=bool)
+        same[known] = (snapshot.ids[positions[known]] == changed["ids"][known]) & (
+            snapshot.updated_at[positions[known]] == changed["updated_at"][known]
+        )
+        if not same.all():
+            snapshot = snapshot.merge(rows, texts, _categories(), watermark or snapshot.watermark)
+
+    if Product.objects.count() != len(snapshot):
+        # Rows were deleted: only a full load can tell which
+        return build_snapshot()
+    return snapshot
+
+
+class CatalogIndex:
+    """The current snapshot of this worker, refreshed at most every REFRESH_INTERVAL seconds."""
+
+    def __init__(self):
+        self.snapshot = None
+        self.checked_at = 0.0
+        self.built_at = 0.0
+        self.lock = threading.Lock()
+
+    def get(self):
+        config = get_index_config()
+        now = time.monotonic()
+        if now - self.checked_at >= config["REFRESH_INTERVAL"] and self.lock.acquire(blocking=False):
+            self.checked_at = now
+            if config["BACKGROUND"]:
+                threading.Thread(target=self._refresh, name="catalog-index", daemon=True).start()
+            else:
+                self._refresh(in_thread=False)
+        return self.snapshot
+
+    def _refresh(self, in_thread=True):
+        config = get_index_config()
+        try:
+            if self.snapshot is None or time.monotonic() - self.built_at >= config["FULL_REFRESH_INTERVAL"]:
+                self.snapshot = build_snapshot()
+                self.built_at = time.monotonic()
+            else:
+                self.snapshot = refresh_snapshot(self.snapshot)
+        except Exception:
+            logger.exception("Catalog index refresh failed")
+        finally:
+            self.lock.release()
+            if in_thread:
+                # The thread opened its own connection
+                connection.close()
+
+    def reset(self):
+        with self.lock:
+            self.snapshot = None
+            self.checked_at = self.built_at = 0.0
+
+
+catalog_index = CatalogIndex()
+
+
+def search(request, sort="newest", min_price=None, max_price=None):
+    """
+    (ids in display order, etag, last_modified) for a get_products request,
+    or None to use SQL (index disabled, not built yet, or query unsupported).
+    The sort and price bounds come parsed from views._listing_options.
+    Computed once per request: the validators and the view both ask.
+    """
+    cached = getattr(request, "_catalog_index_result", False)
+    if cached is not False:
+        return cached
+
+    result = None
+    if get_index_config()["ENABLED"]:
+        snapshot = catalog_index.get()
+        params = request.query_params
+        selected = snapshot and snapshot.select(
+            staff=request.user.is_staff,
+            approval_status=params.get("approval_status"),
+            category_slug=params.get("category"),
+            stock_status=params.get("stock_status"),
+            keyword=params.get("keyword"),
+            sort=sort,
+            min_price=min_price,
+            max_price=max_price,
+        )
+        if selected:
+            ids, last_modified = selected
+            # Same parts as conditional.queryset_validators over the SQL result
+            etag = make_etag(
+                last_modified.isoformat() if last_modified else "-",
+                len(ids),
+                request.user.is_staff,
+                params.urlencode(),
+            )
+            result = (ids, etag, last_modified)
+        record_cache("catalog_index", hit=result is not None)
+    request._catalog_index_result = result
+    return result
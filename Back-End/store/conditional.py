@@ -0,0 +1,146 @@
+"""
+Conditional GET Support for Smart Shop E-commerce Platform
+
+Catalog and settings endpoints emit ETag / Last-Modified validators and
+answer If-None-Match / If-Modified-Since with 304 Not Modified.
+
+Validators are computed from one cheap aggregate (max `updated_at` plus row
+count) BEFORE the view body runs, so a 304 never touches a serializer.
+Writes that change a product's payload without saving the product itself
+(gallery deletes, tag or category renames) touch `Product.updated_at` so the
+validators stay correct.
+"""
+
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from project.metrics import record_cache
+from .models import Category, Product, StoreSettings, Tag
+
+
+def conditional(validators_func):
+    """
+    Decorate a GET view with ETag / Last-Modified handling.
+
+    `validators_func(request, *args, **kwargs)` returns `(etag, last_modified)`
+    where either may be None. Place it below @permission_classes so it sees
+    the authenticated DRF request.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view_func(request, *args, **kwargs)
+
+            etag, last_modified = validators_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag else None
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            )
+            record_cache("http_conditional", hit=response is not None)
+            if response is None:
+                response = view_func(request, *args, **kwargs)
+
+            if response.status_code in (200, 304):
+                if etag and not response.has_header("ETag"):
+                    response["ETag"] = etag
+                if timestamp and not response.has_header("Last-Modified"):
+                    response["Last-Modified"] = http_date(timestamp)
+            return response
+
+        return inner
+
+    return decorator
+
+
+def make_etag(*parts):
+    """Hash the validator parts into a short opaque ETag value."""
+    raw = "|".join(str(part) for part in parts)
+    return hashlib.md5(raw.encode(), usedforsecurity=False).hexdigest()
+
+
+def queryset_validators(queryset, *extra):
+    """(etag, last_modified) from max(updated_at) + count of a queryset."""
+    stats = queryset.order_by().aggregate(
+        last_modified=Max("updated_at"), count=Count("id")
+    )
+    last_modified = stats["last_modified"]
+    etag = make_etag(
+        last_modified.isoformat() if last_modified else "-", stats["count"], *extra
+    )
+    return etag, last_modified
+
+
+def touch_products(queryset):
+    """Bump `updated_at` on products whose payload changed indirectly."""
+    queryset.update(updated_at=timezone.now())
+
+
+# =============================================================================
+# VALIDATORS PER ENDPOINT
+# =============================================================================
+
+
+def product_validators(request, slug):
+    lookup = {"pk": slug} if slug.isdigit() else {"slug": slug}
+    row = Product.objects.filter(**lookup).values_list("id", "updated_at").first()
+    if row is None:
+        return None, None
+    product_id, updated_at = row
+    return make_etag(product_id, updated_at.isoformat()), updated_at
+
+
+def review_list_validators(request, pk):
+    # Review writes bump the product's updated_at (Product.adjust_rating)
+    return product_validators(request, str(pk))
+
+
+def category_validators(request):
+    # product_count in the payload depends on the public product set too
+    etag, last_modified = queryset_validators(Category.objects.all())
+    product_etag, product_modified = queryset_validators(
+        Product.objects.filter(approval_status="approved", is_active=True)
+    )
+    if product_modified and (not last_modified or product_modified > last_modified):
+        last_modified = product_modified
+    return make_etag(etag, product_etag), last_modified
+
+
+def shop_view_validators(request):
+    # One joined aggregate: the shop view only shows categories with public products
+    public = Q(products__approval_status="approved", products__is_active=True)
+    stats = Category.objects.aggregate(
+        categories_modified=Max("updated_at"),
+        categories=Count("id", distinct=True),
+        products_modified=Max("products__updated_at", filter=public),
+        products=Count("products", filter=public),
+    )
+    stamps = [stats["categories_modified"], stats["products_modified"]]
+    last_modified = max((stamp for stamp in stamps if stamp), default=None)
+    etag = make_etag(
+        *(stamp.isoformat() if stamp else "-" for stamp in stamps),
+        stats["categories"],
+        stats["products"],
+    )
+    return etag, last_modified
+
+
+def tag_validators(request):
+    return queryset_validators(Tag.objects.all())
+
+
+def store_settings_validators(request):
+    updated_at = (
+        StoreSettings.objects.filter(pk=1).values_list("updated_at", flat=True).first()
+    )
+    if updated_at is None:
+        return None, None
+    return make_etag("settings", updated_at.isoformat()), updated_at
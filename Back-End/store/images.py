@@ -0,0 +1,183 @@
+"""
+Image Derivatives for Smart Shop E-commerce Platform
+
+Every product image (Product.image and ProductImage.image) gets resized
+copies in settings.IMAGE_DERIVATIVES["SIZES"] (thumb / card / detail by
+default), each encoded as WebP and JPEG, stored under
+
+    derivatives/<original name without extension>/<size>.<format>
+
+Generation runs in a thread pool after the transaction commits, so uploads
+return as soon as the originals are saved. When done, the worker writes the
+derivative names to the row's `image_variants` JSON field:
+
+    {"source": "products/shoe.png",
+     "thumb": {"webp": "derivatives/products/shoe/thumb.webp", "jpeg": ...},
+     ...}
+
+`source` ties the map to one upload: replacing the image makes the map stale
+and schedules a new run. Serializers expose the map as URLs via
+`variant_urls()`; it stays empty until generation finishes, so clients fall
+back to the original `image`.
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models.signals import post_save
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "SIZES": {"thumb": (150, 150), "card": (400, 400), "detail": (1024, 1024)},
+    "FORMATS": {
+        "webp": {"quality": 80, "method": 4},
+        "jpeg": {"quality": 82, "optimize": True, "progressive": True},
+    },
+    "WORKERS": 2,
+    "PATH": "derivatives",
+}
+
+PIL_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, "IMAGE_DERIVATIVES", {})}
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_config()["WORKERS"],
+                thread_name_prefix="image-derivatives",
+            )
+        return _executor
+
+
+# =============================================================================
+# GENERATION
+# =============================================================================
+
+
+def derivative_name(source, size, fmt):
+    base, _ = os.path.splitext(source)
+    return f"{get_config()['PATH']}/{base}/{size}.{EXTENSIONS[fmt]}"
+
+
+def render_variants(source):
+    """Resize `source` (a storage name) into every size and format; returns the map."""
+    config = get_config()
+    with default_storage.open(source, "rb") as fh:
+        original = Image.open(fh)
+        original = ImageOps.exif_transpose(original)
+        original.load()
+
+    variants = {"source": source}
+    for size, box in config["SIZES"].items():
+        resized = original.copy()
+        # thumbnail() keeps the aspect ratio and never upscales
+        resized.thumbnail(box, Image.LANCZOS)
+        variants[size] = {}
+        for fmt, options in config["FORMATS"].items():
+            image = resized
+            if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            elif image.mode not in ("RGB", "RGBA", "L"):
+                image = image.convert("RGBA")
+            buffer = io.BytesIO()
+            image.save(buffer, PIL_FORMATS[fmt], **options)
+
+            name = derivative_name(source, size, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[size][fmt] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def _generate(model, pk, source):
+    close_old_connections()
+    try:
+        variants = render_variants(source)
+        # Only if the row still points at the image we rendered
+        updated = model.objects.filter(pk=pk, image=source).update(image_variants=variants)
+        if updated:
+            product_id = pk if model is Product else (
+                ProductImage.objects.filter(pk=pk).values_list("product_id", flat=True).first()
+            )
+            # Payload changed: refresh ETags and cache keys (store/conditional.py)
+            Product.objects.filter(pk=product_id).update(updated_at=timezone.now())
+        logger.info("Image derivatives generated for %s %s (%s)", model.__name__, pk, source)
+    except Exception:
+        logger.exception("Image derivatives failed for %s %s (%s)", model.__name__, pk, source)
+    finally:
+        _pending.discard((model.__name__, pk, source))
+        connection.close()
+
+
+def schedule_derivatives(instance):
+    """Queue generation for `instance` once the current transaction commits."""
+    if not get_config()["ENABLED"] or not instance.image:
+        return
+    source = instance.image.name
+    if (instance.image_variants or {}).get("source") == source:
+        return
+    key = (type(instance).__name__, instance.pk, source)
+    if key in _pending:
+        return
+    _pending.add(key)
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: _get_executor().submit(_generate, model, pk, source))
+
+
+def _on_image_saved(sender, instance, **kwargs):
+    schedule_derivatives(instance)
+
+
+def connect_signals():
+    """Called from StoreConfig.ready(). bulk_create callers schedule explicitly."""
+    post_save.connect(_on_image_saved, sender=Product, dispatch_uid="product_image_derivatives")
+    post_save.connect(_on_image_saved, sender=ProductImage, dispatch_uid="gallery_image_derivatives")
+
+
+# =============================================================================
+# SERIALIZATION
+# =============================================================================
+
+
+def variant_names(variants):
+    """Every storage name in a variants map."""
+    for size, formats in (variants or {}).items():
+        if size != "source":
+            yield from formats.values()
+
+
+def variant_urls(variants, request=None):
+    """{"thumb": {"webp": url, "jpeg": url}, ...} from a stored variants map."""
+    urls = {}
+    for size, formats in (variants or {}).items():
+        if size == "source":
+            continue
+        urls[size] = {}
+        for fmt, name in formats.items():
+            url = default_storage.url(name)
+            urls[size][fmt] = request.build_absolute_uri(url) if request else url
+    return urls
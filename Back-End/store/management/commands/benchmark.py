@@ -0,0 +1,438 @@
+"""
+Endpoint Latency Benchmark for Smart Shop E-commerce Platform
+
+Drives every named route in store/urls.py and users/urls.py through Django's
+test client against the current (ideally seeded, see seed_store) database:
+
+    python manage.py benchmark --iterations 50 --output bench/HEAD.json
+    python manage.py benchmark --compare bench/main.json --threshold 0.15
+
+Per endpoint it reports p50 / p95 / p99 latency, SQL queries per request and
+response bytes. Results are written as JSON so two commits can be compared;
+`--compare` flags endpoints whose p95 latency or response size grew past the
+threshold, or whose query count went up at all.
+
+Everything runs inside one transaction that is rolled back at the end, and
+each request runs in its own savepoint, so write endpoints (orders, carts,
+deletes) are measured without changing the database. Throttle buckets, the
+tiered cache L2 and the coalescing locks use private LocMem caches for the
+run, so nothing built from the bench rows reaches the shared cache.
+"""
+
+import json
+import subprocess
+import time
+from decimal import Decimal
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from project.cache import tiered_cache
+from project.query_budget import QueryRecorder, iter_url_names
+from store.models import (
+    Category,
+    Tag,
+    Product,
+    ProductImage,
+    Review,
+    Order,
+    OrderItem,
+    ShippingAddress,
+    CartItem,
+)
+from users.models import Profile
+
+API_URLCONFS = ("store.urls", "users.urls")
+BENCH_THROTTLE_CACHE = "benchmark-throttle"
+BENCH_CACHE = "benchmark-cache"
+PASSWORD = "Bench-Password-123"
+
+
+class Rollback(Exception):
+    """Raised to discard everything the benchmark wrote."""
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Command(BaseCommand):
+    help = "Benchmark every API route and optionally compare with a previous run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--only", nargs="*", default=None,
+                            help="Limit the run to these URL names")
+        parser.add_argument("--accept-encoding", default="",
+                            help="Send this Accept-Encoding (measures compressed bytes)")
+        parser.add_argument("--output", default=None, help="Write JSON results here")
+        parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+        parser.add_argument("--threshold", type=float, default=0.20,
+                            help="Relative p95 / bytes growth counted as a regression")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        self.options = options
+        results = {}
+
+        # Email goes nowhere; throttles and budgets must not skew the numbers.
+        # Throttle state, cached payloads and coalescing locks go to private
+        # caches: they are built from bench rows that are rolled back, and
+        # must never be served to real traffic from the shared cache.
+        private = {
+            alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": alias}
+            for alias in (BENCH_THROTTLE_CACHE, BENCH_CACHE)
+        }
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            QUERY_BUDGET_RAISE=False,
+            CACHES={**settings.CACHES, **private},
+            THROTTLE_CACHE=BENCH_THROTTLE_CACHE,
+            TIERED_CACHE={**getattr(settings, "TIERED_CACHE", {}), "L2": BENCH_CACHE},
+            REQUEST_COALESCE_CACHE=BENCH_CACHE,
+        ):
+            tiered_cache.l1.clear()
+            try:
+                with transaction.atomic():
+                    self.fixtures = self.build_fixtures()
+                    self.client = Client(
+                        HTTP_HOST=self._host(),
+                        HTTP_ACCEPT_ENCODING=options["accept_encoding"],
+                        raise_request_exception=False,
+                    )
+                    for name, spec in self.endpoint_specs().items():
+                        if options["only"] and name not in options["only"]:
+                            continue
+                        results[name] = self.measure(name, spec)
+                        self._print_row(name, results[name])
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                tiered_cache.l1.clear()
+                for alias in private:
+                    caches[alias].clear()
+
+        api_routes = set()
+        for urlconf in API_URLCONFS:
+            api_routes.update(iter_url_names(import_module(urlconf).urlpatterns))
+        skipped = sorted(api_routes - set(self.endpoint_specs()))
+        if skipped:
+            self.stdout.write(f"No benchmark spec for: {', '.join(skipped)}")
+
+        report = {
+            "commit": self._git_commit(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "iterations": options["iterations"],
+            "accept_encoding": options["accept_encoding"],
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+        if options["compare"]:
+            regressions = self.compare(report, options["compare"], options["threshold"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} endpoint(s) regressed")
+
+    # -------------------------------------------------------------------------
+    # measurement
+    # -------------------------------------------------------------------------
+
+    def measure(self, name, spec):
+        method = spec.get("method", "get")
+        url = reverse(name, args=spec.get("args", lambda f: None)(self.fixtures))
+        headers = {}
+        role = spec.get("role")
+        if role:
+            headers["HTTP_AUTHORIZATION"] = f"Bearer {self.fixtures['tokens'][role]}"
+
+        timings, queries, sizes, statuses = [], [], [], set()
+        for i in range(self.options["warmup"] + self.options["iterations"]):
+            data = spec.get("data", lambda f: None)(self.fixtures)
+            kwargs = dict(headers)
+            if method != "get":
+                kwargs["format"] = spec.get("format", "json")
+            caches[BENCH_THROTTLE_CACHE].clear()
+
+            recorder = QueryRecorder()
+            sid = transaction.savepoint()
+            try:
+                with connection.execute_wrapper(recorder):
+                    start = time.perf_counter()
+                    response = self._request(method, url, data, **kwargs)
+                    body = (
+                        b"".join(response.streaming_content)
+                        if response.streaming else response.content
+                    )
+                    elapsed = time.perf_counter() - start
+            finally:
+                transaction.savepoint_rollback(sid)
+
+            if i < self.options["warmup"]:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(recorder.count)
+            sizes.append(len(body))
+            statuses.add(response.status_code)
+
+        timings.sort()
+        return {
+            "method": method.upper(),
+            "path": url,
+            "status": sorted(statuses),
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3) if timings else 0.0,
+            "queries": max(queries) if queries else 0,
+            "bytes": max(sizes) if sizes else 0,
+        }
+
+    def _request(self, method, url, data, format=None, **headers):
+        if method == "get":
+            return self.client.get(url, data or {}, secure=True, **headers)
+        if format == "multipart" and method == "post":
+            return self.client.post(url, data or {}, secure=True, **headers)
+        if format == "multipart":
+            # Client.put/patch don't multipart-encode on their own
+            return getattr(self.client, method)(
+                url, encode_multipart(BOUNDARY, data or {}),
+                content_type=MULTIPART_CONTENT, secure=True, **headers,
+            )
+        return getattr(self.client, method)(
+            url, json.dumps(data or {}), content_type="application/json",
+            secure=True, **headers,
+        )
+
+    def compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as fh:
+            baseline = json.load(fh)
+
+        regressions = []
+        for name, current in sorted(report["results"].items()):
+            previous = baseline.get("results", {}).get(name)
+            if not previous:
+                continue
+            reasons = []
+            if previous["p95_ms"] and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                reasons.append(f"p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+            if current["queries"] > previous["queries"]:
+                reasons.append(f"queries {previous['queries']} -> {current['queries']}")
+            if previous["bytes"] and current["bytes"] > previous["bytes"] * (1 + threshold):
+                reasons.append(f"bytes {previous['bytes']} -> {current['bytes']}")
+            if reasons:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"REGRESSION {name}: {'; '.join(reasons)}"))
+
+        self.stdout.write(
+            f"Compared with {baseline.get('commit') or baseline_path}: "
+            f"{len(regressions)} regression(s)"
+        )
+        return regressions
+
+    def _print_row(self, name, row):
+        self.stdout.write(
+            f"{row['method']:6} {name:28} p50 {row['p50_ms']:8.2f}ms  "
+            f"p95 {row['p95_ms']:8.2f}ms  p99 {row['p99_ms']:8.2f}ms  "
+            f"{row['queries']:3d} q  {row['bytes']:8d} B  {row['status']}"
+        )
+
+    @staticmethod
+    def _host():
+        for host in settings.ALLOWED_HOSTS:
+            if host and "*" not in host and not host.startswith("."):
+                return host
+        return "localhost"
+
+    @staticmethod
+    def _git_commit():
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    # -------------------------------------------------------------------------
+    # fixtures & specs
+    # -------------------------------------------------------------------------
+
+    def build_fixtures(self):
+        """Bench-owned rows on top of whatever data is already there."""
+        def make_user(name, **extra):
+            user = User.objects.create_user(
+                f"bench-{name}@example.com", f"bench-{name}@example.com", PASSWORD, **extra
+            )
+            Profile.objects.create(user=user, user_type="vendor" if name == "vendor" else "customer")
+            return user
+
+        admin = make_user("admin", is_staff=True)
+        vendor = make_user("vendor")
+        customer = make_user("customer")
+        reviewer = make_user("reviewer")
+
+        category = Category.objects.create(name="Bench Category")
+        empty_category = Category.objects.create(name="Bench Empty Category")
+        tag = Tag.objects.create(name="bench-tag")
+
+        product = Product.objects.create(
+            user=vendor, category=category, name="Bench Product", slug="bench-product",
+            price=Decimal("99.00"), count_in_stock=1000, approval_status="approved",
+        )
+        product.tags.add(tag)
+        image = ProductImage.objects.create(product=product, image="product_gallery/bench.png")
+        Review.objects.create(product=product, user=reviewer, rating=4)
+        Product.adjust_rating(product.pk, added=4)
+        CartItem.objects.create(user=customer, product=product, qty=1)
+
+        order = Order.objects.create(user=customer, total_price=Decimal("99.00"))
+        ShippingAddress.objects.create(order=order, address="1 St", city="Cairo", country="EG")
+        OrderItem.objects.create(order=order, product=product, name=product.name, price=product.price)
+
+        # The most recent public product stands in for "a typical product page"
+        public = (
+            Product.objects.filter(approval_status="approved", is_active=True)
+            .exclude(pk=product.pk).order_by("-num_reviews").first()
+        ) or product
+
+        return {
+            "admin": admin, "vendor": vendor, "customer": customer, "reviewer": reviewer,
+            "category": category, "empty_category": empty_category, "tag": tag,
+            "product": product, "public_product": public, "image": image, "order": order,
+            "tokens": {
+                role: str(RefreshToken.for_user(user).access_token)
+                for role, user in (
+                    ("admin", admin), ("vendor", vendor),
+                    ("customer", customer), ("reviewer", reviewer),
+                )
+            },
+        }
+
+    def endpoint_specs(self):
+        def pk(key):
+            return lambda f: [f[key].pk]
+
+        def uid_token(f):
+            user = f["customer"]
+            return [urlsafe_base64_encode(force_bytes(user.pk)),
+                    default_token_generator.make_token(user)]
+
+        def new_user(f):
+            stamp = time.perf_counter_ns()
+            return {
+                "email": f"bench{stamp}@example.com", "user_type": "customer",
+                "password": PASSWORD, "confirm_password": PASSWORD,
+                "first_name": "Bench", "last_name": "User",
+            }
+
+        order_payload = lambda f: {
+            "order_items": [{"id": f["product"].pk, "qty": 1}],
+            "shipping_address": {"address": "1 St", "city": "Cairo", "country": "EG"},
+            "tax_price": "8.00", "shipping_price": "50.00", "payment_method": "PayPal",
+        }
+
+        return {
+            # ── store: public catalog ─────────────────────────────────────────
+            "products": {},
+            "top-products": {},
+            "shop-view": {},
+            "product-detail": {"args": lambda f: [f["public_product"].slug or f["public_product"].pk]},
+            "product-reviews": {"args": pk("public_product")},
+            "related-products": {"args": pk("public_product")},
+            "categories": {},
+            "tags": {},
+            "store-settings": {},
+            # ── store: vendor ─────────────────────────────────────────────────
+            "product-create": {
+                "method": "post", "role": "vendor", "format": "multipart",
+                "data": lambda f: {"name": "Bench New", "price": "10.00",
+                                   "category": f["category"].pk, "count_in_stock": "5"},
+            },
+            "my-products": {"role": "vendor"},
+            "product-update": {"method": "put", "role": "vendor", "args": pk("product"),
+                               "data": lambda f: {"name": "Bench Product v2", "price": "95.00"}},
+            "product-delete": {"method": "delete", "role": "vendor", "args": pk("product")},
+            "delete-product-image": {"method": "delete", "role": "vendor", "args": pk("image")},
+            "seller_orders": {"role": "vendor"},
+            # ── store: reviews ────────────────────────────────────────────────
+            "create-review": {"method": "post", "role": "customer", "args": pk("product"),
+                              "data": lambda f: {"rating": 5, "comment": "bench"}},
+            "update-review": {"method": "put", "role": "reviewer", "args": pk("product"),
+                              "data": lambda f: {"rating": 3}},
+            "delete-review": {"method": "delete", "role": "reviewer", "args": pk("product")},
+            # ── store: orders ─────────────────────────────────────────────────
+            "orders-add": {"method": "post", "role": "customer", "data": order_payload},
+            "myorders": {"role": "customer"},
+            "user-order": {"role": "customer", "args": pk("order")},
+            "pay": {"method": "put", "role": "customer", "args": pk("order"),
+                    "data": lambda f: {"payment_id": "bench"}},
+            "order-delivered": {"method": "put", "role": "admin", "args": pk("order")},
+            "delete-order": {"method": "delete", "role": "admin", "args": pk("order")},
+            "orders": {"role": "admin"},
+            "export_orders_csv": {"role": "admin"},
+            # ── store: cart & wishlist ────────────────────────────────────────
+            "cart-get": {"role": "customer"},
+            "cart-add": {"method": "post", "role": "customer",
+                         "data": lambda f: {"product_id": f["product"].pk, "qty": 1}},
+            "update_cart_item": {"method": "put", "role": "customer",
+                                 "data": lambda f: {"product_id": f["product"].pk, "qty": 2}},
+            "cart-remove": {"method": "delete", "role": "customer", "args": pk("product")},
+            "cart-clear": {"method": "delete", "role": "customer"},
+            "wishlist-get": {"role": "customer"},
+            "wishlist-toggle": {"method": "post", "role": "customer",
+                                "data": lambda f: {"product_id": f["product"].pk}},
+            # ── store: admin ──────────────────────────────────────────────────
+            "category-create": {"method": "post", "role": "admin",
+                                "data": lambda f: {"name": "Bench New Category"}},
+            "category-update": {"method": "put", "role": "admin", "args": pk("category"),
+                                "data": lambda f: {"name": "Bench Category v2"}},
+            "category-delete": {"method": "delete", "role": "admin", "args": pk("empty_category")},
+            "tag-create": {"method": "post", "role": "admin", "data": lambda f: {"name": "bench-new"}},
+            "tag-update": {"method": "put", "role": "admin", "args": pk("tag"),
+                           "data": lambda f: {"name": "bench-tag-v2"}},
+            "tag-delete": {"method": "delete", "role": "admin", "args": pk("tag")},
+            "dashboard-stats": {"role": "admin"},
+            "update-store-settings": {"method": "patch", "role": "admin",
+                                      "data": lambda f: {"shipping_cost": "40.00"}},
+            # ── users ─────────────────────────────────────────────────────────
+            "token_obtain_pair": {"method": "post", "data": lambda f: {
+                "username": f["customer"].username, "password": PASSWORD}},
+            "register": {"method": "post", "data": new_user},
+            "activate": {"method": "post", "args": uid_token},
+            "users-profile": {"role": "customer"},
+            "users-profile-update": {"method": "put", "role": "customer", "format": "multipart",
+                                     "data": lambda f: {"first_name": "Bench", "city": "Giza"}},
+            "user-change-password": {"method": "put", "role": "customer", "data": lambda f: {
+                "old_password": PASSWORD, "new_password": PASSWORD + "x",
+                "confirm_password": PASSWORD + "x"}},
+            "forgot-password": {"method": "post",
+                                "data": lambda f: {"email": f["customer"].email}},
+            "reset-password": {"method": "post", "args": uid_token, "data": lambda f: {
+                "password": PASSWORD + "y", "confirm_password": PASSWORD + "y"}},
+            "users": {"role": "admin"},
+            "user-detail": {"role": "admin", "args": pk("customer")},
+            "user-update": {"method": "put", "role": "admin", "args": pk("customer"),
+                            "data": lambda f: {"name": "Bench"}},
+            "user-delete": {"method": "delete", "role": "admin", "args": pk("reviewer")},
+        }
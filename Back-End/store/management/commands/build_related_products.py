@@ -0,0 +1,83 @@
+"""
+Rebuild the precomputed product neighbour lists (store/recommendations.py):
+
+    python manage.py build_related_products                  # both kinds
+    python manage.py build_related_products --kind bought_together --metric lift --top-k 20
+    python manage.py build_related_products --kind similar --incremental
+
+"Frequently bought together" is recomputed from the whole order history in
+bounded memory (--chunk-orders orders at a time, spilled into --buckets
+partitions); its new lists replace the old ones in one transaction. Run it
+nightly from cron.
+
+"Similar" compares product content category by category. --incremental
+only rebuilds the categories whose products changed since the last run,
+so it can run every few minutes between nightly full runs.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute frequently-bought-together and similar product lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind", choices=["bought_together", "similar", "all"], default="all",
+            help="Which lists to rebuild (default: all)",
+        )
+        parser.add_argument("--top-k", type=int, default=10, help="Neighbours kept per product")
+        # bought_together
+        parser.add_argument("--metric", choices=recommendations.METRICS, default="cosine")
+        parser.add_argument(
+            "--min-count", type=int, default=2,
+            help="Orders a pair must share to be recommended (default: 2)",
+        )
+        parser.add_argument(
+            "--max-basket", type=int, default=50,
+            help="Skip orders with more distinct products than this",
+        )
+        parser.add_argument("--chunk-orders", type=int, default=50_000, help="Orders read per chunk")
+        parser.add_argument("--buckets", type=int, default=16, help="Spill partitions (more = less memory)")
+        # similar
+        parser.add_argument("--incremental", action="store_true", help="Only rebuild changed categories")
+        parser.add_argument("--dims", type=int, default=2048, help="Hashed feature columns")
+        parser.add_argument(
+            "--min-score", type=float, default=0.05,
+            help="Cosine similarity below which products are not listed",
+        )
+
+    def handle(self, *args, **options):
+        kind = options["kind"]
+        if kind in ("bought_together", "all"):
+            started = time.monotonic()
+            orders, rows = recommendations.bought_together(
+                top_k=options["top_k"],
+                metric=options["metric"],
+                min_count=options["min_count"],
+                max_basket=options["max_basket"],
+                chunk_orders=options["chunk_orders"],
+                buckets=options["buckets"],
+                log=self.stdout.write if options["verbosity"] > 1 else None,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"bought_together: {orders} orders, {rows} neighbours stored "
+                f"in {time.monotonic() - started:.1f}s"
+            ))
+
+        if kind in ("similar", "all"):
+            started = time.monotonic()
+            products, rows = recommendations.similar(
+                top_k=options["top_k"],
+                dims=options["dims"],
+                min_score=options["min_score"],
+                incremental=options["incremental"],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"similar: {products} products compared, {rows} neighbours stored "
+                f"in {time.monotonic() - started:.1f}s"
+            ))
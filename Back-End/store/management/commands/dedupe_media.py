@@ -0,0 +1,130 @@
+"""
+Move media into the content-addressed storage and rebuild reference counts:
+
+    python manage.py dedupe_media                       # convert + recount
+    python manage.py dedupe_media --dry-run             # report only
+    python manage.py dedupe_media --delete-originals    # also remove the old copies
+
+Files uploaded before project/storage.py existed (products/, product_gallery/,
+profiles/) are re-saved under their content hash, so duplicates collapse into
+one blob, and their rows are pointed at it; order items linking the old
+file's URL are pointed at the blob's. MediaBlob.refcount is then recomputed
+from every reference in store/media.py REFERENCES and URL_REFERENCES.
+"""
+
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from project.storage import PREFIX, blob_name, content_digest, media_storage
+from store.media import REFERENCES, URL_REFERENCES, media_name
+from store.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = "Deduplicate media files into content-addressed storage and recount references"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report without changing anything")
+        parser.add_argument(
+            "--delete-originals", action="store_true",
+            help="Delete each legacy file once its row points at the blob",
+        )
+
+    def handle(self, *args, **options):
+        storage = media_storage()
+        dry_run = options["dry_run"]
+        moved = duplicates = missing = saved_bytes = 0
+        seen = set()
+
+        for model, field in REFERENCES:
+            legacy = (
+                model.objects.exclude(Q(**{f"{field}__isnull": True}) | Q(**{field: ""}))
+                .exclude(**{f"{field}__startswith": PREFIX})
+                .values_list("pk", field)
+            )
+            for pk, name in legacy.iterator(chunk_size=500):
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f"missing: {model.__name__} {pk} {name}")
+                    continue
+
+                with storage.open(name, "rb") as content:
+                    digest = content.sha256 = content_digest(content)
+                    size = storage.size(name)
+                    if digest in seen or storage.exists(blob_name(digest, name)):
+                        duplicates += 1
+                        saved_bytes += size
+                    seen.add(digest)
+                    moved += 1
+                    if dry_run:
+                        continue
+                    new_name = storage.save(name, content)
+
+                # Only if the row wasn't given another file meanwhile
+                updated = model.objects.filter(pk=pk, **{field: name}).update(**{field: new_name})
+                if updated:
+                    for url_model, url_field in URL_REFERENCES:
+                        url_model.objects.filter(**{url_field: storage.url(name)}).update(
+                            **{url_field: storage.url(new_name)}
+                        )
+                if updated and options["delete_originals"] and not self._referenced(name):
+                    storage.delete(name)
+
+        self.stdout.write(
+            f"{'Would move' if dry_run else 'Moved'} {moved} files "
+            f"({duplicates} duplicates, {saved_bytes / (1024 * 1024):.1f}MB reclaimable), {missing} missing"
+        )
+        if not dry_run:
+            self._recount()
+
+    def _referenced(self, name):
+        url = media_storage().url(name)
+        return any(
+            model.objects.filter(**{field: name}).exists() for model, field in REFERENCES
+        ) or any(
+            model.objects.filter(**{field: url}).exists() for model, field in URL_REFERENCES
+        )
+
+    def _recount(self):
+        counts = Counter()
+        for model, field in REFERENCES:
+            rows = (
+                model.objects.filter(**{f"{field}__startswith": PREFIX})
+                .values_list(field)
+                .annotate(n=Count("pk"))
+                .order_by()
+            )
+            for name, n in rows.iterator():
+                counts[name] += n
+        for model, field in URL_REFERENCES:
+            rows = (
+                model.objects.filter(**{f"{field}__startswith": settings.MEDIA_URL + PREFIX})
+                .values_list(field)
+                .annotate(n=Count("pk"))
+                .order_by()
+            )
+            for url, n in rows.iterator():
+                counts[media_name(url)] += n
+
+        with transaction.atomic():
+            existing = dict(MediaBlob.objects.values_list("name", "refcount"))
+            stale = [name for name in existing if name not in counts]
+            MediaBlob.objects.filter(name__in=stale).delete()
+            MediaBlob.objects.bulk_create(
+                [MediaBlob(name=name, refcount=n) for name, n in counts.items() if name not in existing]
+            )
+            changed = {
+                name: n for name, n in counts.items()
+                if name in existing and existing[name] != n
+            }
+            for name, n in changed.items():
+                MediaBlob.objects.filter(name=name).update(refcount=n)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(counts)} blobs referenced; {len(changed)} counts corrected, "
+            f"{len(stale)} unreferenced rows removed"
+        ))
@@ -0,0 +1,189 @@
+"""
+Delete (or quarantine) files under MEDIA_ROOT that no database row points at:
+
+    python manage.py gc_media --dry-run                 # list orphans, change nothing
+    python manage.py gc_media                           # delete them
+    python manage.py gc_media --quarantine /srv/media-quarantine
+
+Row deletes (delete_product, delete_user, CASCADE chains) leave files behind;
+store/media.py only cleans up content-addressed blobs it has counted.
+
+The set difference never holds every path in memory. The directory walk and
+the database scan (store.media.referenced_files) run concurrently and spill
+their paths into --buckets files partitioned by hash. Each bucket is then
+diffed on its own: its references are loaded into a set and its files are
+streamed past it. Memory is about (references / buckets), and buckets are
+diffed and cleaned up in parallel.
+
+Files modified in the last --min-age minutes are skipped, so uploads whose
+row hasn't committed yet survive; re-uploading an existing content-addressed
+blob refreshes its mtime for the same reason.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from project.storage import is_content_addressed
+from store.media import referenced_files
+from store.models import MediaBlob
+
+
+class Command(BaseCommand):
+    help = "Remove media files that are no longer referenced by any model"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only list orphaned files")
+        parser.add_argument("--quarantine", metavar="DIR", help="Move orphans here instead of deleting them")
+        parser.add_argument(
+            "--min-age", type=float, default=60,
+            help="Ignore files modified in the last N minutes (default: 60)",
+        )
+        parser.add_argument("--buckets", type=int, default=64, help="Hash partitions (more = less memory)")
+        parser.add_argument("--workers", type=int, default=8, help="Threads for diffing and deleting")
+
+    def handle(self, *args, **options):
+        self.root = os.path.abspath(settings.MEDIA_ROOT)
+        self.quarantine = os.path.abspath(options["quarantine"]) if options["quarantine"] else None
+        self.dry_run = options["dry_run"]
+        self.cutoff = time.time() - options["min_age"] * 60
+        self.buckets = options["buckets"]
+        if not os.path.isdir(self.root):
+            raise CommandError(f"MEDIA_ROOT {self.root} does not exist")
+
+        start = time.monotonic()
+        with tempfile.TemporaryDirectory(prefix="gc-media-") as spill:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                scanned = pool.submit(self._spill, spill, "files", self._walk())
+                referenced = pool.submit(self._spill_references, spill)
+                files, references = scanned.result(), referenced.result()
+            scan_seconds = time.monotonic() - start
+
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                results = list(pool.map(lambda i: self._collect(spill, i), range(self.buckets)))
+
+        orphans = sum(count for count, _ in results)
+        orphan_bytes = sum(size for _, size in results)
+        verb = "Would remove" if self.dry_run else ("Quarantined" if self.quarantine else "Deleted")
+        self.stdout.write(
+            f"Scanned {files} files and {references} references in {scan_seconds:.1f}s "
+            f"({files / max(scan_seconds, 1e-6):.0f} files/s)"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {orphans} orphaned files ({orphan_bytes / (1024 * 1024):.1f}MB) "
+            f"in {time.monotonic() - start:.1f}s"
+        ))
+
+    # -------------------------------------------------------------------------
+    # scan
+    # -------------------------------------------------------------------------
+
+    def _walk(self):
+        """Yield (relative path, size) for every old-enough file under MEDIA_ROOT."""
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as exc:
+                self.stderr.write(f"skipped {directory}: {exc}")
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path != self.quarantine:
+                            stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        if stat.st_mtime < self.cutoff:
+                            relative = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+                            yield relative, stat.st_size
+
+    def _spill_references(self, spill):
+        try:
+            return self._spill(spill, "refs", ((name, 0) for name in referenced_files()))
+        finally:
+            # Ran in a worker thread with its own connection
+            connection.close()
+
+    def _spill(self, spill, kind, rows):
+        handles = [
+            open(os.path.join(spill, f"{kind}-{i}"), "w", encoding="utf-8", buffering=1 << 16)
+            for i in range(self.buckets)
+        ]
+        count = 0
+        try:
+            for name, size in rows:
+                if "\n" in name:
+                    continue
+                handles[hash(name) % self.buckets].write(f"{size}\t{name}\n")
+                count += 1
+        finally:
+            for handle in handles:
+                handle.close()
+        return count
+
+    def _read(self, spill, kind, bucket):
+        with open(os.path.join(spill, f"{kind}-{bucket}"), encoding="utf-8") as handle:
+            for line in handle:
+                size, name = line.rstrip("\n").split("\t", 1)
+                yield name, int(size)
+
+    # -------------------------------------------------------------------------
+    # diff + clean up
+    # -------------------------------------------------------------------------
+
+    def _collect(self, spill, bucket):
+        referenced = {name for name, _ in self._read(spill, "refs", bucket)}
+        count = total = 0
+        orphaned_blobs = []
+        for name, size in self._read(spill, "files", bucket):
+            if name in referenced:
+                continue
+            if self.dry_run:
+                self.stdout.write(name)
+            elif not self._remove(name):
+                continue
+            elif is_content_addressed(name):
+                orphaned_blobs.append(name)
+            count += 1
+            total += size
+        if orphaned_blobs:
+            # Drop refcount rows left for blobs nothing references any more
+            for start in range(0, len(orphaned_blobs), 500):
+                MediaBlob.objects.filter(name__in=orphaned_blobs[start:start + 500]).delete()
+        connection.close()
+        return count, total
+
+    def _remove(self, name):
+        path = os.path.join(self.root, name)
+        try:
+            # Touched since the scan: re-uploaded (see ContentAddressedStorage.save)
+            if os.stat(path).st_mtime >= self.cutoff:
+                return False
+            if self.quarantine:
+                target = os.path.join(self.quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+            else:
+                os.remove(path)
+        except OSError as exc:
+            self.stderr.write(f"failed {name}: {exc}")
+            return False
+        self._prune(os.path.dirname(path))
+        return True
+
+    def _prune(self, directory):
+        # Remove directories the deletes emptied, up to MEDIA_ROOT
+        while directory.startswith(self.root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                return
+            directory = os.path.dirname(directory)
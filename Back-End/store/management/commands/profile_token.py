@@ -0,0 +1,27 @@
+"""
+Print a signed token that makes ProfilingMiddleware profile a request:
+
+    python manage.py profile_token
+    curl -H "X-Profile: <token>" https://shop.example.com/api/orders/seller-orders/
+
+Requires PROFILING_ENABLED; output lands in PROFILING_DIR.
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from project.profiling import PROFILE_PARAM, make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Print a short-lived token for on-demand request profiling"
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            self.stderr.write(self.style.WARNING("PROFILING_ENABLED is False; the token will be ignored"))
+        token = make_profile_token()
+        self.stdout.write(token)
+        self.stdout.write(
+            f"Valid for {settings.PROFILING_TOKEN_MAX_AGE}s as `?{PROFILE_PARAM}=<token>` "
+            f"or `X-Profile: <token>`; profiles are written to {settings.PROFILING_DIR}"
+        )
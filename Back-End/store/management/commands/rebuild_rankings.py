@@ -0,0 +1,75 @@
+"""
+Recount recent sales and recompute Product.rank_score (store/ranking.py):
+
+    python manage.py rebuild_rankings
+
+Orders count towards units_sold_recent as they are placed; this command
+recounts them over the last RANKING["SALES_WINDOW_DAYS"] days (cancelled
+orders excluded), so older sales age out. Run it periodically, e.g. hourly
+from cron. Products are processed in primary key batches: one grouped
+aggregate and one UPDATE per batch. Only rows whose count or score changed
+are written, and their updated_at is bumped (validators, catalog index).
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from store.models import OrderItem, Product
+from store.ranking import get_ranking_config, score_expression
+
+
+class Command(BaseCommand):
+    help = "Recount recent sales and recompute product ranking scores"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        since = timezone.now() - timedelta(days=get_ranking_config()["SALES_WINDOW_DAYS"])
+        checked = recounted = 0
+        last_pk = 0
+
+        while True:
+            products = list(
+                Product.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", "units_sold_recent")[:batch_size]
+            )
+            if not products:
+                break
+            first_pk, last_pk = products[0][0], products[-1][0]
+            sold = dict(
+                OrderItem.objects.filter(
+                    product_id__in=[pk for pk, _ in products],
+                    order__created_at__gte=since,
+                )
+                .exclude(order__status="Cancelled")
+                .values("product_id")
+                .annotate(units=Sum("qty"))
+                .order_by()
+                .values_list("product_id", "units")
+            )
+
+            now = timezone.now()
+            changed = [
+                Product(pk=pk, units_sold_recent=sold.get(pk, 0), updated_at=now)
+                for pk, units in products
+                if units != sold.get(pk, 0)
+            ]
+            with transaction.atomic():
+                if changed:
+                    Product.objects.bulk_update(changed, ["units_sold_recent", "updated_at"])
+                Product.objects.filter(pk__gte=first_pk, pk__lte=last_pk).exclude(
+                    rank_score=score_expression()
+                ).update(rank_score=score_expression(), updated_at=now)
+            checked += len(products)
+            recounted += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Ranked {checked} products, {recounted} sales counts updated"
+        ))
@@ -0,0 +1,102 @@
+"""
+Rebuild Product.rating_sum / num_reviews / rating and the per-star
+rating_count_1..5 histogram from the Review table, and the rank_score
+that depends on them:
+
+    python manage.py reconcile_ratings              # fix drifted products
+    python manage.py reconcile_ratings --dry-run    # only report them
+
+Review views keep the totals with Product.adjust_rating(); writes that bypass
+them (admin, shell, bulk deletes) leave drift this repairs. Products are
+processed in primary key batches, one grouped aggregate per batch; each
+batch is locked while it is checked and fixed, and fixed products get a new
+updated_at so ETags and the catalog index pick up the change.
+"""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from store.models import Product, Review
+from store.ranking import score_expression
+
+
+STARS = range(1, 6)
+HISTOGRAM_FIELDS = [f"rating_count_{star}" for star in STARS]
+
+
+class Command(BaseCommand):
+    help = "Recompute product rating totals from reviews and fix any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without fixing it")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checked = fixed = 0
+        last_pk = 0
+
+        while True:
+            # Products stay locked from the read to the write, so an
+            # adjust_rating() F() update that lands meanwhile waits and then
+            # applies on top of the recomputed totals instead of being lost
+            with transaction.atomic():
+                products = Product.objects.filter(pk__gt=last_pk).order_by("pk")
+                if not options["dry_run"]:
+                    products = products.select_for_update()
+                products = list(
+                    products.values_list("pk", "rating", "rating_sum", "num_reviews", *HISTOGRAM_FIELDS)[:batch_size]
+                )
+                if not products:
+                    break
+                last_pk = products[-1][0]
+                drifted = self.find_drift(products)
+                checked += len(products)
+
+                if drifted and not options["dry_run"]:
+                    # New validators for the product views and the catalog index
+                    now = timezone.now()
+                    for product in drifted:
+                        product.updated_at = now
+                    Product.objects.bulk_update(
+                        drifted, ["rating", "rating_sum", "num_reviews", *HISTOGRAM_FIELDS, "updated_at"]
+                    )
+                    Product.objects.filter(pk__in=[p.pk for p in drifted]).update(rank_score=score_expression())
+            fixed += len(drifted)
+
+        verb = "drifted" if options["dry_run"] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} products, {fixed} {verb}"))
+
+    def find_drift(self, products):
+        """Products whose stored totals differ from their reviews, with the fixed values."""
+        totals = {
+            row["product_id"]: (row["total"], row["count"], tuple(row[f"stars_{star}"] for star in STARS))
+            for row in Review.objects.filter(product_id__in=[p[0] for p in products])
+            .values("product_id")
+            .annotate(
+                total=Sum("rating"),
+                count=Count("pk"),
+                **{f"stars_{star}": Count("pk", filter=Q(rating=star)) for star in STARS},
+            )
+            .order_by()
+        }
+
+        drifted = []
+        for pk, rating, rating_sum, num_reviews, *histogram in products:
+            total, count, stars = totals.get(pk, (0, 0, (0,) * 5))
+            expected = Decimal("0.00")
+            if count:
+                expected = (Decimal(total) / count).quantize(Decimal("0.01"), ROUND_HALF_UP)
+            if (rating_sum, num_reviews, rating, tuple(histogram)) != (total, count, expected, stars):
+                drifted.append(Product(
+                    pk=pk, rating=expected, rating_sum=total, num_reviews=count,
+                    **dict(zip(HISTOGRAM_FIELDS, stars)),
+                ))
+                self.stdout.write(
+                    f"product {pk}: {rating_sum}/{num_reviews} ({rating}) -> {total}/{count} ({expected})"
+                )
+        return drifted
@@ -0,0 +1,401 @@
+"""
+Synthetic Data Generator for Smart Shop E-commerce Platform
+
+Bulk-generates a realistic store for load testing and benchmarks:
+
+    python manage.py seed_store --products 1000000 --users 100000 --seed 42
+
+Everything is written with bulk_create in batches inside per-batch
+transactions; no model save() or signals run. Distributions:
+    - product popularity is Zipfian (a few products get most orders,
+      cart and wishlist adds)
+    - orders per user follow an exponential distribution around the mean
+    - reviews per product scale with popularity; product rating and
+      num_reviews are kept consistent with the generated reviews, and
+      rank_score is computed at the end (rebuild_rankings)
+
+Finally the tables are ANALYZEd so the planner sees the new row counts
+(the partial indexes on Product are only chosen with statistics).
+"""
+
+import io
+import random
+import time
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from store.models import (
+    Category,
+    Tag,
+    Product,
+    Review,
+    Order,
+    OrderItem,
+    ShippingAddress,
+    CartItem,
+    WishlistItem,
+)
+from users.models import Profile
+
+CATEGORY_NAMES = [
+    "Phones", "Laptops", "Tablets", "Headphones", "Cameras", "Watches",
+    "Monitors", "Keyboards", "Gaming", "Smart Home", "Audio", "Storage",
+    "Networking", "Printers", "Wearables", "Accessories",
+]
+BRANDS = [
+    "Apex", "Nimbus", "Orion", "Vertex", "Zenith", "Quanta", "Lumen",
+    "Helix", "Nova", "Pulse", "Atlas", "Echo", "Vector", "Prism",
+]
+ADJECTIVES = [
+    "Pro", "Max", "Lite", "Ultra", "Mini", "Plus", "Air", "Edge", "Prime", "Neo",
+]
+CITIES = [
+    ("Cairo", "Egypt"), ("Alexandria", "Egypt"), ("Dubai", "UAE"),
+    ("Riyadh", "Saudi Arabia"), ("Amman", "Jordan"), ("Casablanca", "Morocco"),
+]
+STATUSES = ["Pending", "Processing", "Shipped", "Delivered", "Cancelled"]
+WORDS = (
+    "fast light durable wireless premium compact portable smart quiet "
+    "powerful elegant reliable efficient modern ergonomic waterproof"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate users, vendors, catalog, reviews, orders, carts and wishlists"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--vendors", type=int, default=50)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--categories", type=int, default=len(CATEGORY_NAMES))
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--tags-per-product", type=int, default=3)
+        parser.add_argument("--orders-per-user", type=float, default=2.0,
+                            help="Mean orders per customer (exponential)")
+        parser.add_argument("--items-per-order", type=float, default=2.5)
+        parser.add_argument("--reviews-per-product", type=float, default=3.0,
+                            help="Mean reviews per product (scaled by popularity)")
+        parser.add_argument("--zipf", type=float, default=1.1,
+                            help="Zipf exponent for product popularity")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options["vendors"] > options["users"]:
+            raise CommandError("--vendors cannot exceed --users")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.options = options
+        self.run_tag = f"{int(time.time())}{self.rng.randrange(1000):03d}"
+        started = time.perf_counter()
+
+        user_ids, vendor_ids = self._step("users", self.create_users)
+        category_ids = self._step("categories", self.create_categories)
+        tag_ids = self._step("tags", self.create_tags)
+        self._build_popularity(options["products"])
+        products = self._step(
+            "products", self.create_products, vendor_ids, category_ids, tag_ids
+        )
+        product_ids, prices, review_ratings = products
+        self._step("reviews", self.create_reviews, product_ids, review_ratings, user_ids)
+        self._step("orders", self.create_orders, user_ids, product_ids, prices)
+        self._step("carts & wishlists", self.create_carts, user_ids, product_ids)
+        self._step("rankings", self.rank_products)
+        self._step("statistics", self.analyze)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Store seeded in {time.perf_counter() - started:.1f}s"
+        ))
+
+    # -------------------------------------------------------------------------
+    # helpers
+    # -------------------------------------------------------------------------
+
+    def _step(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f"  {label}: {time.perf_counter() - started:.1f}s")
+        return result
+
+    def _bulk(self, model, objects, collect=False):
+        """bulk_create an iterable in batches, one transaction per batch."""
+        created = []
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                saved = self._flush(model, batch)
+                if collect:
+                    created.extend(saved)
+                batch = []
+        if batch:
+            saved = self._flush(model, batch)
+            if collect:
+                created.extend(saved)
+        return created
+
+    def _flush(self, model, batch):
+        with transaction.atomic():
+            return model.objects.bulk_create(batch, batch_size=self.batch_size)
+
+    def _build_popularity(self, count):
+        """Zipfian weights over a shuffled rank order."""
+        ranks = list(range(count))
+        self.rng.shuffle(ranks)
+        s = self.options["zipf"]
+        weights = [0.0] * count
+        for rank, index in enumerate(ranks, start=1):
+            weights[index] = 1.0 / rank ** s
+        self.weights = weights
+        self.cum_weights = list(accumulate(weights))
+        self.mean_weight = self.cum_weights[-1] / count if count else 1.0
+
+    def _popular_products(self, product_ids, k):
+        """Sample k distinct products following the popularity curve."""
+        k = min(k, len(product_ids))
+        picked = set()
+        while len(picked) < k:
+            for index in self.rng.choices(
+                range(len(product_ids)), cum_weights=self.cum_weights, k=k
+            ):
+                picked.add(index)
+                if len(picked) == k:
+                    break
+        return picked
+
+    # -------------------------------------------------------------------------
+    # generators
+    # -------------------------------------------------------------------------
+
+    def create_users(self):
+        total, vendors = self.options["users"], self.options["vendors"]
+        # Hashing once keeps 100k users in seconds instead of hours
+        password = make_password("password123")
+        now = timezone.now()
+
+        users = self._bulk(User, (
+            User(
+                username=f"seed{self.run_tag}_{i}@example.com",
+                email=f"seed{self.run_tag}_{i}@example.com",
+                first_name=f"User{i}",
+                last_name="Seed",
+                password=password,
+                is_active=True,
+                date_joined=now - timedelta(days=self.rng.randrange(1000)),
+            )
+            for i in range(total)
+        ), collect=True)
+        user_ids = [u.pk for u in users]
+
+        def profiles():
+            for i, user_id in enumerate(user_ids):
+                city, country = self.rng.choice(CITIES)
+                yield Profile(
+                    user_id=user_id,
+                    user_type="vendor" if i < vendors else "customer",
+                    city=city,
+                    country=country,
+                )
+
+        self._bulk(Profile, profiles())
+        return user_ids[vendors:], user_ids[:vendors]
+
+    def create_categories(self):
+        count = self.options["categories"]
+        names = [
+            CATEGORY_NAMES[i] if i < len(CATEGORY_NAMES) else f"Category {i}"
+            for i in range(count)
+        ]
+        existing = set(Category.objects.filter(name__in=names).values_list("name", flat=True))
+        Category.objects.bulk_create([
+            Category(name=name, slug=name.lower().replace(" ", "-"))
+            for name in names if name not in existing
+        ])
+        return list(Category.objects.filter(name__in=names).values_list("id", flat=True))
+
+    def create_tags(self):
+        names = [f"{self.rng.choice(WORDS)}-{i}" for i in range(self.options["tags"])]
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        return list(Tag.objects.filter(name__in=names).values_list("id", flat=True))
+
+    def create_products(self, vendor_ids, category_ids, tag_ids):
+        """
+        Products are created in batches together with their tag links.
+        Review ratings are drawn here so product.rating / num_reviews match
+        the Review rows created later.
+        """
+        total = self.options["products"]
+        mean_reviews = self.options["reviews_per_product"]
+        # Reviews need distinct customers; cap the head of the Zipf curve
+        max_reviews = min(self.options["users"] - self.options["vendors"], 2000)
+        tags_per_product = min(self.options["tags_per_product"], len(tag_ids))
+        TagLink = Product.tags.through
+
+        product_ids = array("q")
+        prices = array("d")
+        review_ratings = []
+        batch = []
+
+        def flush():
+            created = self._flush(Product, batch)
+            links = []
+            for product in created:
+                product_ids.append(product.pk)
+                prices.append(float(product.final_price))
+                for tag_id in self.rng.sample(tag_ids, tags_per_product):
+                    links.append(TagLink(product_id=product.pk, tag_id=tag_id))
+            self._flush(TagLink, links)
+            batch.clear()
+
+        for i in range(total):
+            brand = self.rng.choice(BRANDS)
+            name = f"{brand} {self.rng.choice(ADJECTIVES)} {self.rng.choice(CATEGORY_NAMES)} {i}"
+            price = Decimal(round(self.rng.lognormvariate(4.5, 1.0), 2)) + Decimal("1.00")
+            price = price.quantize(Decimal("0.01"))
+            discount = None
+            if self.rng.random() < 0.25:
+                discount = (price * Decimal(self.rng.uniform(0.6, 0.95))).quantize(Decimal("0.01"))
+
+            # Popular products collect proportionally more reviews
+            mean = mean_reviews * self.weights[i] / self.mean_weight
+            count = min(int(self.rng.expovariate(1 / mean)) if mean else 0, max_reviews)
+            ratings = [min(5, max(1, round(self.rng.gauss(4.0, 1.0)))) for _ in range(count)]
+            review_ratings.append(ratings)
+
+            status_roll = self.rng.random()
+            batch.append(Product(
+                user_id=self.rng.choice(vendor_ids) if vendor_ids else None,
+                category_id=self.rng.choice(category_ids),
+                name=name,
+                slug=f"seed-{self.run_tag}-{i}",
+                brand=brand,
+                description=" ".join(self.rng.choices(WORDS, k=20)),
+                price=price,
+                discount_price=discount,
+                count_in_stock=self.rng.choice([0, 1, 3, 5, 10, 25, 50, 100]),
+                rating=(Decimal(sum(ratings)) / len(ratings)).quantize(Decimal("0.01"))
+                if ratings else Decimal("0.00"),
+                num_reviews=len(ratings),
+                rating_sum=sum(ratings),
+                **{f"rating_count_{star}": ratings.count(star) for star in range(1, 6)},
+                is_featured=self.rng.random() < 0.02,
+                approval_status=(
+                    "approved" if status_roll < 0.9
+                    else "pending" if status_roll < 0.97 else "rejected"
+                ),
+                is_active=self.rng.random() < 0.97,
+            ))
+            if len(batch) >= self.batch_size:
+                flush()
+        if batch:
+            flush()
+        return product_ids, prices, review_ratings
+
+    def create_reviews(self, product_ids, review_ratings, user_ids):
+        if not user_ids:
+            return
+
+        def reviews():
+            for product_id, ratings in zip(product_ids, review_ratings):
+                reviewers = self.rng.sample(user_ids, min(len(ratings), len(user_ids)))
+                for user_id, rating in zip(reviewers, ratings):
+                    yield Review(
+                        product_id=product_id,
+                        user_id=user_id,
+                        rating=rating,
+                        comment=" ".join(self.rng.choices(WORDS, k=8)),
+                    )
+
+        self._bulk(Review, reviews())
+
+    def create_orders(self, user_ids, product_ids, prices):
+        mean_orders = self.options["orders_per_user"]
+        mean_items = self.options["items_per_order"]
+        if not product_ids or not mean_orders:
+            return
+
+        pending = []  # (order, [(product index, qty)], created)
+
+        def flush():
+            orders = self._flush(Order, [order for order, _, _ in pending])
+            # auto_now_add overwrote the backdated timestamps on insert
+            for order, (_, _, created) in zip(orders, pending):
+                order.created_at = created
+            with transaction.atomic():
+                Order.objects.bulk_update(orders, ["created_at"], batch_size=self.batch_size)
+            addresses, items = [], []
+            for order, (_, lines, _) in zip(orders, pending):
+                city, country = self.rng.choice(CITIES)
+                addresses.append(ShippingAddress(
+                    order_id=order.pk, address=f"{self.rng.randrange(1, 999)} Main St",
+                    city=city, country=country,
+                ))
+                for index, qty in lines:
+                    items.append(OrderItem(
+                        order_id=order.pk, product_id=product_ids[index],
+                        name=f"Product {product_ids[index]}", qty=qty,
+                        price=Decimal(str(prices[index])),
+                    ))
+            self._flush(ShippingAddress, addresses)
+            self._bulk(OrderItem, items)
+            pending.clear()
+
+        now = timezone.now()
+        for user_id in user_ids:
+            for _ in range(int(self.rng.expovariate(1 / mean_orders))):
+                count = max(1, int(self.rng.expovariate(1 / mean_items)))
+                lines = [(index, self.rng.choice([1, 1, 1, 2, 3]))
+                         for index in self._popular_products(product_ids, count)]
+                subtotal = sum(Decimal(str(prices[i])) * qty for i, qty in lines)
+                status = self.rng.choice(STATUSES)
+                is_paid = status != "Pending"
+                created = now - timedelta(minutes=self.rng.randrange(60 * 24 * 365))
+                pending.append((Order(
+                    user_id=user_id,
+                    payment_method="PayPal",
+                    tax_price=(subtotal * Decimal("0.08")).quantize(Decimal("0.01")),
+                    shipping_price=Decimal("50.00"),
+                    total_price=(subtotal * Decimal("1.08") + 50).quantize(Decimal("0.01")),
+                    status=status,
+                    is_paid=is_paid,
+                    paid_at=created if is_paid else None,
+                    is_delivered=status == "Delivered",
+                    delivered_at=created + timedelta(days=3) if status == "Delivered" else None,
+                ), lines, created))
+                if len(pending) >= self.batch_size:
+                    flush()
+        if pending:
+            flush()
+
+    def create_carts(self, user_ids, product_ids):
+        if not product_ids:
+            return
+
+        def items(model, share, mean, **fields):
+            for user_id in user_ids:
+                if self.rng.random() >= share:
+                    continue
+                count = max(1, int(self.rng.expovariate(1 / mean)))
+                for index in self._popular_products(product_ids, count):
+                    yield model(user_id=user_id, product_id=product_ids[index], **fields)
+
+        self._bulk(CartItem, items(CartItem, 0.3, 2.0, qty=1))
+        self._bulk(WishlistItem, items(WishlistItem, 0.4, 3.0))
+
+    def rank_products(self):
+        call_command("rebuild_rankings", batch_size=self.batch_size, stdout=io.StringIO())
+
+    def analyze(self):
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
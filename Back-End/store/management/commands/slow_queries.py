@@ -0,0 +1,56 @@
+"""
+List the worst slow queries recorded by project/slow_queries.py:
+
+    python manage.py slow_queries                   # last SLOW_QUERY_WINDOW seconds
+    python manage.py slow_queries --window 15 --sort max --plans
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from project.slow_queries import aggregate, read_slow_queries
+
+
+class Command(BaseCommand):
+    help = "Aggregate the slow query log per SQL fingerprint and list the worst offenders"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--window", type=float, default=None,
+            help="Minutes to look back (default: SLOW_QUERY_WINDOW)",
+        )
+        parser.add_argument("--limit", type=int, default=15)
+        parser.add_argument("--sort", choices=("total", "count", "max"), default="total")
+        parser.add_argument("--plans", action="store_true", help="Print the captured query plans")
+        parser.add_argument("--file", default=None, help="Log file (default: SLOW_QUERY_LOG_FILE)")
+
+    def handle(self, *args, **options):
+        window = options["window"] * 60 if options["window"] else settings.SLOW_QUERY_WINDOW
+        path = options["file"] or settings.SLOW_QUERY_LOG_FILE
+
+        stats = aggregate(read_slow_queries(path, since=time.time() - window))
+        if not stats:
+            self.stdout.write(f"No queries over {settings.SLOW_QUERY_MS:g}ms in the last {window / 60:g} minutes")
+            return
+
+        key = {"total": "total_ms", "count": "count", "max": "max_ms"}[options["sort"]]
+        stats.sort(key=lambda entry: entry[key], reverse=True)
+
+        self.stdout.write(f"Slow queries in the last {window / 60:g} minutes (by {options['sort']}):\n")
+        for rank, entry in enumerate(stats[: options["limit"]], 1):
+            views = ", ".join(
+                f"{view} x{n}" for view, n in
+                sorted(entry["views"].items(), key=lambda item: item[1], reverse=True)
+            )
+            self.stdout.write(self.style.WARNING(
+                f"#{rank}  {entry['count']} x, total {entry['total_ms']:.0f}ms, "
+                f"avg {entry['total_ms'] / entry['count']:.1f}ms, max {entry['max_ms']:.1f}ms"
+            ))
+            self.stdout.write(f"    views: {views}")
+            self.stdout.write(f"    {entry['fingerprint']}")
+            if options["plans"] and entry["plan"]:
+                for line in entry["plan"].splitlines():
+                    self.stdout.write(f"      | {line}")
+            self.stdout.write("")
@@ -0,0 +1,207 @@
+"""
+Media Reference Counting for Smart Shop E-commerce Platform
+
+Product.image, ProductImage.image and Profile.profile_picture store their
+files in the content-addressed media storage (project/storage.py), where
+one blob can back many rows. MediaBlob.refcount counts those rows:
+
+    - a row saved with a newly uploaded file retains the new blob and
+      releases the one it replaced
+    - a deleted row (including cascades) releases its blob
+    - a blob released to zero is deleted, after the transaction commits
+
+OrderItem.image is a copy of the product image URL taken at checkout, so
+a past order keeps its picture after the product changes it or is
+deleted; it counts as a reference too (URL_REFERENCES).
+
+A new upload is retained in pre_save, before the storage checks whether
+the blob is already on disk: a release committing meanwhile then finds
+the MediaBlob row and leaves the file alone (`_delete_blob`).
+
+Signals cover save() and delete(); bulk_create() sends none, so callers
+retain those files themselves, in the same order: `retain_uploads()` before
+the files are written (and `release()` if that or the insert fails), or
+`retain()` for names already stored. Files outside the storage's
+`cas/` prefix (uploaded before it existed) are not counted;
+`manage.py dedupe_media` moves them in and rebuilds every count.
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from project.storage import blob_name, content_digest, is_content_addressed, media_storage
+from users.models import Profile
+
+from .images import variant_names
+from .models import MediaBlob, OrderItem, Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+# (model, file field) pairs whose files are reference counted
+REFERENCES = [
+    (Product, "image"),
+    (ProductImage, "image"),
+    (Profile, "profile_picture"),
+]
+
+# (model, field) pairs holding a media URL rather than a file name
+URL_REFERENCES = [
+    (OrderItem, "image"),
+]
+
+
+def media_name(url):
+    """Storage name behind a MEDIA_URL link ("" for anything else)."""
+    if url and url.startswith(settings.MEDIA_URL):
+        return url[len(settings.MEDIA_URL):]
+    return ""
+
+
+def retain(names):
+    """Add one reference to each content-addressed blob in `names`."""
+    for name in names:
+        if not is_content_addressed(name):
+            continue
+        if MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1):
+            continue
+        try:
+            with transaction.atomic():
+                MediaBlob.objects.create(name=name, refcount=1)
+        except IntegrityError:
+            # Created concurrently by another upload of the same bytes
+            MediaBlob.objects.filter(name=name).update(refcount=F("refcount") + 1)
+
+
+def retain_uploads(field_files):
+    """
+    Retain the blobs pending uploads will be stored as, before storage
+    writes them. Returns the names, to release() if the save fails.
+    """
+    names = []
+    for file in field_files:
+        # The digest is reused by storage.save()
+        content = file.file
+        content.sha256 = content_digest(content)
+        names.append(blob_name(content.sha256, file.name))
+    retain(names)
+    return names
+
+
+def release(names):
+    """Drop one reference from each blob; delete blobs nothing points at any more."""
+    for name in names:
+        if not is_content_addressed(name):
+            continue
+        MediaBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F("refcount") - 1)
+        deleted, _ = MediaBlob.objects.filter(name=name, refcount=0).delete()
+        if deleted:
+            transaction.on_commit(lambda name=name: _delete_blob(name))
+
+
+def referenced_files(chunk_size=2000):
+    """
+    Stream every media name the database points at: the counted file fields,
+    the media URLs order items keep, and the generated derivatives
+    (store/images.py). Used by gc_media.
+    """
+    for model, field in REFERENCES:
+        names = (
+            model.objects.exclude(Q(**{f"{field}__isnull": True}) | Q(**{field: ""}))
+            .values_list(field, flat=True)
+        )
+        yield from names.iterator(chunk_size=chunk_size)
+    for model, field in URL_REFERENCES:
+        urls = model.objects.filter(**{f"{field}__startswith": settings.MEDIA_URL}).values_list(field, flat=True)
+        for url in urls.iterator(chunk_size=chunk_size):
+            yield media_name(url)
+    for model in (Product, ProductImage):
+        maps = model.objects.values_list("image_variants", flat=True)
+        for variants in maps.iterator(chunk_size=chunk_size):
+            yield from variant_names(variants)
+
+
+def _delete_blob(name):
+    # Re-uploaded between release and commit: the new row owns the file now
+    if MediaBlob.objects.filter(name=name).exists():
+        return
+    media_storage().delete(name)
+    logger.info("Media blob deleted: %s", name)
+
+
+# =============================================================================
+# SIGNALS
+# =============================================================================
+
+
+def _fields_for(sender):
+    return [field for model, field in REFERENCES if model is sender]
+
+
+def _url_fields_for(sender):
+    return [field for model, field in URL_REFERENCES if model is sender]
+
+
+def _on_pre_save(sender, instance, **kwargs):
+    # Only a freshly assigned upload changes the blob; look up the old one then
+    replaced = {}
+    for field in _fields_for(sender):
+        file = getattr(instance, field)
+        if file and not file._committed:
+            old = None
+            if instance.pk:
+                old = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+            replaced[field] = old
+            retain_uploads([file])
+    instance._media_replaced = replaced
+
+
+def _on_post_save(sender, instance, **kwargs):
+    replaced = getattr(instance, "_media_replaced", None)
+    if not replaced:
+        return
+    instance._media_replaced = {}
+    # The new blob was retained in pre_save; re-saving the same file undoes it
+    release(replaced.values())
+
+
+def _on_post_delete(sender, instance, **kwargs):
+    release([getattr(instance, field).name for field in _fields_for(sender)])
+
+
+def _on_url_pre_save(sender, instance, **kwargs):
+    old = {}
+    if not instance._state.adding:
+        fields = _url_fields_for(sender)
+        old = sender.objects.filter(pk=instance.pk).values(*fields).first() or {}
+    instance._media_old_urls = old
+
+
+def _on_url_post_save(sender, instance, **kwargs):
+    old = getattr(instance, "_media_old_urls", {})
+    for field in _url_fields_for(sender):
+        new_name, old_name = media_name(getattr(instance, field)), media_name(old.get(field))
+        if new_name != old_name:
+            retain([new_name])
+            release([old_name])
+
+
+def _on_url_post_delete(sender, instance, **kwargs):
+    release([media_name(getattr(instance, field)) for field in _url_fields_for(sender)])
+
+
+def connect_signals():
+    """Called from StoreConfig.ready()."""
+    for model, _ in REFERENCES:
+        uid = f"media_refcount_{model._meta.label_lower}"
+        pre_save.connect(_on_pre_save, sender=model, dispatch_uid=f"{uid}_pre_save")
+        post_save.connect(_on_post_save, sender=model, dispatch_uid=f"{uid}_post_save")
+        post_delete.connect(_on_post_delete, sender=model, dispatch_uid=f"{uid}_post_delete")
+    for model, _ in URL_REFERENCES:
+        uid = f"media_refcount_{model._meta.label_lower}"
+        pre_save.connect(_on_url_pre_save, sender=model, dispatch_uid=f"{uid}_pre_save")
+        post_save.connect(_on_url_post_save, sender=model, dispatch_uid=f"{uid}_post_save")
+        post_delete.connect(_on_url_post_delete, sender=model, dispatch_uid=f"{uid}_post_delete")
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 14:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0002_storesettings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
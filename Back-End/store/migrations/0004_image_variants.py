@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0003_tag_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name="productimage",
+            name="image_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
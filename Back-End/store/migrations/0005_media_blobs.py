@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 15:23
+
+import project.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0004_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("refcount", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="product",
+            name="image",
+            field=models.ImageField(blank=True, help_text="Main product image", null=True, storage=project.storage.media_storage, upload_to="products/"),
+        ),
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=models.ImageField(storage=project.storage.media_storage, upload_to="product_gallery/"),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-19 15:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating_totals(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    Review = apps.get_model("store", "Review")
+    per_product = Review.objects.filter(product=OuterRef("pk")).order_by().values("product")
+    Product.objects.update(
+        rating_sum=Coalesce(Subquery(per_product.annotate(total=Sum("rating")).values("total")), 0),
+        num_reviews=Coalesce(Subquery(per_product.annotate(count=Count("pk")).values("count")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0005_media_blobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_rating_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-19 15:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_histograms(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    Review = apps.get_model("store", "Review")
+
+    def stars(star):
+        per_product = (
+            Review.objects.filter(product=OuterRef("pk"), rating=star)
+            .order_by().values("product").annotate(count=Count("pk")).values("count")
+        )
+        return Coalesce(Subquery(per_product), 0)
+
+    Product.objects.update(**{f"rating_count_{star}": stars(star) for star in range(1, 6)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_product_rating_sum"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_1",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_2",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_3",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_4",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="rating_count_5",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(fields=["product", "rating", "created_at"], name="store_revie_product_1cce52_idx"),
+        ),
+        migrations.RunPython(fill_histograms, migrations.RunPython.noop),
+    ]
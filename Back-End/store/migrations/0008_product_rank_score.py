@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-19 15:34
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+import store.ranking
+from store.ranking import get_ranking_config, score_expression
+
+
+def fill_rank_scores(apps, schema_editor):
+    Product = apps.get_model("store", "Product")
+    OrderItem = apps.get_model("store", "OrderItem")
+    since = timezone.now() - timedelta(days=get_ranking_config()["SALES_WINDOW_DAYS"])
+    sold = (
+        OrderItem.objects.filter(product=OuterRef("pk"), order__created_at__gte=since)
+        .exclude(order__status="Cancelled")
+        .order_by()
+        .values("product")
+        .annotate(units=Sum("qty"))
+        .values("units")
+    )
+    Product.objects.update(units_sold_recent=Coalesce(Subquery(sold), 0))
+    Product.objects.update(rank_score=score_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0007_review_histogram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="rank_score",
+            field=models.FloatField(default=store.ranking.initial_score, editable=False),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="units_sold_recent",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["approval_status", "-rank_score"], name="store_produ_approva_1e936b_idx"),
+        ),
+        migrations.RunPython(fill_rank_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-19 15:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0008_product_rank_score"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedProduct",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("bought_together", "Frequently bought together")], max_length=20)),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                ("product", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="related_entries", to="store.product")),
+                ("related", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="store.product")),
+            ],
+            options={
+                "ordering": ["product", "kind", "rank"],
+                "unique_together": {("product", "kind", "rank")},
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 15:42
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0009_related_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="relatedproduct",
+            name="built_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="relatedproduct",
+            name="kind",
+            field=models.CharField(choices=[("bought_together", "Frequently bought together"), ("similar", "Similar products")], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name="relatedproduct",
+            index=models.Index(fields=["kind", "built_at"], name="store_relat_kind_2dfea2_idx"),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0010_similar_products"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="effective_price",
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(discount_price__gt=0, then=models.F("discount_price")), default=models.F("price")), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["approval_status", "effective_price"], name="store_produ_approva_3a0bad_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["approval_status", "rating"], name="store_produ_approva_033574_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["approval_status", "units_sold_recent"], name="store_produ_approva_4df34f_idx"),
+        ),
+    ]
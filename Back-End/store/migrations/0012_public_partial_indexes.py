@@ -0,0 +1,61 @@
+# Generated by Django 6.0 on 2026-10-19 16:30
+
+from django.db import migrations, models
+
+
+def analyze_products(apps, schema_editor):
+    # Without statistics SQLite prefers seeking the approval_status
+    # index over scanning a partial one in order
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("ANALYZE store_product")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0011_effective_price"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="product",
+            name="store_produ_approva_1e936b_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="store_produ_approva_3a0bad_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="store_produ_approva_033574_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="product",
+            name="store_produ_approva_4df34f_idx",
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(condition=models.Q(("approval_status", "approved"), ("is_active", True)), fields=["-created_at"], name="product_public_newest_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(condition=models.Q(("approval_status", "approved"), ("is_active", True)), fields=["category", "-created_at"], name="product_public_category_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(condition=models.Q(("approval_status", "approved"), ("is_active", True)), fields=["rating"], name="product_public_rating_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(condition=models.Q(("approval_status", "approved"), ("is_active", True)), fields=["-rank_score"], name="product_public_rank_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(condition=models.Q(("approval_status", "approved"), ("is_active", True)), fields=["effective_price"], name="product_public_price_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(condition=models.Q(("approval_status", "approved"), ("is_active", True)), fields=["units_sold_recent"], name="product_public_sales_idx"),
+        ),
+        migrations.RunPython(analyze_products, migrations.RunPython.noop),
+    ]
@@ -4,12 +4,19 @@ Includes: Categories, Tags, Products, Reviews, Orders, Cart, Wishlist, StoreSett
 """
 
 from django.db import models
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from decimal import Decimal
+from django.utils import timezone
 from django.utils.text import slugify
 
+from project.storage import media_storage
+
+from .ranking import initial_score, score_expression
+
 
 # =============================================================================
 # CATEGORY & TAGS
@@ -43,6 +50,7 @@ class Tag(models.Model):
     """Product tags for filtering and searching"""
     name = models.CharField(max_length=100, unique=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["name"]
@@ -55,6 +63,10 @@ class Tag(models.Model):
 # PRODUCT MODELS
 # =============================================================================
 
+# Products the storefront shows; see the partial indexes on Product
+PUBLIC_PRODUCTS = Q(approval_status="approved", is_active=True)
+
+
 class Product(models.Model):
     """Main product model with approval workflow"""
 
@@ -102,6 +114,15 @@ class Product(models.Model):
         validators=[MinValueValidator(Decimal("0.00"))],
         help_text="Discounted price (must be less than regular price)"
     )
+    # final_price as a stored column, so listings can sort and filter on it in SQL
+    effective_price = models.GeneratedField(
+        expression=Case(
+            When(discount_price__gt=0, then=F("discount_price")),
+            default=F("price"),
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
 
     # Inventory
     count_in_stock = models.IntegerField(
@@ -113,10 +134,13 @@ class Product(models.Model):
     # Images
     image = models.ImageField(
         upload_to="products/",
+        storage=media_storage,
         null=True,
         blank=True,
         help_text="Main product image"
     )
+    # Resized WebP / JPEG copies of `image`, filled in by store/images.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     # Ratings & Reviews
     rating = models.DecimalField(
@@ -129,6 +153,18 @@ class Product(models.Model):
         ]
     )
     num_reviews = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    # Sum of all review ratings; rating = rating_sum / num_reviews (see adjust_rating)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    # Reviews per star rating (the histogram on product pages)
+    rating_count_1 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_2 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_3 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_4 = models.PositiveIntegerField(default=0, editable=False)
+    rating_count_5 = models.PositiveIntegerField(default=0, editable=False)
+
+    # Ranking (see store/ranking.py)
+    units_sold_recent = models.PositiveIntegerField(default=0, editable=False)
+    rank_score = models.FloatField(default=initial_score, editable=False)
 
     # Product Status
     is_featured = models.BooleanField(default=False, db_index=True)
@@ -152,6 +188,17 @@ class Product(models.Model):
             models.Index(fields=["-created_at"]),
             models.Index(fields=["-rating"]),
             models.Index(fields=["user", "-created_at"]),
+            # Partial indexes over the public catalog only (PUBLIC_PRODUCTS):
+            # the storefront's filter, one per public ordering. Queries must
+            # spell the filter the same way for the planner to pick them.
+            # Ascending keys serve the descending sorts by scanning backwards
+            # (ties by id, as in views.PRODUCT_SORTS)
+            models.Index(fields=["-created_at"], condition=PUBLIC_PRODUCTS, name="product_public_newest_idx"),
+            models.Index(fields=["category", "-created_at"], condition=PUBLIC_PRODUCTS, name="product_public_category_idx"),
+            models.Index(fields=["rating"], condition=PUBLIC_PRODUCTS, name="product_public_rating_idx"),
+            models.Index(fields=["-rank_score"], condition=PUBLIC_PRODUCTS, name="product_public_rank_idx"),
+            models.Index(fields=["effective_price"], condition=PUBLIC_PRODUCTS, name="product_public_price_idx"),
+            models.Index(fields=["units_sold_recent"], condition=PUBLIC_PRODUCTS, name="product_public_sales_idx"),
         ]
 
     def clean(self):
@@ -168,11 +215,72 @@ class Product(models.Model):
 
     @property
     def final_price(self):
-        """Get the actual selling price (discount or regular)"""
+        """Get the actual selling price (discount or regular); stored as effective_price"""
         if self.discount_price and self.discount_price > Decimal("0"):
             return self.discount_price
         return self.price
 
+    @property
+    def rating_histogram(self):
+        """{"1": count, ..., "5": count}"""
+        return {str(star): getattr(self, f"rating_count_{star}") for star in range(1, 6)}
+
+    @classmethod
+    def adjust_rating(cls, product_id, added=None, removed=None):
+        """
+        Apply one review write to the running totals in a single UPDATE:
+        no aggregate over the product's reviews, no read-modify-write race.
+        `added` / `removed` are star ratings: a new 4-star review is
+        adjust_rating(pk, added=4), editing it to 2 stars
+        adjust_rating(pk, added=2, removed=4), deleting it
+        adjust_rating(pk, removed=2). Always bumps updated_at and
+        recomputes rank_score.
+        """
+        rating_delta = (added or 0) - (removed or 0)
+        count_delta = (added is not None) - (removed is not None)
+        rating_sum = F("rating_sum") + rating_delta
+        num_reviews = F("num_reviews") + count_delta
+
+        histogram = {}
+        for star, step in ((added, 1), (removed, -1)):
+            if star is not None:
+                histogram[star] = histogram.get(star, 0) + step
+
+        cls.objects.filter(pk=product_id).update(
+            # Listed first: MySQL evaluates SET left to right on updated values
+            rating=Case(
+                When(
+                    Q(num_reviews__gt=-count_delta),
+                    then=Round(Cast(rating_sum, FloatField()) / num_reviews, 2),
+                ),
+                default=Value(Decimal("0.00")),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+            rank_score=score_expression(rating_sum=rating_sum, num_reviews=num_reviews),
+            rating_sum=rating_sum,
+            num_reviews=num_reviews,
+            **{
+                f"rating_count_{star}": F(f"rating_count_{star}") + step
+                for star, step in histogram.items() if step
+            },
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def record_sale(cls, product_id, qty):
+        """
+        Take `qty` units out of stock and count them towards rank_score, in one
+        UPDATE. Bumps updated_at: the stock shown is part of every validator.
+        """
+        units_sold = F("units_sold_recent") + qty
+        cls.objects.filter(pk=product_id).update(
+            # Listed first, like rating in adjust_rating
+            rank_score=score_expression(units_sold=units_sold),
+            units_sold_recent=units_sold,
+            count_in_stock=F("count_in_stock") - qty,
+            updated_at=timezone.now(),
+        )
+
     @property
     def is_in_stock(self):
         """Check if product is available"""
@@ -186,7 +294,8 @@ class ProductImage(models.Model):
         on_delete=models.CASCADE,
         related_name="images"
     )
-    image = models.ImageField(upload_to="product_gallery/")
+    image = models.ImageField(upload_to="product_gallery/", storage=media_storage)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     alt_text = models.CharField(max_length=200, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -228,6 +337,8 @@ class Review(models.Model):
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["product", "-created_at"]),
+            # Review list sorted by rating (scanned backwards for "highest")
+            models.Index(fields=["product", "rating", "created_at"]),
         ]
 
     def __str__(self):
@@ -444,6 +555,50 @@ class WishlistItem(models.Model):
         return f"{self.product.name} (Wishlist of {self.user.username})"
 
 
+# =============================================================================
+# RECOMMENDATION MODELS
+# =============================================================================
+
+class RelatedProduct(models.Model):
+    """
+    One precomputed neighbour of a product, `rank` 0 being the best.
+    Rebuilt in bulk by a batch job per kind (build_related_products);
+    get_related_products reads a product's list with one indexed lookup.
+    """
+
+    KIND_CHOICES = (
+        ("bought_together", "Frequently bought together"),
+        ("similar", "Similar products"),
+    )
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="related_entries"
+    )
+    related = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name="+"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    # Start of the job run that wrote the row: the watermark of incremental runs
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Also the index the read path uses
+        unique_together = ("product", "kind", "rank")
+        ordering = ["product", "kind", "rank"]
+        indexes = [
+            models.Index(fields=["kind", "built_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.kind} #{self.rank})"
+
+
 # =============================================================================
 # STORE SETTINGS MODEL (Singleton)
 # =============================================================================
@@ -522,3 +677,20 @@ class StoreSettings(models.Model):
             },
         )
         return obj
+
+
+# =============================================================================
+# MEDIA MODELS
+# =============================================================================
+
+class MediaBlob(models.Model):
+    """
+    Reference count for one content-addressed file (project/storage.py).
+    Maintained by store/media.py; `manage.py dedupe_media` rebuilds it.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
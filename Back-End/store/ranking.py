@@ -0,0 +1,61 @@
+"""
+Product Ranking for Smart Shop E-commerce Platform
+
+Product.rank_score orders the top products list:
+
+    rank_score = (PRIOR_WEIGHT * PRIOR_MEAN + rating_sum) / (PRIOR_WEIGHT + num_reviews)
+                 + SALES_WEIGHT * ln(1 + units_sold_recent)
+
+The first term is a Bayesian average: every product starts with
+PRIOR_WEIGHT imaginary reviews of PRIOR_MEAN stars, so a single 5-star
+review moves it a little and two thousand 4.8s move it almost all the way.
+The second term is sales velocity: units sold in the last
+SALES_WINDOW_DAYS days, log-damped so best sellers cannot drown out ratings.
+
+The score is stored and indexed over the public products only (a partial
+index on -rank_score), so the top-N query reads N index entries instead of
+sorting the catalog. It is updated in the same
+UPDATE that changes its inputs: Product.adjust_rating for review writes,
+Product.record_sale for orders. Sales only leave the window when
+`manage.py rebuild_rankings` recounts them, so run it periodically
+(e.g. hourly from cron); it also repairs scores after settings change.
+"""
+
+from django.conf import settings
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Ln
+
+DEFAULTS = {
+    "PRIOR_MEAN": 3.5,
+    "PRIOR_WEIGHT": 10,
+    "SALES_WEIGHT": 0.25,
+    "SALES_WINDOW_DAYS": 30,
+}
+
+
+def get_ranking_config():
+    return {**DEFAULTS, **getattr(settings, "RANKING", {})}
+
+
+def initial_score():
+    """rank_score of a product with no reviews and no sales."""
+    return float(get_ranking_config()["PRIOR_MEAN"])
+
+
+def score_expression(rating_sum=None, num_reviews=None, units_sold=None):
+    """
+    SQL expression for rank_score. Pass expressions for inputs that the same
+    UPDATE changes (e.g. F("num_reviews") + 1); the rest read the row.
+    """
+    config = get_ranking_config()
+    rating_sum = F("rating_sum") if rating_sum is None else rating_sum
+    num_reviews = F("num_reviews") if num_reviews is None else num_reviews
+    units_sold = F("units_sold_recent") if units_sold is None else units_sold
+
+    prior = Value(float(config["PRIOR_WEIGHT"]))
+    bayesian = (
+        (prior * Value(float(config["PRIOR_MEAN"])) + Cast(rating_sum, FloatField()))
+        / (prior + Cast(num_reviews, FloatField()))
+    )
+    velocity = Ln(Value(1.0) + Cast(units_sold, FloatField()))
+    return bayesian + Value(float(config["SALES_WEIGHT"])) * velocity
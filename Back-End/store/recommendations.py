@@ -0,0 +1,379 @@
+"""
+Product Recommendations for Smart Shop E-commerce Platform
+
+Batch jobs that fill RelatedProduct with each product's top-K neighbours;
+`manage.py build_related_products` runs them. Web requests only read the
+table (views.get_related_products), so NumPy is needed by the job alone.
+
+bought_together: item-to-item co-occurrence over order history
+    - orders are read in primary key chunks; within a chunk the pairs of
+      products sharing a basket are generated and counted with NumPy
+      (no Python loop per order or per pair)
+    - each chunk's pair counts are spilled into hash-partitioned files by
+      the first product of the pair, so memory is bounded by the chunk and
+      by one partition, never by the whole co-occurrence matrix
+    - each partition is then merged, scored and cut to the top K:
+          cosine  = together / sqrt(orders_a * orders_b)
+          lift    = together * orders / (orders_a * orders_b)
+    - baskets larger than `max_basket` (bulk / B2B orders) are skipped,
+      they would add max_basket² pairs of noise each
+
+similar: content similarity, for products without sales history too
+    - name, brand, description, tags (and category) are tokenized and
+      hashed into `dims` columns (signed feature hashing: no vocabulary to
+      store), weighted 1 + log(tf) times a smoothed idf, L2-normalised
+    - products are compared within their category: each category is one
+      block. Vectors are kept sparse (CSR arrays); a batch of rows is
+      scored against the block one dense slice at a time, so memory is
+      bounded by batch × dims and batch × block, never block × dims
+    - categories with fewer than `min_block` products, and uncategorised
+      products, share one pooled block, so a tiny catalog still gets lists
+    - incremental runs only rebuild the blocks holding products updated
+      since the last run (the newest `built_at`), including the block a
+      product was moved out of
+"""
+
+import os
+import re
+import tempfile
+import zlib
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Order, OrderItem, Product, RelatedProduct
+
+METRICS = ("cosine", "lift")
+
+
+# =============================================================================
+# FREQUENTLY BOUGHT TOGETHER
+# =============================================================================
+
+
+def bought_together(
+    top_k=10,
+    metric="cosine",
+    min_count=2,
+    max_basket=50,
+    chunk_orders=50_000,
+    buckets=16,
+    log=None,
+):
+    """Rebuild the "bought_together" lists; returns (orders, pairs kept)."""
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}")
+    product_ids = np.fromiter(
+        Product.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=10_000),
+        dtype=np.int64,
+    )
+    started = timezone.now()
+    if len(product_ids) < 2:
+        _replace("bought_together", [])
+        return 0, 0
+    n_products = len(product_ids)
+    item_orders = np.zeros(n_products, dtype=np.int64)
+    total_orders = 0
+
+    with tempfile.TemporaryDirectory(prefix="bought-together-") as spill:
+        files = [open(os.path.join(spill, str(i)), "wb") for i in range(buckets)]
+        try:
+            for orders, items in _order_chunks(chunk_orders):
+                index = np.searchsorted(product_ids, items)
+                # Products created after the id snapshot was taken
+                known = (index < n_products) & (product_ids[np.minimum(index, n_products - 1)] == items)
+                counted, counts_per_item, keys, counts = _count_pairs(
+                    orders[known], index[known], n_products, max_basket
+                )
+                total_orders += counted
+                item_orders += counts_per_item
+
+                partition = (keys // n_products) % buckets
+                for bucket in np.unique(partition):
+                    selected = partition == bucket
+                    np.stack([keys[selected], counts[selected]], axis=1).tofile(files[bucket])
+                if log:
+                    log(f"{total_orders} orders counted, {len(keys)} pairs in the last chunk")
+        finally:
+            for handle in files:
+                handle.close()
+
+        scored = (
+            _score_bucket(os.path.join(spill, str(i)), n_products, item_orders, total_orders,
+                          top_k, metric, min_count)
+            for i in range(buckets)
+        )
+        kept = _replace("bought_together", (
+            RelatedProduct(
+                product_id=int(product_ids[a]), related_id=int(product_ids[b]),
+                kind="bought_together", rank=int(rank), score=float(score), built_at=started,
+            )
+            for rows in scored
+            for a, b, rank, score in zip(*rows)
+        ))
+    return total_orders, kept
+
+
+def _order_chunks(chunk_orders):
+    """Yield (order ids, product ids) arrays, `chunk_orders` orders at a time."""
+    last_pk = 0
+    while True:
+        pks = list(
+            Order.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)[:chunk_orders]
+        )
+        if not pks:
+            return
+        rows = list(
+            OrderItem.objects.filter(order_id__gte=pks[0], order_id__lte=pks[-1], product__isnull=False)
+            .exclude(order__status="Cancelled")
+            .values_list("order_id", "product_id")
+        )
+        last_pk = pks[-1]
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        yield rows[:, 0], rows[:, 1]
+
+
+def _count_pairs(orders, items, n_products, max_basket):
+    """
+    Count one chunk of baskets. `items` are indexes into the product id
+    array. Returns (baskets counted, orders per item, pair keys, pair counts),
+    where a key encodes the ordered pair (a, b), a != b, as a * n_products + b.
+    """
+    empty = np.empty(0, np.int64)
+    if not len(orders):
+        return 0, np.zeros(n_products, np.int64), empty, empty
+    # One row per (order, product), sorted by order
+    orders, items = np.unique(np.stack([orders, items]), axis=1)
+    starts = np.flatnonzero(np.r_[True, orders[1:] != orders[:-1]])
+    sizes = np.diff(np.r_[starts, len(orders)])
+
+    counted = sizes <= max_basket
+    item_orders = np.bincount(items[_ranges(starts[counted], sizes[counted])], minlength=n_products)
+
+    paired = counted & (sizes >= 2)
+    starts, sizes = starts[paired], sizes[paired]
+    if not len(sizes):
+        return int(counted.sum()), item_orders, empty, empty
+
+    # Pair every row of a basket with every row of the same basket
+    member = _ranges(starts, sizes)
+    member_start, member_size = np.repeat(starts, sizes), np.repeat(sizes, sizes)
+    left = np.repeat(member, member_size)
+    right = _ranges(member_start, member_size)
+    distinct = left != right
+
+    keys = items[left[distinct]] * n_products + items[right[distinct]]
+    keys, counts = np.unique(keys, return_counts=True)
+    return int(counted.sum()), item_orders, keys, counts
+
+
+def _ranges(starts, sizes):
+    """concatenate(arange(start, start + size) for each pair), without a loop."""
+    if not len(sizes):
+        return np.empty(0, np.int64)
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    return np.repeat(starts, sizes) + offsets
+
+
+def _score_bucket(path, n_products, item_orders, total_orders, top_k, metric, min_count):
+    """Merge one partition's pair counts; (a, b, rank, score) arrays of the top-K per a."""
+    data = np.fromfile(path, dtype=np.int64).reshape(-1, 2)
+    if not len(data):
+        return (np.empty(0, np.int64),) * 4
+    keys, inverse = np.unique(data[:, 0], return_inverse=True)
+    together = np.bincount(inverse, weights=data[:, 1]).astype(np.int64)
+    frequent = together >= min_count
+    keys, together = keys[frequent], together[frequent]
+    a, b = keys // n_products, keys % n_products
+
+    expected = item_orders[a].astype(np.float64) * item_orders[b]
+    if metric == "cosine":
+        score = together / np.sqrt(expected)
+    else:
+        score = together * float(total_orders) / expected
+
+    # Group by a, best score first (ties: more orders together, then lower id)
+    order = np.lexsort((b, -together, -score, a))
+    a, b, score = a[order], b[order], score[order]
+    group_start = np.flatnonzero(np.r_[True, a[1:] != a[:-1]])
+    rank = np.arange(len(a)) - np.repeat(group_start, np.diff(np.r_[group_start, len(a)]))
+    top = rank < top_k
+    return a[top], b[top], rank[top], score[top]
+
+
+# =============================================================================
+# SIMILAR PRODUCTS
+# =============================================================================
+
+TOKEN = re.compile(r"[^\W_]{2,}")
+POOL = "pool"
+
+
+def similar(top_k=10, dims=2048, min_block=None, min_score=0.05, batch_size=256, incremental=False):
+    """
+    Rebuild the "similar" lists, every block or (incremental) only changed
+    ones; returns (products compared, neighbours stored).
+    """
+    started = timezone.now()
+    min_block = top_k + 1 if min_block is None else min_block
+    sizes = dict(
+        Product.objects.values_list("category_id").annotate(n=Count("pk")).order_by()
+    )
+    pooled = {category for category, n in sizes.items() if category is None or n < min_block}
+    blocks = {category: category for category in sizes if category not in pooled}
+    blocks.update({category: POOL for category in pooled})
+
+    since = None
+    if incremental:
+        since = RelatedProduct.objects.filter(kind="similar").aggregate(last=Max("built_at"))["last"]
+    if since is not None:
+        changed = set(
+            Product.objects.filter(updated_at__gte=since).values_list("category_id", flat=True).distinct()
+        )
+        # The old category of a product that moved still lists it
+        changed.update(
+            RelatedProduct.objects.filter(kind="similar", related__updated_at__gte=since)
+            .values_list("product__category_id", flat=True).distinct()
+        )
+        selected = {blocks[category] for category in changed if category in blocks}
+    else:
+        selected = set(blocks.values())
+
+    compared = written = 0
+    for block in selected:
+        categories = [category for category, b in blocks.items() if b == block]
+        ids, features = _block_features(categories, pooled=block == POOL)
+        rows = _similar_rows(ids, features, dims, top_k, min_score, batch_size, started)
+        written += _replace("similar", rows, product_ids=ids)
+        compared += len(ids)
+    if since is None:
+        # Categories that no longer exist or lost all their products
+        RelatedProduct.objects.filter(kind="similar", built_at__lt=started).delete()
+    return compared, written
+
+
+def _block_features(categories, pooled):
+    """Product ids of a block and each product's hashed feature list."""
+    query = Product.objects.filter(category_id__in=[c for c in categories if c is not None])
+    if None in categories:
+        query = query | Product.objects.filter(category__isnull=True)
+    query = query.order_by("pk").select_related("category").prefetch_related("tags")
+
+    ids, features = [], []
+    for product in query.iterator(chunk_size=2000):
+        tokens = TOKEN.findall(f"{product.name} {product.name} {product.description or ''}".lower())
+        if product.brand:
+            tokens += [f"brand:{product.brand.lower()}"] * 2
+        tokens += [f"tag:{tag.name.lower()}" for tag in product.tags.all()] * 2
+        if pooled and product.category:
+            tokens.append(f"category:{product.category_id}")
+        ids.append(product.pk)
+        features.append(tokens)
+    return ids, features
+
+
+def _similar_rows(ids, features, dims, top_k, min_score, batch_size, built_at):
+    n = len(ids)
+    if n < 2:
+        return
+    vectors = _tfidf(features, dims)
+    k = min(top_k, n - 1)
+    for start in range(0, n, batch_size):
+        batch = _dense_rows(vectors, start, start + batch_size, dims)
+        # batch × block scores, filled one dense slice of the block at a time
+        scores = np.empty((len(batch), n), dtype=np.float32)
+        for column in range(0, n, batch_size):
+            scores[:, column:column + batch_size] = (
+                batch @ _dense_rows(vectors, column, column + batch_size, dims).T
+            )
+        rows = np.arange(len(scores))
+        scores[rows, start + rows] = -1.0  # not similar to itself
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for row in rows:
+            rank = 0
+            for column, score in zip(best[row], best_scores[row]):
+                if score < min_score:
+                    break
+                yield RelatedProduct(
+                    product_id=ids[start + row], related_id=ids[column], kind="similar",
+                    rank=rank, score=float(score), built_at=built_at,
+                )
+                rank += 1
+
+
+def _tfidf(features, dims):
+    """
+    L2-normalised hashed TF-IDF rows in CSR form, (indptr, columns, values):
+    only the non-zero cells are stored, so memory grows with the number of
+    tokens rather than with documents × dims.
+    """
+    rows, columns, signs = [], [], []
+    for row, tokens in enumerate(features):
+        for token in tokens:
+            digest = zlib.crc32(token.encode())
+            rows.append(row)
+            columns.append(digest % dims)
+            # Signed hashing: colliding features tend to cancel, not add up
+            signs.append(1.0 if digest & 0x80000000 else -1.0)
+    n = len(features)
+    cells = np.array(rows, dtype=np.int64) * dims + np.array(columns, dtype=np.int64)
+    cells, position = np.unique(cells, return_inverse=True)  # sorted by row, then column
+    counts = np.bincount(position, weights=signs, minlength=len(cells)).astype(np.float32)
+    present = counts != 0
+    cells, counts = cells[present], counts[present]
+    rows, columns = cells // dims, cells % dims
+
+    idf = np.log((1 + n) / (1 + np.bincount(columns, minlength=dims))) + 1
+    values = (np.sign(counts) * (1 + np.log(np.abs(counts))) * idf[columns]).astype(np.float32)
+    norms = np.sqrt(np.bincount(rows, weights=values.astype(np.float64) ** 2, minlength=n))
+    values /= np.where(norms == 0, 1, norms)[rows].astype(np.float32)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))])
+    return indptr, columns, values
+
+
+def _dense_rows(vectors, start, stop, dims):
+    """Rows start:stop of a CSR matrix from _tfidf as a dense float32 array."""
+    indptr, columns, values = vectors
+    stop = min(stop, len(indptr) - 1)
+    first, last = indptr[start], indptr[stop]
+    dense = np.zeros((stop - start, dims), dtype=np.float32)
+    rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+    dense[rows, columns[first:last]] = values[first:last]
+    return dense
+
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+
+def _replace(kind, rows, product_ids=None, batch_size=5000):
+    """
+    Swap in new rows for a kind, or for the given products of it, in one
+    transaction; returns how many were written.
+    """
+    written = 0
+    with transaction.atomic():
+        if product_ids is None:
+            RelatedProduct.objects.filter(kind=kind).delete()
+        else:
+            for start in range(0, len(product_ids), 500):
+                RelatedProduct.objects.filter(
+                    kind=kind, product_id__in=product_ids[start:start + 500]
+                ).delete()
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                RelatedProduct.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        RelatedProduct.objects.bulk_create(batch)
+        written += len(batch)
+    return written
@@ -19,6 +19,8 @@ from .models import (
 )
 from decimal import Decimal
 
+from .images import variant_urls
+
 
 # =============================================================================
 # USER SERIALIZER (Simple version for store app)
@@ -55,6 +57,9 @@ class CategorySerializer(serializers.ModelSerializer):
 
     def get_product_count(self, obj):
         """Get count of approved products in this category"""
+        # get_categories annotates the count to avoid one query per category
+        if hasattr(obj, "approved_product_count"):
+            return obj.approved_product_count
         return obj.products.filter(approval_status="approved", is_active=True).count()
 
 
@@ -100,21 +105,32 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 class ProductImageSerializer(serializers.ModelSerializer):
     """Product image serializer for gallery"""
-    
+    variants = serializers.SerializerMethodField(read_only=True)
+
     class Meta:
         model = ProductImage
-        fields = ["id", "image", "alt_text"]
+        fields = ["id", "image", "variants", "alt_text"]
+
+    def get_variants(self, obj):
+        """Resized WebP / JPEG URLs by size (empty until generated)"""
+        return variant_urls(obj.image_variants, self.context.get("request"))
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    """Complete product serializer with all related data"""
-    reviews = ReviewSerializer(many=True, read_only=True)
+    """
+    Complete product serializer with all related data.
+    Reviews are paged separately (views.ReviewPagination); the rating
+    histogram comes from the stored per-star counts.
+    """
     images = ProductImageSerializer(many=True, read_only=True)
 
     user_name = serializers.CharField(source="user.username", read_only=True)
     category_name = serializers.CharField(source="category.name", read_only=True)
+    category_slug = serializers.CharField(source="category.slug", read_only=True)
     tags = TagSerializer(many=True, read_only=True)
 
+    image_variants = serializers.SerializerMethodField(read_only=True)
+    rating_histogram = serializers.ReadOnlyField()
     final_price = serializers.SerializerMethodField(read_only=True)
     is_in_stock = serializers.SerializerMethodField(read_only=True)
 
@@ -125,13 +141,15 @@ class ProductSerializer(serializers.ModelSerializer):
             "name",
             "slug",
             "image",
+            "image_variants",
             "brand",
             "category",
             "category_name",
-            "category_slug", 
+            "category_slug",
             "description",
             "rating",
             "num_reviews",
+            "rating_histogram",
             "price",
             "discount_price",
             "final_price",
@@ -142,13 +160,16 @@ class ProductSerializer(serializers.ModelSerializer):
             "user",
             "user_name",
             "images",
-            "reviews",
             "tags",
             "is_featured",
             "is_active",
             "approval_status",
         ]
 
+    def get_image_variants(self, obj):
+        """Resized WebP / JPEG URLs of the main image by size"""
+        return variant_urls(obj.image_variants, self.context.get("request"))
+
     def get_final_price(self, obj):
         """Get the actual selling price"""
         return str(obj.final_price)
@@ -160,6 +181,7 @@ class ProductSerializer(serializers.ModelSerializer):
 
 class SimpleProductSerializer(serializers.ModelSerializer):
     """Lightweight product serializer for cart/wishlist"""
+    image_variants = serializers.SerializerMethodField(read_only=True)
     final_price = serializers.SerializerMethodField(read_only=True)
     is_in_stock = serializers.SerializerMethodField(read_only=True)
 
@@ -170,6 +192,7 @@ class SimpleProductSerializer(serializers.ModelSerializer):
             "name",
             "slug",
             "image",
+            "image_variants",
             "price",
             "discount_price",
             "final_price",
@@ -177,6 +200,9 @@ class SimpleProductSerializer(serializers.ModelSerializer):
             "is_in_stock",
         ]
 
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants, self.context.get("request"))
+
     def get_final_price(self, obj):
         return str(obj.final_price)
 
@@ -1,3 +1,1186 @@
-from django.test import TestCase
+"""
+Store Tests for Smart Shop E-commerce Platform
+"""
 
-# Create your tests here.
+import base64
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.db.models import Max, Min
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from project.cache import tiered_cache
+from project.query_budget import QueryBudgetTestMixin
+from project.storage import serve_media
+from project.uploads import save_files
+from . import images, recommendations
+from .catalog_index import catalog_index
+from .conditional import shop_view_validators, touch_products
+from .management.commands.benchmark import Command as BenchmarkCommand, percentile
+from .models import (
+    Category,
+    Tag,
+    Product,
+    ProductImage,
+    Review,
+    RelatedProduct,
+    Order,
+    OrderItem,
+    ShippingAddress,
+    CartItem,
+    WishlistItem,
+    MediaBlob,
+    StoreSettings,
+)
+from .views import PRODUCT_SORTS
+
+
+class StoreFixtureMixin:
+    """A small but fan-out heavy catalog: N+1s show up as budget failures."""
+
+    def setUp(self):
+        super().setUp()
+        # Throttle buckets live in the shared cache for the whole test run
+        caches[settings.THROTTLE_CACHE].clear()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True)
+        cls.vendor = User.objects.create_user("vendor", "vendor@example.com", "pass")
+        cls.customer = User.objects.create_user("customer", "customer@example.com", "pass")
+
+        cls.category = Category.objects.create(name="Phones")
+        tags = [Tag.objects.create(name=f"tag-{i}") for i in range(3)]
+
+        cls.products = []
+        for i in range(15):
+            product = Product.objects.create(
+                user=cls.vendor,
+                category=cls.category,
+                name=f"Phone {i}",
+                slug=f"phone-{i}",
+                price=Decimal("100.00") + i,
+                count_in_stock=10,
+                rating=Decimal("4.50"),
+                approval_status="approved",
+            )
+            product.tags.set(tags)
+            ProductImage.objects.create(product=product, image=f"product_gallery/{i}.png")
+            Review.objects.create(product=product, user=cls.customer, rating=5)
+            cls.products.append(product)
+
+        cls.order = Order.objects.create(user=cls.customer, total_price=Decimal("300.00"))
+        ShippingAddress.objects.create(order=cls.order, address="1 St", city="Cairo", country="EG")
+        for product in cls.products[:3]:
+            OrderItem.objects.create(order=cls.order, product=product, name=product.name, price=product.price)
+            CartItem.objects.create(user=cls.customer, product=product)
+            WishlistItem.objects.create(user=cls.customer, product=product)
+
+
+class StoreQueryBudgetTests(StoreFixtureMixin, QueryBudgetTestMixin, TestCase):
+    """Every read endpoint in store/urls.py stays within its query budget."""
+
+    def test_public_catalog(self):
+        self.assertQueryBudget("products")
+        self.assertQueryBudget("top-products")
+        self.assertQueryBudget("shop-view")
+        self.assertQueryBudget("product-detail", args=["phone-1"])
+        self.assertQueryBudget("product-reviews", args=[self.products[1].pk])
+        self.assertQueryBudget("related-products", args=[self.products[1].pk])
+        self.assertQueryBudget("categories")
+        self.assertQueryBudget("tags")
+        self.assertQueryBudget("store-settings")
+
+    def test_customer_reads(self):
+        self.assertQueryBudget("myorders", user=self.customer)
+        self.assertQueryBudget("user-order", args=[self.order.id], user=self.customer)
+        self.assertQueryBudget("cart-get", user=self.customer)
+        self.assertQueryBudget("wishlist-get", user=self.customer)
+
+    def test_vendor_reads(self):
+        self.assertQueryBudget("my-products", user=self.vendor)
+        self.assertQueryBudget("seller_orders", user=self.vendor)
+
+    def test_admin_reads(self):
+        self.assertQueryBudget("orders", user=self.admin)
+        self.assertQueryBudget("products", user=self.admin)
+        self.assertQueryBudget("dashboard-stats", user=self.admin)
+        self.assertQueryBudget("export_orders_csv", user=self.admin)
+
+    def test_writes(self):
+        product = self.products[5]
+        self.assertQueryBudget("cart-add", method="post", user=self.customer,
+                               data={"product_id": product.id, "qty": 1})
+        self.assertQueryBudget("wishlist-toggle", method="post", user=self.customer,
+                               data={"product_id": product.id})
+        self.assertQueryBudget("create-review", args=[product.id], method="post",
+                               user=self.admin, data={"rating": 4}, status_code=201)
+        self.assertQueryBudget(
+            "orders-add", method="post", user=self.customer,
+            data={
+                "order_items": [{"id": p.id, "qty": 1} for p in self.products[:5]],
+                "shipping_address": {"address": "1 St", "city": "Cairo", "country": "EG"},
+            },
+            status_code=201,
+        )
+
+
+class ConditionalGetTests(StoreFixtureMixin, TestCase):
+    """ETag / Last-Modified validators change whenever the payload does."""
+
+    def test_order_invalidates_product_validators(self):
+        product = self.products[4]
+        urls = [reverse("product-detail", args=[product.pk]), reverse("products")]
+        etags = {url: self.client.get(url)["ETag"] for url in urls}
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 304)
+
+        token = RefreshToken.for_user(self.customer).access_token
+        response = self.client.post(reverse("orders-add"), {
+            "order_items": [{"id": product.pk, "qty": 2}],
+            "shipping_address": {"address": "1 St", "city": "Cairo", "country": "EG"},
+        }, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 201, response.content)
+
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(self.client.get(urls[0]).json()["count_in_stock"], 8)
+
+    def later(self, seconds=60):
+        return mock.patch("django.utils.timezone.now", return_value=timezone.now() + timedelta(seconds=seconds))
+
+    def assertRevalidates(self, url, change):
+        """`url` answers 304 to its own validators until `change()` runs."""
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_category_validators(self):
+        url = reverse("categories")
+        self.assertRevalidates(url, lambda: Category.objects.create(name="Cameras"))
+        # product_count depends on the public products too
+        self.assertRevalidates(url, lambda: Product.objects.create(
+            user=self.vendor, category=self.category, name="Tablet", price=Decimal("10"),
+            approval_status="approved",
+        ))
+
+    def test_tag_validators(self):
+        self.assertRevalidates(reverse("tags"), lambda: Tag.objects.create(name="sale"))
+
+    def test_settings_validators(self):
+        def change():
+            self.client.patch(reverse("update-store-settings"), {"tax_rate": "0.20"},
+                              content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        token = RefreshToken.for_user(self.admin).access_token
+        StoreSettings.get_settings()
+        self.assertRevalidates(reverse("store-settings"), change)
+
+    def test_shop_view_validators_follow_public_products(self):
+        etag, last_modified = shop_view_validators(None)
+        pending = Product.objects.create(
+            user=self.vendor, category=self.category, name="Tablet", price=Decimal("10"),
+            approval_status="pending",
+        )
+        self.assertEqual(shop_view_validators(None), (etag, last_modified))
+        with self.later():
+            touch_products(Product.objects.filter(pk=self.products[0].pk))
+        changed, modified = shop_view_validators(None)
+        self.assertNotEqual(changed, etag)
+        self.assertGreater(modified, last_modified)
+        Product.objects.filter(pk=pending.pk).update(approval_status="approved")
+        self.assertNotEqual(shop_view_validators(None)[0], changed)
+
+    def test_if_modified_since(self):
+        product = self.products[2]
+        url = reverse("product-detail", args=[product.pk])
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE="Mon, 01 Jan 2001 00:00:00 GMT").status_code, 200
+        )
+        with self.later():
+            touch_products(Product.objects.filter(pk=product.pk))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["Last-Modified"], last_modified)
+
+    def test_tag_rename_touches_products(self):
+        tag = Tag.objects.create(name="sale")
+        product = self.products[3]
+        product.tags.add(tag)
+        token = RefreshToken.for_user(self.admin).access_token
+        self.assertRevalidates(
+            reverse("product-detail", args=[product.pk]),
+            lambda: self.client.put(reverse("tag-update", args=[tag.pk]), {"name": "clearance"},
+                                    content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}"),
+        )
+
+    def test_review_changes_product_and_review_validators(self):
+        product = self.products[5]
+        token = RefreshToken.for_user(self.admin).access_token
+        urls = [reverse("product-detail", args=[product.pk]), reverse("product-reviews", args=[product.pk])]
+        etags = {url: self.client.get(url)["ETag"] for url in urls}
+        response = self.client.post(reverse("create-review", args=[product.pk]), {"rating": 4},
+                                    HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 201, response.content)
+        for url in urls:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            self.assertEqual(response.status_code, 200, url)
+
+
+class ProductUploadMixin(StoreFixtureMixin):
+    """Posts product-create as the vendor, with media written to a temp MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, UPLOAD_LIMITS={"MAX_FILE_SIZE": 512 * 1024})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        token = RefreshToken.for_user(self.vendor).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    def png(self, name, size=(64, 64)):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, (200, 30, 30)).save(buffer, "PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def create(self, images):
+        return self.client.post(reverse("product-create"), {
+            "name": "Camera",
+            "price": "250",
+            "category": self.category.id,
+            "count_in_stock": 3,
+            "images": images,
+        })
+
+
+class CachePolicyTests(StoreFixtureMixin, TestCase):
+    """@cache_policy sets Cache-Control, Vary and surrogate keys per policy."""
+
+    def login(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    def assertCacheControl(self, response, *directives):
+        self.assertEqual(
+            sorted(part.strip() for part in response["Cache-Control"].split(",")),
+            sorted(directives),
+        )
+        self.assertIn("Authorization", response["Vary"])
+
+    def test_public_catalog_view(self):
+        product = self.products[1]
+        response = self.client.get(reverse("product-detail", args=[product.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertCacheControl(
+            response, "public", "max-age=60", "s-maxage=300", "stale-while-revalidate=60"
+        )
+        self.assertEqual(
+            response[settings.SURROGATE_KEY_HEADER].split(),
+            ["products", f"product-{product.id}", f"category-{self.category.id}"],
+        )
+
+    def test_catalog_view_is_private_when_authenticated_or_missing(self):
+        self.login(self.customer)
+        response = self.client.get(reverse("product-detail", args=["phone-1"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertCacheControl(response, "private", "no-cache")
+
+        self.client.defaults.pop("HTTP_AUTHORIZATION")
+        response = self.client.get(reverse("product-detail", args=["no-such-product"]))
+        self.assertEqual(response.status_code, 404)
+        self.assertCacheControl(response, "private", "no-cache")
+        self.assertFalse(response.has_header(settings.SURROGATE_KEY_HEADER))
+
+    def test_private_view(self):
+        self.login(self.customer)
+        response = self.client.get(reverse("cart-get"))
+        self.assertEqual(response.status_code, 200)
+        self.assertCacheControl(response, "private", "no-cache")
+        self.assertFalse(response.has_header(settings.SURROGATE_KEY_HEADER))
+
+    def test_admin_view_is_never_stored(self):
+        self.login(self.admin)
+        response = self.client.get(reverse("orders"))
+        self.assertEqual(response.status_code, 200)
+        self.assertCacheControl(response, "private", "no-store")
+        self.assertFalse(response.has_header(settings.SURROGATE_KEY_HEADER))
+
+
+class GalleryUploadTests(ProductUploadMixin, TestCase):
+    """project/uploads.py limits, applied while product images stream in."""
+
+    def test_gallery_saved(self):
+        response = self.create([self.png(f"{i}.png") for i in range(4)])
+        self.assertEqual(response.status_code, 201, response.content)
+        product = Product.objects.get(name="Camera")
+        self.assertEqual(product.images.count(), 4)
+        for image in product.images.all():
+            self.assertTrue(image.image.storage.exists(image.image.name))
+
+    def test_oversized_file_rejected(self):
+        # Noise doesn't compress: well over the 512KB cap, and past the spool threshold
+        noise = Image.frombytes("RGB", (600, 600), os.urandom(600 * 600 * 3))
+        buffer = io.BytesIO()
+        noise.save(buffer, "PNG")
+        big = SimpleUploadedFile("big.png", buffer.getvalue(), content_type="image/png")
+        response = self.create([self.png("ok.png"), big])
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(Product.objects.filter(name="Camera").exists())
+
+    def test_non_image_rejected(self):
+        fake = SimpleUploadedFile("photo.png", b"<?php echo 'hi'; ?>", content_type="image/png")
+        response = self.create([fake])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Product.objects.filter(name="Camera").exists())
+
+    def test_decompression_bomb_rejected(self):
+        with override_settings(UPLOAD_LIMITS={"MAX_PIXELS": 100 * 100}):
+            response = self.create([self.png("huge.png", size=(200, 200))])
+        self.assertEqual(response.status_code, 400)
+
+
+class ContentAddressedMediaTests(ProductUploadMixin, TestCase):
+    """project/storage.py names blobs by hash; store/media.py counts references."""
+
+    def test_duplicate_uploads_share_one_blob(self):
+        photo = self.png("a.png").read()
+        response = self.create([
+            SimpleUploadedFile("a.png", photo, content_type="image/png"),
+            SimpleUploadedFile("copy-of-a.png", photo, content_type="image/png"),
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        product = Product.objects.get(name="Camera")
+        names = {image.image.name for image in product.images.all()}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(name.startswith("cas/"))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+
+        storage = product.images.first().image.storage
+        product.images.first().delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+        self.assertFalse(storage.exists(name))
+
+    def product_with_image(self, name):
+        return Product.objects.create(
+            user=self.vendor, category=self.category, name="Lamp", price=Decimal("5"),
+            count_in_stock=3, approval_status="approved", image=self.png(name),
+        )
+
+    def test_orders_keep_their_image(self):
+        product = self.product_with_image("lamp.png")
+        name, storage = product.image.name, product.image.storage
+        token = RefreshToken.for_user(self.customer).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        response = self.client.post(reverse("orders-add"), {
+            "order_items": [{"id": product.pk, "qty": 1}],
+            "shipping_address": {"address": "1 St", "city": "Cairo", "country": "EG"},
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(items__image__endswith=name).delete()
+        self.assertFalse(storage.exists(name))
+
+    def test_reupload_survives_concurrent_release(self):
+        first = self.product_with_image("a.png")
+        name, storage = first.image.name, first.image.storage
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+
+        exists = storage.exists
+
+        def exists_then_release(path):
+            # The release commits right after the re-upload found the file
+            found = exists(path)
+            for callback in callbacks:
+                callback()
+            return found
+
+        with mock.patch.object(storage, "exists", exists_then_release):
+            second = self.product_with_image("copy.png")
+        self.assertEqual(second.image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_gallery_upload_survives_concurrent_release(self):
+        first = self.product_with_image("a.png")
+        name, storage = first.image.name, first.image.storage
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+
+        def save_then_release(instances, field_name):
+            # The release commits right after the gallery files are written
+            save_files(instances, field_name)
+            for callback in callbacks:
+                callback()
+
+        with mock.patch("store.views.save_files", save_then_release):
+            response = self.create([self.png("copy.png")])
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Product.objects.get(name="Camera").images.get().image.name, name)
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 1)
+
+    def test_failed_gallery_insert_releases_its_blobs(self):
+        with mock.patch.object(ProductImage.objects, "bulk_create", side_effect=IntegrityError):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.create([self.png("a.png")])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaBlob.objects.exists())
+        written = [files for _, _, files in os.walk(os.path.join(self.media_root, "cas")) if files]
+        self.assertEqual(written, [])
+
+    def test_blobs_served_immutable(self):
+        self.create([self.png("a.png")])
+        name = Product.objects.get(name="Camera").images.get().image.name
+        request = RequestFactory().get(f"/media/{name}")
+        response = serve_media(request, name, document_root=self.media_root)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("max-age=31536000", response["Cache-Control"])
+
+
+@override_settings(IMAGE_DERIVATIVES={**settings.IMAGE_DERIVATIVES, "ENABLED": False})
+class ImageDerivativeTests(TransactionTestCase):
+    """Derivative generation, run synchronously instead of on the thread pool."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        path = os.path.join(self.media_root, "products", "shoe.png")
+        os.makedirs(os.path.dirname(path))
+        Image.new("RGBA", (600, 300), (200, 30, 30, 128)).save(path, "PNG")
+        vendor = User.objects.create_user("vendor", "vendor@example.com", "pass")
+        category = Category.objects.create(name="Shoes")
+        self.product = Product.objects.create(
+            user=vendor, category=category, name="Shoe", slug="shoe", price=Decimal("1"),
+            image="products/shoe.png",
+        )
+
+    def open_variant(self, name):
+        return Image.open(os.path.join(self.media_root, name))
+
+    def test_generates_every_size_and_format(self):
+        touched = self.product.updated_at
+        images._generate(Product, self.product.pk, "products/shoe.png")
+
+        self.product.refresh_from_db()
+        variants = self.product.image_variants
+        self.assertEqual(variants["source"], "products/shoe.png")
+        self.assertEqual(set(variants) - {"source"}, {"thumb", "card", "detail"})
+        self.assertEqual(variants["thumb"]["webp"], "derivatives/products/shoe/thumb.webp")
+        self.assertEqual(variants["thumb"]["jpeg"], "derivatives/products/shoe/thumb.jpg")
+        # Aspect ratio kept, never upscaled
+        expected = {"thumb": (150, 75), "card": (400, 200), "detail": (600, 300)}
+        for size, dimensions in expected.items():
+            for fmt, pil_format in (("webp", "WEBP"), ("jpeg", "JPEG")):
+                with self.subTest(size=size, fmt=fmt), self.open_variant(variants[size][fmt]) as image:
+                    self.assertEqual(image.format, pil_format)
+                    self.assertEqual(image.size, dimensions)
+        self.assertGreater(self.product.updated_at, touched)
+
+    def test_gallery_image_touches_its_product(self):
+        gallery = ProductImage.objects.create(product=self.product, image="products/shoe.png")
+        touched = Product.objects.get(pk=self.product.pk).updated_at
+        images._generate(ProductImage, gallery.pk, "products/shoe.png")
+
+        gallery.refresh_from_db()
+        self.assertEqual(gallery.image_variants["card"]["webp"], "derivatives/products/shoe/card.webp")
+        self.assertGreater(Product.objects.get(pk=self.product.pk).updated_at, touched)
+
+    def test_replaced_image_is_not_overwritten(self):
+        Product.objects.filter(pk=self.product.pk).update(image="products/other.png")
+        touched = Product.objects.get(pk=self.product.pk).updated_at
+        images._generate(Product, self.product.pk, "products/shoe.png")
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.image_variants, {})
+        self.assertEqual(self.product.updated_at, touched)
+
+
+class MediaGarbageCollectionTests(TransactionTestCase):
+    """gc_media removes files no row (or derivative map) points at."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = override_settings(MEDIA_ROOT=self.media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        vendor = User.objects.create_user("vendor", "vendor@example.com", "pass")
+        category = Category.objects.create(name="Phones")
+        Product.objects.create(
+            user=vendor, category=category, name="Phone", slug="phone", price=Decimal("1"),
+            image="products/kept.png",
+            image_variants={"source": "products/kept.png", "thumb": {"webp": "derivatives/products/kept/thumb.webp"}},
+        )
+        # An order outlives its product: the item still shows the image
+        customer = User.objects.create_user("customer", "customer@example.com", "pass")
+        order = Order.objects.create(user=customer, total_price=Decimal("1"))
+        OrderItem.objects.create(order=order, product=None, name="Gone", price=Decimal("1"),
+                                 image="/media/products/ordered.png")
+        for name in ("products/kept.png", "derivatives/products/kept/thumb.webp", "products/ordered.png",
+                     "products/orphan.png", "profiles/deleted-user.jpg", "fresh/upload.png"):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fh:
+                fh.write(b"x")
+            if not name.startswith("fresh/"):
+                os.utime(path, (0, 0))
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root)
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_dry_run_changes_nothing(self):
+        before = self.files()
+        call_command("gc_media", "--dry-run", "--buckets", "4", stdout=io.StringIO())
+        self.assertEqual(self.files(), before)
+
+    def test_orphans_deleted(self):
+        call_command("gc_media", "--buckets", "4", stdout=io.StringIO())
+        self.assertEqual(self.files(), [
+            "derivatives/products/kept/thumb.webp",
+            "fresh/upload.png",
+            "products/kept.png",
+            "products/ordered.png",
+        ])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "profiles")))
+
+    def test_orphans_quarantined(self):
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine, ignore_errors=True)
+        call_command("gc_media", "--quarantine", quarantine, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(os.path.join(quarantine, "products/orphan.png")))
+        self.assertNotIn("products/orphan.png", self.files())
+
+
+class ProductUpdateTests(StoreFixtureMixin, TestCase):
+    """update_product writes only the fields it edits."""
+
+    def test_keeps_counters_changed_meanwhile(self):
+        product = self.products[3]
+        stale = Product.objects.get(pk=product.pk)
+        # A review and an order land while the vendor's edit is in flight
+        Product.adjust_rating(product.pk, added=1)
+        Product.record_sale(product.pk, 2)
+        counters = ("rating_sum", "num_reviews", "rating_count_1", "units_sold_recent", "count_in_stock", "rank_score")
+        expected = Product.objects.values_list(*counters).get(pk=product.pk)
+
+        token = RefreshToken.for_user(self.vendor).access_token
+        with mock.patch("store.views.get_object_or_404", return_value=stale):
+            response = self.client.put(
+                reverse("product-update", args=[product.pk]), {"name": "Phone X", "price": "150"},
+                content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}",
+            )
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual((product.name, product.price), ("Phone X", Decimal("150.00")))
+        self.assertEqual(Product.objects.values_list(*counters).get(pk=product.pk), expected)
+
+
+class ReviewRatingTests(StoreFixtureMixin, TestCase):
+    """Product.adjust_rating keeps rating_sum / num_reviews / rating in step with reviews."""
+
+    def setUp(self):
+        super().setUp()
+        self.product = Product.objects.create(
+            user=self.vendor, category=self.category, name="Tablet", slug="tablet", price=Decimal("10"),
+        )
+
+    def as_user(self, user):
+        token = RefreshToken.for_user(user).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    def totals(self):
+        self.product.refresh_from_db()
+        return self.product.rating_sum, self.product.num_reviews, self.product.rating
+
+    def test_review_writes_adjust_totals(self):
+        for user, rating in ((self.customer, 5), (self.admin, 4), (self.vendor, 4)):
+            self.as_user(user)
+            self.client.post(reverse("create-review", args=[self.product.pk]), {"rating": rating})
+        self.assertEqual(self.totals(), (13, 3, Decimal("4.33")))
+
+        self.client.put(reverse("update-review", args=[self.product.pk]), {"rating": 1},
+                        content_type="application/json")
+        self.assertEqual(self.totals(), (10, 3, Decimal("3.33")))
+
+        self.client.delete(reverse("delete-review", args=[self.product.pk]))
+        self.assertEqual(self.totals(), (9, 2, Decimal("4.50")))
+
+        for user in (self.customer, self.admin):
+            self.as_user(user)
+            self.client.delete(reverse("delete-review", args=[self.product.pk]))
+        self.assertEqual(self.totals(), (0, 0, Decimal("0.00")))
+
+    def test_reconcile_fixes_drift(self):
+        Review.objects.create(product=self.product, user=self.customer, rating=2)
+        Review.objects.create(product=self.product, user=self.admin, rating=5)
+        call_command("reconcile_ratings", stdout=io.StringIO())
+        self.assertEqual(self.totals(), (7, 2, Decimal("3.50")))
+        self.assertEqual(self.product.rating_histogram, {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1})
+
+    def test_reconcile_changes_validators(self):
+        product = self.products[2]
+        Review.objects.create(product=product, user=self.admin, rating=1)
+        url = reverse("product-detail", args=[product.slug])
+        etag = self.client.get(url)["ETag"]
+
+        call_command("reconcile_ratings", stdout=io.StringIO())
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["num_reviews"], response.json()["rating"]), (2, "3.00"))
+
+    def test_histogram_follows_review_writes(self):
+        for user, rating in ((self.customer, 5), (self.admin, 4)):
+            self.as_user(user)
+            self.client.post(reverse("create-review", args=[self.product.pk]), {"rating": rating})
+        self.client.put(reverse("update-review", args=[self.product.pk]), {"rating": 2},
+                        content_type="application/json")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_histogram, {"1": 0, "2": 1, "3": 0, "4": 0, "5": 1})
+
+        self.client.delete(reverse("delete-review", args=[self.product.pk]))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_histogram, {"1": 0, "2": 0, "3": 0, "4": 0, "5": 1})
+
+
+class ReviewListTests(StoreFixtureMixin, TestCase):
+    """get_product_reviews pages through reviews by keyset; get_product carries the first page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.product = cls.products[0]
+        reviewers = [User.objects.create_user(f"reviewer-{i}", password="pass") for i in range(24)]
+        Review.objects.bulk_create(
+            Review(product=cls.product, user=user, rating=i % 5 + 1) for i, user in enumerate(reviewers)
+        )
+        call_command("reconcile_ratings", stdout=io.StringIO())
+
+    def collect(self, sort):
+        url = reverse("product-reviews", args=[self.product.pk]) + f"?sort={sort}"
+        reviews = []
+        while url:
+            data = self.client.get(url).json()
+            self.assertLessEqual(len(data["reviews"]), 10)
+            reviews += data["reviews"]
+            url = data["next"]
+        return reviews
+
+    def test_pages_cover_every_review_once(self):
+        expected = Review.objects.filter(product=self.product).count()
+        for sort in ("newest", "oldest", "highest", "lowest"):
+            reviews = self.collect(sort)
+            self.assertEqual(len({review["id"] for review in reviews}), expected, sort)
+            self.assertEqual(len(reviews), expected, sort)
+
+        ratings = [review["rating"] for review in self.collect("highest")]
+        self.assertEqual(ratings, sorted(ratings, reverse=True))
+
+    def test_summary_and_user_filter(self):
+        response = self.client.get(
+            reverse("product-reviews", args=[self.product.pk]), {"user": self.customer.pk}
+        )
+        data = response.json()
+        self.assertEqual(data["num_reviews"], 25)
+        self.assertEqual(data["rating_histogram"], {"1": 5, "2": 5, "3": 5, "4": 5, "5": 5})
+        self.assertEqual([review["user_id"] for review in data["reviews"]], [self.customer.pk])
+
+    def test_invalid_parameters(self):
+        url = reverse("product-reviews", args=[self.product.pk])
+        self.assertEqual(self.client.get(url, {"sort": "random"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"cursor": "not-a-cursor"}).status_code, 400)
+        bogus = base64.urlsafe_b64encode(b'["yesterday", 1]').decode()
+        self.assertEqual(self.client.get(url, {"cursor": bogus}).status_code, 400)
+
+    def test_malformed_cursors_are_rejected(self):
+        urls = [
+            reverse("product-reviews", args=[self.product.pk]),
+            reverse("product-detail", args=[self.product.slug]),
+        ]
+        cursors = [
+            b'[null, 1]', b'["2020-01-01T00:00:00", null]', b'[1, 2]', b'[{"a": 1}, 1]',
+            b'[["2020-01-01T00:00:00"], 1]', b'[true, 1]', b'{"a": 1}', b'[1]',
+        ]
+        for url in urls:
+            for raw in cursors:
+                with self.subTest(url=url, cursor=raw):
+                    response = self.client.get(url, {"cursor": base64.urlsafe_b64encode(raw).decode()})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {"cursor": "Invalid cursor."})
+
+    def test_detail_embeds_first_page(self):
+        data = self.client.get(reverse("product-detail", args=[self.product.slug])).json()
+        self.assertEqual(len(data["reviews"]), 10)
+        self.assertIn("cursor=", data["reviews_next"])
+        self.assertEqual(data["rating_histogram"]["5"], 5)
+
+
+class ProductRankingTests(StoreFixtureMixin, TestCase):
+    """rank_score: Bayesian average rating plus recent sales, kept current by review and order writes."""
+
+    def setUp(self):
+        super().setUp()
+        tiered_cache.delete("top-products")
+        self.few = Product.objects.create(
+            user=self.vendor, category=self.category, name="One Review", slug="one-review",
+            price=Decimal("10"), approval_status="approved",
+        )
+        self.many = Product.objects.create(
+            user=self.vendor, category=self.category, name="Many Reviews", slug="many-reviews",
+            price=Decimal("10"), approval_status="approved",
+        )
+
+    def score(self, product):
+        product.refresh_from_db()
+        return product.rank_score
+
+    def test_bayesian_average_outranks_single_review(self):
+        self.assertEqual(self.score(self.few), 3.5)
+        Product.adjust_rating(self.few.pk, added=5)
+        for rating in [5] * 80 + [4] * 20:
+            Product.adjust_rating(self.many.pk, added=rating)
+        self.assertGreater(self.score(self.many), self.score(self.few))
+
+        top = [p["id"] for p in self.client.get(reverse("top-products")).json()]
+        self.assertEqual(top[:2], [self.many.pk, self.few.pk])
+
+    def test_sales_raise_score_and_rebuild_ages_them_out(self):
+        before = self.score(self.few)
+        Product.record_sale(self.few.pk, 3)
+        self.few.refresh_from_db()
+        self.assertEqual(self.few.units_sold_recent, 3)
+        self.assertGreater(self.few.rank_score, before)
+
+        call_command("rebuild_rankings", stdout=io.StringIO())
+        self.few.refresh_from_db()
+        self.assertEqual((self.few.units_sold_recent, self.few.rank_score), (0, before))
+
+        order = Order.objects.create(user=self.customer, total_price=Decimal("20"))
+        OrderItem.objects.create(order=order, product=self.few, name="One Review", qty=2, price=Decimal("10"))
+        call_command("rebuild_rankings", stdout=io.StringIO())
+        self.few.refresh_from_db()
+        self.assertEqual(self.few.units_sold_recent, 2)
+        self.assertGreater(self.few.rank_score, before)
+
+
+class RelatedProductTests(StoreFixtureMixin, TestCase):
+    """build_related_products turns order co-occurrence into top-K lists served by related-products."""
+
+    def place_order(self, *products, status="Pending"):
+        order = Order.objects.create(user=self.customer, total_price=Decimal("1"), status=status)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, name=product.name, price=product.price)
+            for product in products
+        )
+
+    def related(self, product, **params):
+        response = self.client.get(reverse("related-products", args=[product.pk]), params)
+        return response, [p["id"] for p in response.json().get("products", [])]
+
+    def test_bought_together_ranks_by_co_occurrence(self):
+        a, b, c, d = self.products[3:7]
+        for _ in range(3):
+            self.place_order(a, b)
+        for _ in range(2):
+            self.place_order(a, c, d)
+        self.place_order(a, d, status="Cancelled")
+        self.place_order(a, d, *self.products[7:], b)  # over --max-basket, ignored
+
+        call_command("build_related_products", "--kind", "bought_together", "--max-basket", "5", stdout=io.StringIO())
+        self.assertEqual(self.related(a)[1], [b.pk, c.pk, d.pk])
+        self.assertEqual(self.related(b)[1], [a.pk])
+        # Pairs seen in fewer than --min-count orders are dropped
+        self.assertEqual(RelatedProduct.objects.filter(product=b, kind="bought_together").count(), 1)
+
+        Product.objects.filter(pk=b.pk).update(is_active=False)
+        self.assertEqual(self.related(a)[1], [c.pk, d.pk])
+
+    def test_unknown_kind(self):
+        response, _ = self.related(self.products[0], kind="nope")
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarProductTests(StoreFixtureMixin, TestCase):
+    """build_related_products --kind similar: hashed TF-IDF neighbours per category block."""
+
+    def setUp(self):
+        super().setUp()
+        cameras = Category.objects.create(name="Cameras")
+        self.zoom, self.compact, self.wallet = (
+            Product.objects.create(
+                user=self.vendor, category=cameras, name=name, brand=brand, description=description,
+                price=Decimal("10"), approval_status="approved",
+            )
+            for name, brand, description in (
+                ("Zoom Camera", "Canon", "Mirrorless camera with zoom lens"),
+                ("Compact Camera", "Canon", "Pocket camera with a zoom lens"),
+                ("Leather Wallet", "Fossil", "Slim leather wallet"),
+            )
+        )
+
+    def build(self, *args):
+        call_command("build_related_products", "--kind", "similar", *args, stdout=io.StringIO())
+
+    def similar(self, product):
+        response = self.client.get(reverse("related-products", args=[product.pk]), {"kind": "similar"})
+        return [p["id"] for p in response.json()["products"]]
+
+    def test_small_categories_share_a_pooled_block(self):
+        self.build()
+        self.assertEqual(self.similar(self.zoom)[0], self.compact.pk)
+        phone_ids = {p.pk for p in self.products}
+        self.assertFalse(phone_ids & set(self.similar(self.zoom)))
+        # Phones is large enough for its own block
+        self.assertTrue(set(self.similar(self.products[0])) <= phone_ids)
+
+    def test_incremental_rebuilds_changed_blocks_only(self):
+        self.build()
+        pooled_built = RelatedProduct.objects.filter(product=self.zoom).values_list("built_at", flat=True)[0]
+        phone = self.products[0]
+        phone.name = "Phone Zoom"
+        phone.save()
+
+        self.build("--incremental")
+        self.assertEqual(
+            RelatedProduct.objects.filter(product=self.zoom).values_list("built_at", flat=True)[0], pooled_built
+        )
+        self.assertGreater(
+            RelatedProduct.objects.filter(product=phone).values_list("built_at", flat=True)[0], pooled_built
+        )
+
+    def test_falls_back_to_category_before_first_run(self):
+        self.assertEqual(set(self.similar(self.zoom)), {self.compact.pk, self.wallet.pk})
+
+    def test_tfidf_rows_are_sparse_and_normalised(self):
+        features = [["zoom", "zoom", "lens"], [], ["wallet"], ["zoom", "lens", "wallet"]]
+        indptr, columns, values = recommendations._tfidf(features, dims=64)
+        self.assertEqual(list(indptr), [0, 2, 2, 3, 6])
+        self.assertEqual(len(columns), len(values))
+        dense = recommendations._dense_rows((indptr, columns, values), 0, 10, dims=64)
+        self.assertEqual(dense.shape, (4, 64))
+        self.assertAlmostEqual(float(np.linalg.norm(dense[3])), 1.0, places=5)
+        self.assertFalse(dense[1].any())
+
+    def test_scores_do_not_depend_on_batch_size(self):
+        ids, features = recommendations._block_features([self.products[0].category_id], pooled=False)
+
+        def rows(batch_size):
+            return [
+                (row.product_id, row.related_id, row.rank, round(row.score, 5))
+                for row in recommendations._similar_rows(ids, features, 256, 5, 0.0, batch_size, None)
+            ]
+        self.assertEqual(rows(2), rows(256))
+
+
+class ProductListingTests(StoreFixtureMixin, TestCase):
+    """get_products ?sort= and min_price / max_price on the stored effective_price."""
+
+    def setUp(self):
+        super().setUp()
+        # Phone 14 (114.00) on sale for 50.00; a 0.00 discount means no discount
+        Product.objects.filter(pk=self.products[14].pk).update(discount_price=Decimal("50.00"))
+        Product.objects.filter(pk=self.products[13].pk).update(discount_price=Decimal("0"))
+        Product.objects.filter(pk=self.products[5].pk).update(units_sold_recent=7, rating=Decimal("4.90"))
+
+    def listing(self, **params):
+        response = self.client.get(reverse("products"), params)
+        return response, [p["id"] for p in response.json().get("products", [])]
+
+    def test_effective_price_follows_discount(self):
+        prices = dict(Product.objects.values_list("pk", "effective_price"))
+        self.assertEqual(prices[self.products[14].pk], Decimal("50.00"))
+        self.assertEqual(prices[self.products[13].pk], Decimal("113.00"))
+
+    def test_sorts(self):
+        phones = [p.pk for p in self.products]
+        by_price = [phones[14]] + phones[:14]
+        self.assertEqual(self.listing(sort="price_asc")[1][:12], by_price[:12])
+        self.assertEqual(self.listing(sort="price_desc")[1][:12], by_price[::-1][:12])
+        self.assertEqual(self.listing(sort="top_rated")[1][:2], [phones[5], phones[14]])
+        self.assertEqual(self.listing(sort="best_selling")[1][0], phones[5])
+
+    def test_price_range(self):
+        _, ids = self.listing(min_price="50", max_price="101.50", sort="price_asc")
+        self.assertEqual(ids, [self.products[i].pk for i in (14, 0, 1)])
+        self.assertEqual(self.listing(min_price="113")[1], [self.products[13].pk])
+        self.assertEqual(self.listing(min_price="113.001")[1], [])
+
+    def test_invalid_options(self):
+        for params in ({"sort": "cheapest"}, {"min_price": "abc"}, {"max_price": "NaN"}):
+            self.assertEqual(self.listing(**params)[0].status_code, 400, params)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite's")
+class PublicIndexTests(StoreFixtureMixin, TestCase):
+    """Public catalog queries read the partial PUBLIC_PRODUCTS indexes in order, without a sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for i in range(30):
+            Product.objects.create(
+                user=cls.vendor, category=cls.category, name=f"Draft {i}", price=Decimal("10"),
+                approval_status="pending" if i % 3 else "rejected", is_active=i % 2 == 0,
+            )
+        # As the migration and seed_store do
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f"USING INDEX {index}", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_listing_sorts(self):
+        public = Product.objects.filter(approval_status="approved", is_active=True)
+        for sort, index in (
+            ("newest", "product_public_newest_idx"),
+            ("price_asc", "product_public_price_idx"),
+            ("price_desc", "product_public_price_idx"),
+            ("top_rated", "product_public_rating_idx"),
+            ("best_selling", "product_public_sales_idx"),
+        ):
+            with self.subTest(sort=sort):
+                self.assertUsesIndex(public.order_by(*PRODUCT_SORTS[sort])[:12], index)
+        self.assertUsesIndex(public.order_by("-rank_score")[:10], "product_public_rank_idx")
+        self.assertUsesIndex(
+            public.filter(effective_price__gte=100, effective_price__lte=105).order_by(*PRODUCT_SORTS["price_asc"]),
+            "product_public_price_idx",
+        )
+
+    def test_category_listing(self):
+        queryset = Product.objects.filter(
+            approval_status="approved", is_active=True, category__slug=self.category.slug
+        ).order_by(*PRODUCT_SORTS["newest"])[:12]
+        self.assertUsesIndex(queryset, "product_public_category_idx")
+
+
+@override_settings(CATALOG_INDEX={"ENABLED": True, "BACKGROUND": False, "REFRESH_INTERVAL": 0})
+class CatalogIndexTests(StoreFixtureMixin, TestCase):
+    """get_products answered from the in-memory catalog index must match the SQL path."""
+
+    def setUp(self):
+        super().setUp()
+        catalog_index.reset()
+        self.addCleanup(catalog_index.reset)
+        Product.objects.filter(pk=self.products[1].pk).update(count_in_stock=0)
+        Product.objects.filter(pk=self.products[2].pk).update(count_in_stock=3, brand="Zoomix")
+        Product.objects.filter(pk=self.products[3].pk).update(approval_status="pending")
+        other = Category.objects.create(name="Cameras")
+        Product.objects.filter(pk=self.products[4].pk).update(category=other)
+        Product.objects.filter(pk=self.products[5].pk).update(discount_price=Decimal("20"), rating=Decimal("3"))
+        Product.objects.filter(pk=self.products[6].pk).update(units_sold_recent=4)
+
+    def listing(self, **params):
+        pages = []
+        page = 1
+        while True:
+            data = self.client.get(reverse("products"), {**params, "page": page}).json()
+            pages += [p["id"] for p in data["products"]]
+            if page >= data["pages"]:
+                return pages, data["total"]
+            page += 1
+
+    def assertMatchesSql(self, **params):
+        indexed = self.listing(**params)
+        with override_settings(CATALOG_INDEX={"ENABLED": False}):
+            self.assertEqual(indexed, self.listing(**params), params)
+
+    def test_filters_match_sql(self):
+        for params in (
+            {},
+            {"category": "cameras"},
+            {"category": "missing"},
+            {"stock_status": "in-stock"},
+            {"stock_status": "low-stock"},
+            {"stock_status": "out-of-stock"},
+            {"keyword": "ZOOM"},
+            {"keyword": "phones", "stock_status": "in-stock"},
+            {"sort": "price_asc", "min_price": "50", "max_price": "103.5"},
+            {"sort": "price_desc", "max_price": "112.999"},
+            {"sort": "top_rated"},
+            {"sort": "best_selling", "category": "phones"},
+        ):
+            self.assertMatchesSql(**params)
+
+        token = RefreshToken.for_user(self.admin).access_token
+        self.client.defaults["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        self.assertMatchesSql(approval_status="pending")
+        self.assertMatchesSql(approval_status="all")
+
+    def test_refresh_picks_up_writes_and_deletes(self):
+        ids, total = self.listing()
+        snapshot_built_at = catalog_index.built_at
+
+        new = Product.objects.create(
+            user=self.vendor, category=self.category, name="Phone New", price=Decimal("5"),
+            approval_status="approved",
+        )
+        hidden = Product.objects.get(pk=ids[0])
+        hidden.is_active = False
+        hidden.save()
+        snapshot = catalog_index.snapshot
+        self.assertMatchesSql()
+        # Merged into the snapshot, not rebuilt
+        self.assertIsNot(catalog_index.snapshot, snapshot)
+        self.assertEqual(catalog_index.built_at, snapshot_built_at)
+        ids_after, total_after = self.listing()
+        self.assertEqual(ids_after[0], new.pk)
+        self.assertNotIn(hidden.pk, ids_after)
+        self.assertEqual(total_after, total)
+
+        Product.objects.get(pk=ids[-1]).delete()
+        self.assertMatchesSql()
+        self.assertEqual(self.listing()[1], total - 1)
+
+    def test_refresh_picks_up_sales(self):
+        self.listing()
+        product = self.products[7]
+        token = RefreshToken.for_user(self.customer).access_token
+        response = self.client.post(reverse("orders-add"), {
+            "order_items": [{"id": product.pk, "qty": 6}],
+            "shipping_address": {"address": "1 St", "city": "Cairo", "country": "EG"},
+        }, content_type="application/json", HTTP_AUTHORIZATION=f"Bearer {token}")
+        self.assertEqual(response.status_code, 201, response.content)
+
+        self.assertIn(product.pk, self.listing(stock_status="low-stock")[0])
+        self.assertEqual(self.listing(sort="best_selling")[0][0], product.pk)
+        for params in ({"stock_status": "low-stock"}, {"sort": "best_selling"}):
+            self.assertMatchesSql(**params)
+
+        # Recounted from orders: the fixture order's products now sold one each
+        call_command("rebuild_rankings", stdout=io.StringIO())
+        self.assertMatchesSql(sort="best_selling")
+
+    def test_validators_match_sql(self):
+        response = self.client.get(reverse("products"))
+        with override_settings(CATALOG_INDEX={"ENABLED": False}):
+            sql = self.client.get(reverse("products"))
+        self.assertEqual(response["ETag"], sql["ETag"])
+        self.assertEqual(response["Last-Modified"], sql["Last-Modified"])
+
+
+class SeedStoreTests(TestCase):
+    """seed_store spreads orders over the past year."""
+
+    def test_orders_are_backdated(self):
+        call_command(
+            "seed_store", users=30, vendors=2, products=20, categories=2, tags=3,
+            orders_per_user=3, seed=1, stdout=io.StringIO(),
+        )
+        stamps = Order.objects.aggregate(first=Min("created_at"), last=Max("created_at"))
+        self.assertGreater(stamps["last"] - stamps["first"], timedelta(days=30))
+        order = Order.objects.filter(is_paid=True).first()
+        self.assertEqual(order.created_at, order.paid_at)
+
+
+class BenchmarkTests(TestCase):
+    """benchmark: percentiles, --compare regressions and cache isolation."""
+
+    def test_percentile_is_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+
+    def compare(self, baseline, current, threshold=0.2):
+        path = os.path.join(tempfile.mkdtemp(), "baseline.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "w") as fh:
+            json.dump({"commit": "abc123", "results": baseline}, fh)
+        out = io.StringIO()
+        regressions = BenchmarkCommand(stdout=out).compare({"results": current}, path, threshold)
+        return regressions, out.getvalue()
+
+    def test_compare_flags_latency_bytes_and_queries(self):
+        row = {"p95_ms": 10.0, "queries": 4, "bytes": 1000}
+        regressions, output = self.compare(
+            {"slow": row, "chatty": row, "fat": row, "ok": row, "new-only": row, "zero": {**row, "p95_ms": 0}},
+            {
+                "slow": {**row, "p95_ms": 12.5},
+                "chatty": {**row, "queries": 5},
+                "fat": {**row, "bytes": 1300},
+                "ok": {**row, "p95_ms": 11.9, "bytes": 1199, "queries": 3},
+                "zero": {**row, "p95_ms": 50.0},
+                "unseen": row,
+            },
+        )
+        self.assertEqual(regressions, ["chatty", "fat", "slow"])
+        self.assertIn("REGRESSION slow: p95 10.0ms -> 12.5ms", output)
+        self.assertIn("queries 4 -> 5", output)
+        self.assertIn("Compared with abc123: 3 regression(s)", output)
+
+    def test_compare_respects_threshold(self):
+        row = {"p95_ms": 10.0, "queries": 4, "bytes": 1000}
+        self.assertEqual(self.compare({"a": row}, {"a": {**row, "p95_ms": 12.5}}, threshold=0.3)[0], [])
+
+    def test_fail_on_regression(self):
+        path = os.path.join(tempfile.mkdtemp(), "baseline.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, "w") as fh:
+            json.dump({"results": {"tags": {"p95_ms": 0, "queries": 0, "bytes": 0}}}, fh)
+        with self.assertRaises(CommandError):
+            call_command("benchmark", iterations=1, warmup=0, only=["tags"], compare=path,
+                         fail_on_regression=True, stdout=io.StringIO())
+
+    def test_run_leaves_shared_caches_untouched(self):
+        shared = caches[settings.TIERED_CACHE["L2"]]
+        shared.clear()
+        tiered_cache.l1.clear()
+        call_command("benchmark", iterations=2, warmup=0, only=["top-products", "shop-view"],
+                     stdout=io.StringIO())
+        # No payloads, coalescing locks/results or throttle buckets
+        self.assertEqual(len(shared._cache), 0)
+        self.assertEqual(len(tiered_cache.l1), 0)
@@ -29,10 +29,12 @@ urlpatterns = [
     path("products/update/<int:pk>/", views.update_product, name="product-update"),
     path("products/delete/<int:pk>/", views.delete_product, name="product-delete"),
     path("products/delete-image/<int:pk>/", views.delete_product_image, name="delete-product-image"),
+    path("products/<int:pk>/related/", views.get_related_products, name="related-products"),
 
     # =============================================================================
     # REVIEWS
     # =============================================================================
+    path("products/<int:pk>/reviews/", views.get_product_reviews, name="product-reviews"),
     path("products/<int:pk>/reviews/create/", views.create_product_review, name="create-review"),
     path("products/<int:pk>/reviews/update/", views.update_product_review, name="update-review"),
     path("products/<int:pk>/reviews/delete/", views.delete_product_review, name="delete-review"),
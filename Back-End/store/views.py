@@ -5,36 +5,49 @@ Complete refactored version with security, performance, and best practices
 PAGINATION UPGRADE (v2):
 - Replaced Django's manual Paginator/try-except blocks with proper DRF
   PageNumberPagination subclasses throughout.
-- Four pagination classes cover every paginated endpoint:
+- Five pagination classes cover every paginated endpoint:
     ProductPagination      (12/page) → get_products
     MyProductPagination    (20/page) → get_my_products
     OrderPagination        (10/page) → get_my_orders, get_seller_orders
     AdminOrderPagination   (20/page) → get_orders
+    ReviewPagination       (10/page) → get_product_reviews, get_product
+  ReviewPagination is keyset-based and returns { "reviews": [...], "next": url }
 - Each class overrides get_paginated_response() to return the exact JSON
   shape the frontend already expects:
     { "products|orders": [...], "page": N, "pages": N, "total": N }
 - Removed: `from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger`
 """
 
+import base64
+import binascii
 import csv
 import json
 import logging
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 from datetime import timedelta
 
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import transaction
-from django.db.models import Q, Sum, F, Avg, Count, Prefetch
+from django.db.models import Q, Sum, Count, Prefetch
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.http import HttpResponse
 from django.utils import timezone
 from django.contrib.auth.models import User
 
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    parser_classes,
+    throttle_classes,
+)
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination, replace_query_param
+from rest_framework.settings import api_settings
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 
@@ -44,6 +57,7 @@ from .models import (
     Product,
     ProductImage,
     Review,
+    RelatedProduct,
     Order,
     OrderItem,
     ShippingAddress,
@@ -51,6 +65,11 @@ from .models import (
     WishlistItem,
     StoreSettings,
 )
+from project.metrics import ORDERS_CREATED, CHECKOUT_FAILURES
+from project.throttling import SearchThrottle, ExportThrottle, CheckoutThrottle
+from project.cache import tiered_cache
+from project.coalesce import coalesce
+from project.uploads import save_files
 from .serializers import (
     CategorySerializer,
     TagSerializer,
@@ -62,9 +81,41 @@ from .serializers import (
     WishlistItemSerializer,
     StoreSettingsSerializer,
 )
+from . import catalog_index
+from .images import schedule_derivatives
+from .media import media_name, release, retain, retain_uploads
+from .conditional import (
+    conditional,
+    queryset_validators,
+    touch_products,
+    product_validators,
+    review_list_validators,
+    category_validators,
+    shop_view_validators,
+    tag_validators,
+    store_settings_validators,
+)
+from .cache_policy import (
+    cache_policy,
+    product_surrogate_keys,
+    review_surrogate_keys,
+    category_surrogate_keys,
+    shop_view_surrogate_keys,
+    tag_surrogate_keys,
+    settings_surrogate_keys,
+)
 
 # Initialize logger
 logger = logging.getLogger(__name__)
+# High-volume cart / wishlist events; sampled via LOG_ACTIVITY_SAMPLE_RATE
+activity_logger = logging.getLogger("store.activity")
+
+# Seconds the shop view payload stays in the tiered cache (project/cache.py)
+SHOP_VIEW_TTL = 300
+# ... and the top products list; rankings move slowly, so it is not versioned
+TOP_PRODUCTS_TTL = 60
+# Products shown by get_related_products(kind=similar) before the first batch run
+RELATED_FALLBACK_SIZE = 8
 
 
 # =============================================================================
@@ -138,27 +189,135 @@ class AdminOrderPagination(PageNumberPagination):
         )
 
 
+class ReviewPagination(BasePagination):
+    """
+    Keyset pagination for one product's reviews. Each page continues from
+    the sort key of the previous page's last row (the opaque `cursor`), so
+    it is an index range scan on (product, -created_at) or
+    (product, rating, created_at) however deep the client pages.
+    """
+
+    page_size = 10
+    # ?sort= -> ordering; the trailing "id" makes every key unique
+    orderings = {
+        "newest": ("-created_at", "-id"),
+        "oldest": ("created_at", "id"),
+        "highest": ("-rating", "-created_at", "-id"),
+        "lowest": ("rating", "created_at", "id"),
+    }
+
+    def paginate_queryset(self, queryset, request, view=None, base_url=None):
+        sort = request.query_params.get("sort", "newest")
+        if sort not in self.orderings:
+            raise ValidationError({"sort": f"Choose one of: {', '.join(self.orderings)}."})
+        self.ordering = self.orderings[sort]
+        self.base_url = base_url or request.build_absolute_uri()
+
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            # Building the filter validates the values too (None, wrong types)
+            try:
+                queryset = queryset.filter(self._after(self._decode(cursor, queryset.model)))
+            except (binascii.Error, UnicodeDecodeError, TypeError, ValueError, DjangoValidationError):
+                raise ValidationError({"cursor": "Invalid cursor."})
+
+        rows = list(queryset[: self.page_size + 1])
+        self.next_cursor = None
+        if len(rows) > self.page_size:
+            rows = rows[: self.page_size]
+            last = rows[-1]
+            self.next_cursor = self._encode([getattr(last, f.lstrip("-")) for f in self.ordering])
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(self.base_url, "cursor", self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({"reviews": data, "next": self.get_next_link()})
+
+    def _after(self, values):
+        # (a, b, id) > (x, y, z) as: a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        condition = Q(pk__in=[])
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {f.lstrip("-"): v for f, v in zip(self.ordering[:i], values)}
+            condition |= Q(**equal, **{f"{name}__{lookup}": values[i]})
+        return condition
+
+    def _encode(self, values):
+        # isoformat() keeps microseconds (DjangoJSONEncoder would drop them)
+        raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def _decode(self, cursor, model):
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise ValueError(cursor)
+        # Only what _encode writes: strings and numbers, never null
+        if not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values):
+            raise ValueError(cursor)
+        return [
+            model._meta.get_field(field.lstrip("-")).to_python(value)
+            for field, value in zip(self.ordering, values)
+        ]
+
+
 # =============================================================================
 # PRODUCT VIEWS
 # =============================================================================
 
 
-@api_view(["GET"])
-@permission_classes([AllowAny])
-def get_products(request):
+def _with_product_relations(queryset):
+    """Select/prefetch everything ProductSerializer touches (avoids N+1s)."""
+    return queryset.select_related("category", "user").prefetch_related("images", "tags")
+
+
+# ?sort= -> ordering of the product listing; ties broken by id so pages
+# never overlap. Each has a matching partial index on Product (public rows)
+PRODUCT_SORTS = {
+    "newest": ("-created_at",),
+    "price_asc": ("effective_price", "id"),
+    "price_desc": ("-effective_price", "-id"),
+    "top_rated": ("-rating", "-id"),
+    "best_selling": ("-units_sold_recent", "-id"),
+}
+
+
+def _listing_options(request):
+    """(sort, min_price, max_price) of a product listing request; 400 when invalid."""
+    sort = request.query_params.get("sort") or "newest"
+    if sort not in PRODUCT_SORTS:
+        raise ValidationError({"sort": f"Choose one of: {', '.join(PRODUCT_SORTS)}."})
+
+    prices = []
+    for name in ("min_price", "max_price"):
+        value = request.query_params.get(name)
+        try:
+            prices.append(Decimal(value) if value else None)
+        except InvalidOperation:
+            raise ValidationError({name: "Must be a number."})
+        if prices[-1] is not None and not prices[-1].is_finite():
+            raise ValidationError({name: "Must be a number."})
+    return sort, *prices
+
+
+def _filter_products(request):
     """
-    Get all products with filtering, search, and DRF pagination.
-    Query params: keyword, category, stock_status, approval_status, page
+    Build the filtered product queryset shared by get_products and its
+    conditional-GET validators. Prices filter on the effective (final) price.
     """
+    _, min_price, max_price = _listing_options(request)
     query = request.query_params.get("keyword")
     category_slug = request.query_params.get("category")
     stock_status = request.query_params.get("stock_status")
     approval_status = request.query_params.get("approval_status")
 
     # Optimise query with select_related and prefetch_related
-    products = Product.objects.select_related("category", "user").prefetch_related(
-        "tags"
-    )
+    products = _with_product_relations(Product.objects.all())
 
     # Filter by approval status
     if not request.user.is_staff:
@@ -189,28 +348,73 @@ def get_products(request):
         elif stock_status == "out-of-stock":
             products = products.filter(count_in_stock=0)
 
-    products = products.order_by("-created_at")
+    # Price range
+    if min_price is not None:
+        products = products.filter(effective_price__gte=min_price)
+    if max_price is not None:
+        products = products.filter(effective_price__lte=max_price)
+
+    return products
+
+
+def _product_list_validators(request):
+    indexed = catalog_index.search(request, *_listing_options(request))
+    if indexed:
+        _, etag, last_modified = indexed
+        return etag, last_modified
+    # The page depends on every query param and on staff visibility
+    return queryset_validators(
+        _filter_products(request),
+        request.user.is_staff,
+        request.query_params.urlencode(),
+    )
 
-    # ── DRF Pagination ──────────────────────────────────────────────────────
+
+@cache_policy("catalog", surrogate_keys=product_surrogate_keys)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@throttle_classes(api_settings.DEFAULT_THROTTLE_CLASSES + [SearchThrottle])
+@conditional(_product_list_validators)
+def get_products(request):
+    """
+    Get all products with filtering, search, and DRF pagination.
+    Query params: keyword, category, stock_status, approval_status,
+    min_price, max_price, sort (see PRODUCT_SORTS), page
+    With CATALOG_INDEX enabled, the ids come from the in-memory index and
+    only the requested page is read from the database.
+    """
+    sort, *prices = _listing_options(request)
     paginator = ProductPagination()
+    indexed = catalog_index.search(request, sort, *prices)
+    if indexed:
+        ids, _, _ = indexed
+        page_ids = [int(pk) for pk in paginator.paginate_queryset(ids, request)]
+        by_id = _with_product_relations(Product.objects.filter(pk__in=page_ids)).in_bulk()
+        # A product deleted since the last refresh is skipped
+        result_page = [by_id[pk] for pk in page_ids if pk in by_id]
+        serializer = ProductSerializer(result_page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    products = _filter_products(request).order_by(*PRODUCT_SORTS[sort])
+
+    # ── DRF Pagination ──────────────────────────────────────────────────────
     result_page = paginator.paginate_queryset(products, request)
     serializer = ProductSerializer(result_page, many=True)
     return paginator.get_paginated_response(serializer.data)
 
 
+@cache_policy("catalog", surrogate_keys=product_surrogate_keys)
 @api_view(["GET"])
 @permission_classes([AllowAny])
-def get_product(request, slug): 
-    """Get single product by ID or Slug with all related data"""
-    queryset = (
-        Product.objects.select_related("category", "user")
-        .prefetch_related(
-            Prefetch("reviews", queryset=Review.objects.select_related("user")),
-            "images",
-            "tags",
-        )
-    )
-    
+@conditional(product_validators)
+def get_product(request, slug):
+    """
+    Get single product by ID or Slug with all related data.
+    Carries the newest page of reviews; the rest come from get_product_reviews.
+    """
+    queryset = _with_product_relations(Product.objects.all())
+
+
     # التعديل هنا: فحص هل المتغير رقم أم نص
     if slug.isdigit():
         # إذا كان رقماً، ابحث باستخدام الـ ID
@@ -230,7 +434,57 @@ def get_product(request, slug):
             )
 
     serializer = ProductSerializer(product, many=False)
-    return Response(serializer.data)
+    data = serializer.data
+
+    paginator = ReviewPagination()
+    reviews = paginator.paginate_queryset(
+        product.reviews.select_related("user"),
+        request,
+        base_url=request.build_absolute_uri(reverse("product-reviews", args=[product.pk])),
+    )
+    data["reviews"] = ReviewSerializer(reviews, many=True).data
+    data["reviews_next"] = paginator.get_next_link()
+    return Response(data)
+
+
+@cache_policy("catalog", surrogate_keys=review_surrogate_keys)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+@conditional(review_list_validators)
+def get_product_reviews(request, pk):
+    """
+    Reviews of one product, a page at a time, with the rating summary.
+    Query params: sort (newest | oldest | highest | lowest), cursor,
+    user (only that user's review, e.g. to find your own)
+    """
+    product = get_object_or_404(Product, pk=pk)
+
+    if product.approval_status != "approved" and not product.is_active:
+        if not request.user.is_staff and (
+            not request.user.is_authenticated or product.user_id != request.user.id
+        ):
+            return Response(
+                {"detail": "Product not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+    queryset = product.reviews.select_related("user")
+    user_id = request.query_params.get("user")
+    if user_id:
+        if not user_id.isdigit():
+            raise ValidationError({"user": "Must be a user id."})
+        queryset = queryset.filter(user_id=user_id)
+
+    paginator = ReviewPagination()
+    reviews = paginator.paginate_queryset(queryset, request)
+    response = paginator.get_paginated_response(ReviewSerializer(reviews, many=True).data)
+    response.data.update({
+        "id": product.pk,
+        "rating": str(product.rating),
+        "num_reviews": product.num_reviews,
+        "rating_histogram": product.rating_histogram,
+    })
+    return response
 
 
 @api_view(["POST"])
@@ -311,9 +565,18 @@ def create_product(request):
         # Add product gallery images
         images = request.FILES.getlist("images")
         if images:
-            ProductImage.objects.bulk_create(
-                [ProductImage(product=product, image=img) for img in images]
-            )
+            gallery = [ProductImage(product=product, image=img) for img in images]
+            # bulk_create sends no signals: count the blobs before they are
+            # written (store/media.py) and queue the resized copies here
+            blobs = retain_uploads([gallery_image.image for gallery_image in gallery])
+            try:
+                save_files(gallery, "image")
+                ProductImage.objects.bulk_create(gallery)
+            except Exception:
+                release(blobs)
+                raise
+            for gallery_image in gallery:
+                schedule_derivatives(gallery_image)
 
         # Add tags
         if "tags" in data:
@@ -331,14 +594,14 @@ def create_product(request):
                         product.tags.add(tag)
 
             except json.JSONDecodeError as e:
-                logger.warning(f"Error parsing tags for product {product.id}: {e}")
+                logger.warning("Error parsing tags for product %s: %s", product.id, e)
 
         serializer = ProductSerializer(product, many=False)
-        logger.info(f"Product created: {product.id} by user {user.id}")
+        logger.info("Product created: %s by user %s", product.id, user.id)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     except Exception as e:
-        logger.error(f"Error creating product: {str(e)}")
+        logger.error("Error creating product: %s", e)
         return Response(
             {"detail": "Failed to create product. Please check your input."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -353,18 +616,12 @@ def delete_product_review(request, pk):
     product = get_object_or_404(Product, pk=pk)
 
     try:
-        review = product.reviews.get(user=user)
-        review.delete()
+        with transaction.atomic():
+            review = product.reviews.select_for_update().get(user=user)
+            review.delete()
+            Product.adjust_rating(product.pk, removed=review.rating)
 
-        stats = product.reviews.aggregate(
-            avg_rating=Avg("rating"),
-            count=Count("id"),
-        )
-        product.rating = stats["avg_rating"] or Decimal("0.00")
-        product.num_reviews = stats["count"] or 0
-        product.save()
-
-        logger.info(f"Review deleted for product {product.id} by user {user.id}")
+        logger.info("Review deleted for product %s by user %s", product.id, user.id)
         return Response({"detail": "Review deleted successfully."})
 
     except Review.DoesNotExist:
@@ -392,6 +649,10 @@ def update_product(request, pk):
             status=status.HTTP_403_FORBIDDEN,
         )
 
+    # Only the edited columns are saved: orders and reviews keep the stock,
+    # rating and rank_score counters current with F() updates meanwhile
+    changed = ["name", "brand", "description", "updated_at"]
+
     # Update basic fields
     product.name = data.get("name", product.name)
     product.brand = data.get("brand", product.brand)
@@ -407,6 +668,7 @@ def update_product(request, pk):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
             product.price = price
+            changed.append("price")
 
         if "discount_price" in data:
             discount_price = data.get("discount_price")
@@ -422,6 +684,7 @@ def update_product(request, pk):
                 product.discount_price = discount_price
             else:
                 product.discount_price = None
+            changed.append("discount_price")
 
         if "count_in_stock" in data:
             count_in_stock = int(data.get("count_in_stock"))
@@ -431,6 +694,7 @@ def update_product(request, pk):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
             product.count_in_stock = count_in_stock
+            changed.append("count_in_stock")
 
     except (ValueError, TypeError) as e:
         return Response(
@@ -441,21 +705,31 @@ def update_product(request, pk):
     # Only admin can change approval status
     if request.user.is_staff and "approval_status" in data:
         product.approval_status = data.get("approval_status")
+        changed.append("approval_status")
 
     # Update category
     if data.get("category"):
         product.category_id = data.get("category")
+        changed.append("category")
 
     # Update main image
     if request.FILES.get("image"):
         product.image = request.FILES.get("image")
+        changed.append("image")
 
     # Add new gallery images
     images = request.FILES.getlist("images")
     if images:
-        ProductImage.objects.bulk_create(
-            [ProductImage(product=product, image=img) for img in images]
-        )
+        gallery = [ProductImage(product=product, image=img) for img in images]
+        blobs = retain_uploads([gallery_image.image for gallery_image in gallery])
+        try:
+            save_files(gallery, "image")
+            ProductImage.objects.bulk_create(gallery)
+        except Exception:
+            release(blobs)
+            raise
+        for gallery_image in gallery:
+            schedule_derivatives(gallery_image)
 
     # Update tags
     if "tags" in data:
@@ -475,15 +749,15 @@ def update_product(request, pk):
                     product.tags.add(tag)
 
         except json.JSONDecodeError as e:
-            logger.warning(f"Error parsing tags for product {product.id}: {e}")
+            logger.warning("Error parsing tags for product %s: %s", product.id, e)
 
     try:
-        product.save()
-        logger.info(f"Product updated: {product.id} by user {request.user.id}")
+        product.save(update_fields=changed)
+        logger.info("Product updated: %s by user %s", product.id, request.user.id)
         serializer = ProductSerializer(product, many=False)
         return Response(serializer.data)
     except Exception as e:
-        logger.error(f"Error updating product {product.id}: {str(e)}")
+        logger.error("Error updating product %s: %s", product.id, e)
         return Response(
             {"detail": "Failed to update product."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -504,7 +778,7 @@ def delete_product(request, pk):
 
     product_id = product.id
     product.delete()
-    logger.info(f"Product deleted: {product_id} by user {request.user.id}")
+    logger.info("Product deleted: %s by user %s", product_id, request.user.id)
     return Response({"detail": "Product deleted successfully."})
 
 
@@ -521,7 +795,8 @@ def delete_product_image(request, pk):
         )
 
     image.delete()
-    logger.info(f"Product image deleted: {pk} by user {request.user.id}")
+    touch_products(Product.objects.filter(pk=image.product_id))
+    logger.info("Product image deleted: %s by user %s", pk, request.user.id)
     return Response({"detail": "Image deleted successfully."})
 
 
@@ -530,6 +805,7 @@ def delete_product_image(request, pk):
 # =============================================================================
 
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_my_products(request):
@@ -539,11 +815,8 @@ def get_my_products(request):
     """
     user = request.user
 
-    products = (
-        Product.objects.filter(user=user)
-        .select_related("category")
-        .prefetch_related("tags")
-        .order_by("-created_at")
+    products = _with_product_relations(Product.objects.filter(user=user)).order_by(
+        "-created_at"
     )
 
     # ── DRF Pagination ──────────────────────────────────────────────────────
@@ -558,17 +831,26 @@ def get_my_products(request):
 # =============================================================================
 
 
+@cache_policy("catalog", surrogate_keys=category_surrogate_keys)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@conditional(category_validators)
 def get_categories(request):
     """Get all categories"""
-    categories = Category.objects.all().order_by("name")
+    categories = Category.objects.annotate(
+        approved_product_count=Count(
+            "products",
+            filter=Q(products__approval_status="approved", products__is_active=True),
+        )
+    ).order_by("name")
     serializer = CategorySerializer(categories, many=True)
     return Response(serializer.data)
 
 
+@cache_policy("catalog", surrogate_keys=tag_surrogate_keys)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@conditional(tag_validators)
 def get_tags(request):
     """Get all tags"""
     tags = Tag.objects.all().order_by("name")
@@ -601,13 +883,13 @@ def create_category(request):
             name=name,
             description=request.data.get("description", ""),
         )
-        logger.info(f"Category created: {category.id}")
+        logger.info("Category created: %s", category.id)
         return Response(
             CategorySerializer(category).data, status=status.HTTP_201_CREATED
         )
 
     except Exception as e:
-        logger.error(f"Error creating category: {str(e)}")
+        logger.error("Error creating category: %s", e)
         return Response(
             {"detail": "Failed to create category."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -630,8 +912,9 @@ def update_category(request, pk):
     category.name = name
     category.description = request.data.get("description", category.description)
     category.save()
+    touch_products(category.products.all())
 
-    logger.info(f"Category updated: {category.id}")
+    logger.info("Category updated: %s", category.id)
     return Response(CategorySerializer(category).data)
 
 
@@ -649,7 +932,7 @@ def delete_category(request, pk):
 
     category_id = category.id
     category.delete()
-    logger.info(f"Category deleted: {category_id}")
+    logger.info("Category deleted: %s", category_id)
     return Response({"detail": "Category deleted successfully."})
 
 
@@ -672,11 +955,11 @@ def create_tag(request):
             )
 
         tag = Tag.objects.create(name=name)
-        logger.info(f"Tag created: {tag.id}")
+        logger.info("Tag created: %s", tag.id)
         return Response(TagSerializer(tag).data, status=status.HTTP_201_CREATED)
 
     except Exception as e:
-        logger.error(f"Error creating tag: {str(e)}")
+        logger.error("Error creating tag: %s", e)
         return Response(
             {"detail": "Failed to create tag."},
             status=status.HTTP_400_BAD_REQUEST,
@@ -698,8 +981,9 @@ def update_tag(request, pk):
 
     tag.name = name
     tag.save()
+    touch_products(tag.products.all())
 
-    logger.info(f"Tag updated: {tag.id}")
+    logger.info("Tag updated: %s", tag.id)
     return Response(TagSerializer(tag).data)
 
 
@@ -709,8 +993,9 @@ def delete_tag(request, pk):
     """Delete tag (admin only)"""
     tag = get_object_or_404(Tag, pk=pk)
     tag_id = tag.id
+    touch_products(tag.products.all())
     tag.delete()
-    logger.info(f"Tag deleted: {tag_id}")
+    logger.info("Tag deleted: %s", tag_id)
     return Response({"detail": "Tag deleted successfully."})
 
 
@@ -721,6 +1006,7 @@ def delete_tag(request, pk):
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@throttle_classes(api_settings.DEFAULT_THROTTLE_CLASSES + [CheckoutThrottle])
 @transaction.atomic
 def add_order_items(request):
     """
@@ -759,7 +1045,9 @@ def add_order_items(request):
         existing_order = Order.objects.filter(idempotency_key=idempotency_key).first()
         if existing_order:
             logger.warning(
-                f"Duplicate order attempt with key: {idempotency_key} by user {user.id}"
+                "Duplicate order attempt with key: %s by user %s",
+                idempotency_key,
+                user.id,
             )
             return Response(
                 {"id": existing_order.id, "detail": "Order already exists."},
@@ -811,7 +1099,7 @@ def add_order_items(request):
         for item_data in order_items:
             product = products.get(item_data["id"])
             if not product:
-                logger.warning(f"Product {item_data['id']} not found in order creation")
+                logger.warning("Product %s not found in order creation", item_data["id"])
                 continue
 
             qty = int(item_data.get("qty", 1))
@@ -834,35 +1122,37 @@ def add_order_items(request):
                 )
             )
 
-            # Reduce stock using F() to prevent race conditions
-            Product.objects.filter(pk=product.pk).update(
-                count_in_stock=F("count_in_stock") - qty
-            )
+            # One UPDATE: take the stock and count the sale towards rank_score
+            Product.record_sale(product.pk, qty)
 
         OrderItem.objects.bulk_create(items_to_create)
+        # The items link the product image: keep it for the order history
+        retain(media_name(item.image) for item in items_to_create)
 
         order.total_price = total_items_price + shipping_price + tax_price
         order.save()
 
-        logger.info(
-            f"Order created: {order.id} by user {user.id}, total: {order.total_price}"
-        )
+        ORDERS_CREATED.inc()
+        logger.info("Order created: %s by user %s, total: %s", order.id, user.id, order.total_price)
         return Response(
             {"id": order.id, "total": str(order.total_price)},
             status=status.HTTP_201_CREATED,
         )
 
     except ValueError as e:
-        logger.error(f"Order creation failed for user {user.id}: {str(e)}")
+        CHECKOUT_FAILURES.labels(reason="stock").inc()
+        logger.error("Order creation failed for user %s: %s", user.id, e)
         return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
-        logger.error(f"Unexpected error in order creation: {str(e)}")
+        CHECKOUT_FAILURES.labels(reason="error").inc()
+        logger.error("Unexpected error in order creation: %s", e)
         return Response(
             {"detail": "Failed to create order. Please try again."},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_order_by_id(request, pk):
@@ -898,6 +1188,7 @@ def get_order_by_id(request, pk):
         )
 
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_my_orders(request):
@@ -940,10 +1231,11 @@ def update_order_to_paid(request, pk):
     order.payment_id = request.data.get("payment_id", "")
     order.save()
 
-    logger.info(f"Order {order.id} marked as paid")
+    logger.info("Order %s marked as paid", order.id)
     return Response({"detail": "Order marked as paid."})
 
 
+@cache_policy("admin")
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def get_orders(request):
@@ -978,7 +1270,7 @@ def update_order_to_delivered(request, pk):
     order.tracking_number = request.data.get("tracking_number", "")
     order.save()
 
-    logger.info(f"Order {order.id} marked as delivered")
+    logger.info("Order %s marked as delivered", order.id)
     return Response({"detail": "Order marked as delivered."})
 
 
@@ -990,7 +1282,7 @@ def delete_order(request, pk):
     order_id = order.id
     order.delete()
 
-    logger.info(f"Order {order_id} deleted by admin")
+    logger.info("Order %s deleted by admin", order_id)
     return Response({"detail": "Order deleted successfully."})
 
 
@@ -1027,19 +1319,16 @@ def create_product_review(request, pk):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
-    Review.objects.create(
-        user=user,
-        product=product,
-        rating=rating,
-        comment=data.get("comment", ""),
-    )
-
-    stats = product.reviews.aggregate(avg_rating=Avg("rating"), count=Count("id"))
-    product.rating = stats["avg_rating"] or Decimal("0.00")
-    product.num_reviews = stats["count"] or 0
-    product.save()
+    with transaction.atomic():
+        Review.objects.create(
+            user=user,
+            product=product,
+            rating=rating,
+            comment=data.get("comment", ""),
+        )
+        Product.adjust_rating(product.pk, added=rating)
 
-    logger.info(f"Review created for product {product.id} by user {user.id}")
+    logger.info("Review created for product %s by user %s", product.id, user.id)
     return Response(
         {"detail": "Review added successfully."}, status=status.HTTP_201_CREATED
     )
@@ -1080,14 +1369,14 @@ def update_product_review(request, pk):
     if "comment" in data:
         review.comment = data["comment"]
 
-    review.save()
-
-    stats = product.reviews.aggregate(avg_rating=Avg("rating"), count=Count("id"))
-    product.rating = stats["avg_rating"] or Decimal("0.00")
-    product.num_reviews = stats["count"] or 0
-    product.save()
+    with transaction.atomic():
+        # Re-read under the row lock so concurrent edits apply their deltas in turn
+        old_rating = Review.objects.select_for_update().values_list("rating", flat=True).get(pk=review.pk)
+        review.save()
+        # Also for comment-only edits: bumps updated_at for the cached first page
+        Product.adjust_rating(product.pk, added=review.rating, removed=old_rating)
 
-    logger.info(f"Review updated for product {product.id} by user {user.id}")
+    logger.info("Review updated for product %s by user %s", product.id, user.id)
     return Response({"detail": "Review updated successfully."})
 
 
@@ -1096,6 +1385,7 @@ def update_product_review(request, pk):
 # =============================================================================
 
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_cart(request):
@@ -1164,8 +1454,11 @@ def add_to_cart(request):
     cart_item.qty = new_qty
     cart_item.save()
 
-    logger.info(
-        f"Product {product.id} added to cart for user {user.id}, qty: {new_qty}"
+    activity_logger.info(
+        "Product %s added to cart for user %s, qty: %s",
+        product.id,
+        user.id,
+        new_qty,
     )
     return Response({"detail": "Item added to cart.", "qty": new_qty})
 
@@ -1209,8 +1502,11 @@ def update_cart_item(request):
     cart_item.qty = qty
     cart_item.save()
 
-    logger.info(
-        f"Cart item updated for user {user.id}, product {product.id}, qty: {qty}"
+    activity_logger.info(
+        "Cart item updated for user %s, product %s, qty: %s",
+        user.id,
+        product.id,
+        qty,
     )
     return Response({"detail": "Cart item updated.", "qty": qty})
 
@@ -1222,7 +1518,7 @@ def remove_from_cart(request, pk):
     cart_item = get_object_or_404(CartItem, user=request.user, product__id=pk)
     cart_item.delete()
 
-    logger.info(f"Product {pk} removed from cart for user {request.user.id}")
+    activity_logger.info("Product %s removed from cart for user %s", pk, request.user.id)
     return Response({"detail": "Item removed from cart."})
 
 
@@ -1232,8 +1528,10 @@ def clear_cart(request):
     """Clear all items from cart"""
     deleted_count, _ = CartItem.objects.filter(user=request.user).delete()
 
-    logger.info(
-        f"Cart cleared for user {request.user.id}, {deleted_count} items removed"
+    activity_logger.info(
+        "Cart cleared for user %s, %s items removed",
+        request.user.id,
+        deleted_count,
     )
     return Response({"detail": f"Cart cleared. {deleted_count} items removed."})
 
@@ -1243,6 +1541,7 @@ def clear_cart(request):
 # =============================================================================
 
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_wishlist(request):
@@ -1281,11 +1580,11 @@ def toggle_wishlist(request):
 
     if item.exists():
         item.delete()
-        logger.info(f"Product {product.id} removed from wishlist for user {user.id}")
+        activity_logger.info("Product %s removed from wishlist for user %s", product.id, user.id)
         return Response({"status": "removed", "detail": "Removed from wishlist."})
     else:
         WishlistItem.objects.create(user=user, product=product)
-        logger.info(f"Product {product.id} added to wishlist for user {user.id}")
+        activity_logger.info("Product %s added to wishlist for user %s", product.id, user.id)
         return Response({"status": "added", "detail": "Added to wishlist."})
 
 
@@ -1294,40 +1593,93 @@ def toggle_wishlist(request):
 # =============================================================================
 
 
+@cache_policy("catalog", surrogate_keys=product_surrogate_keys)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@coalesce(tiered_key="top-products")
 def get_top_products(request):
-    """Get top-rated products (approved only)"""
-    products = (
+    """
+    Get the best-ranked products (approved only), by the stored
+    Bayesian rating + sales score (store/ranking.py).
+    """
+    data = tiered_cache.get_or_set("top-products", _build_top_products, ttl=TOP_PRODUCTS_TTL)
+    return Response(data)
+
+
+def _build_top_products():
+    products = _with_product_relations(
         Product.objects.filter(
-            rating__gte=4,
             approval_status="approved",
             is_active=True,
         )
-        .select_related("category")
-        .order_by("-rating")[:5]
-    )
-    serializer = ProductSerializer(products, many=True)
-    return Response(serializer.data)
+    ).order_by("-rank_score")[:5]
+    return ProductSerializer(products, many=True).data
+
+
+@cache_policy("catalog", surrogate_keys=product_surrogate_keys)
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def get_related_products(request, pk):
+    """
+    Precomputed neighbours of a product (RelatedProduct), best first.
+    Query params: kind (bought_together | similar, default bought_together)
+    A product without "similar" lists yet (added since the last run) gets
+    the best-ranked products of its category instead.
+    """
+    kind = request.query_params.get("kind", "bought_together")
+    if kind not in dict(RelatedProduct.KIND_CHOICES):
+        return Response(
+            {"detail": f"Unknown kind '{kind}'."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    # One lookup on the (product, kind, rank) index, joined to the public neighbours
+    entries = RelatedProduct.objects.filter(
+        product_id=pk,
+        kind=kind,
+        related__approval_status="approved",
+        related__is_active=True,
+    ).select_related("related").order_by("rank")
+    products = [entry.related for entry in entries]
+    if not products and kind == "similar":
+        category_id = Product.objects.filter(pk=pk).values_list("category_id", flat=True).first()
+        if category_id:
+            products = Product.objects.filter(
+                category_id=category_id,
+                approval_status="approved",
+                is_active=True,
+            ).exclude(pk=pk).order_by("-rank_score")[:RELATED_FALLBACK_SIZE]
+    serializer = SimpleProductSerializer(products, many=True, context={"request": request})
+    return Response({"id": pk, "kind": kind, "products": serializer.data})
 
 
+@cache_policy("catalog", surrogate_keys=shop_view_surrogate_keys)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@coalesce()
 def get_products_by_category(request):
     """
     Get products grouped by category.
     Optimised with prefetch_related to avoid N+1 queries.
+    The payload is cached per catalog version (shop_view_validators), and
+    rebuilt by one request at a time when it expires.
     """
+    etag, _ = shop_view_validators(request)
+    data = tiered_cache.get_or_set(
+        f"shop-view:{etag}", _build_products_by_category, ttl=SHOP_VIEW_TTL
+    )
+    return Response(data)
+
+
+def _build_products_by_category():
     categories = Category.objects.prefetch_related(
         Prefetch(
             "products",
-            queryset=Product.objects.filter(
-                approval_status="approved",
-                is_active=True,
-            )
-            .select_related("user")
-            .prefetch_related("tags")
-            .order_by("-created_at"),
+            queryset=_with_product_relations(
+                Product.objects.filter(
+                    approval_status="approved",
+                    is_active=True,
+                )
+            ).order_by("-created_at"),
         )
     ).all()
 
@@ -1344,8 +1696,7 @@ def get_products_by_category(request):
                     "products": serializer.data,
                 }
             )
-
-    return Response(data)
+    return data
 
 
 # =============================================================================
@@ -1353,6 +1704,7 @@ def get_products_by_category(request):
 # =============================================================================
 
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_seller_orders(request):
@@ -1386,6 +1738,7 @@ def get_seller_orders(request):
 # =============================================================================
 
 
+@cache_policy("admin")
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def get_dashboard_stats(request):
@@ -1419,8 +1772,10 @@ def get_dashboard_stats(request):
     )
 
 
+@cache_policy("admin")
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
+@throttle_classes(api_settings.DEFAULT_THROTTLE_CLASSES + [ExportThrottle])
 def export_orders_csv(request): # تركنا الاسم كما هو لكي لا نضطر لتعديل urls.py
     """Export all orders to a styled Excel file (admin only)"""
     
@@ -1472,7 +1827,7 @@ def export_orders_csv(request): # تركنا الاسم كما هو لكي لا
     # حفظ الملف في الـ Response
     wb.save(response)
     
-    logger.info(f"Orders Excel exported by admin user {request.user.id}")
+    logger.info("Orders Excel exported by admin user %s", request.user.id)
     return response
 
 
@@ -1481,8 +1836,10 @@ def export_orders_csv(request): # تركنا الاسم كما هو لكي لا
 # =============================================================================
 
 
+@cache_policy("catalog", surrogate_keys=settings_surrogate_keys)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@conditional(store_settings_validators)
 def get_store_settings(request):
     """
     Return current store-wide settings (tax_rate, shipping_cost,
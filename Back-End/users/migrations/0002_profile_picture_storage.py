@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-19 15:23
+
+import project.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="profile",
+            name="profile_picture",
+            field=models.ImageField(blank=True, null=True, storage=project.storage.media_storage, upload_to="profiles/"),
+        ),
+    ]
@@ -7,6 +7,8 @@ from django.db import models
 from django.contrib.auth.models import User
 import logging
 
+from project.storage import media_storage
+
 logger = logging.getLogger(__name__)
 
 
@@ -52,6 +54,7 @@ class Profile(models.Model):
     # Profile Picture
     profile_picture = models.ImageField(
         upload_to="profiles/",
+        storage=media_storage,
         null=True,
         blank=True
     )
@@ -44,7 +44,7 @@ class ProfileSerializer(serializers.ModelSerializer):
                     return request.build_absolute_uri(obj.profile_picture.url)
                 return obj.profile_picture.url
         except Exception as e:
-            logger.warning(f"Error getting profile picture URL: {str(e)}")
+            logger.warning("Error getting profile picture URL: %s", e)
         return None
 
 # =============================================================================
@@ -184,9 +184,9 @@ class RegisterSerializer(serializers.ModelSerializer):
                     phone=phone if phone else "",
                     user_type=user_type
                 )
-                logger.info(f"User and Profile created: {user.id} ({user_type})")
+                logger.info("User and Profile created: %s (%s)", user.id, user_type)
             except Exception as e:
-                logger.error(f"Error creating profile for user {user.id}: {str(e)}")
+                logger.error("Error creating profile for user %s: %s", user.id, e)
                 raise serializers.ValidationError("Failed to complete profile creation.")
 
         return user
@@ -262,7 +262,7 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         # Fallback profile creation if it doesn't exist
         if not hasattr(self.user, "profile"):
             Profile.objects.create(user=self.user)
-            logger.info(f"Profile created for existing user {self.user.id}")
+            logger.info("Profile created for existing user %s", self.user.id)
 
         serializer = UserSerializerWithToken(
             self.user,
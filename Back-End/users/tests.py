@@ -1,3 +1,28 @@
+"""
+User Tests for Smart Shop E-commerce Platform
+"""
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from project.query_budget import QueryBudgetTestMixin
+from .models import Profile
+
+
+class UserQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """Every read endpoint in users/urls.py stays within its query budget."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "pass", is_staff=True)
+        for i in range(12):
+            user = User.objects.create_user(f"user{i}", f"user{i}@example.com", "pass")
+            Profile.objects.create(user=user)
+        cls.customer = user
+
+    def test_profile(self):
+        self.assertQueryBudget("users-profile", user=self.customer)
+
+    def test_admin_user_management(self):
+        self.assertQueryBudget("users", user=self.admin)
+        self.assertQueryBudget("user-detail", args=[self.customer.id], user=self.admin)
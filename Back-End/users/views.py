@@ -24,6 +24,8 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 from store.models import OrderItem
+from store.cache_policy import cache_policy
+from project.metrics import EMAILS_QUEUED, EMAIL_FAILURES
 from .serializers import (
     UserSerializer,
     UserSerializerWithToken,
@@ -89,6 +91,7 @@ Best regards,
 Smart Shop Team
 """
 
+            EMAILS_QUEUED.labels(kind="activation").inc()
             send_mail(
                 subject,
                 message,
@@ -96,7 +99,7 @@ Smart Shop Team
                 [user.email],
                 fail_silently=False,
             )
-            logger.info(f"Activation email sent to {user.email}")
+            logger.info("Activation email sent to %s", user.email)
 
             return Response(
                 {
@@ -106,7 +109,8 @@ Smart Shop Team
             )
 
         except Exception as e:
-            logger.error(f"Registration/Email error: {str(e)}")
+            EMAIL_FAILURES.labels(kind="activation").inc()
+            logger.error("Registration/Email error: %s", e)
             return Response(
                 {"detail": "Account created but failed to send activation email. Please contact support."},
                 status=status.HTTP_201_CREATED
@@ -132,7 +136,7 @@ def activate_user(request, uid, token):
 
             user.is_active = True
             user.save()
-            logger.info(f"User activated: {user.id}")
+            logger.info("User activated: %s", user.id)
             return Response(
                 {"detail": "Account activated successfully! You can now log in."},
                 status=status.HTTP_200_OK
@@ -154,6 +158,7 @@ def activate_user(request, uid, token):
 # PROFILE MANAGEMENT
 # =============================================================================
 
+@cache_policy("private")
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
@@ -192,10 +197,10 @@ def update_user_profile(request):
                 profile.profile_picture = profile_pic
 
             profile.save()
-            logger.info(f"Profile updated for user {user.id}")
+            logger.info("Profile updated for user %s", user.id)
 
     except Exception as e:
-        logger.error(f"Error updating user/profile {user.id}: {str(e)}")
+        logger.error("Error updating user/profile %s: %s", user.id, e)
         return Response(
             {"detail": "Failed to update profile."},
             status=status.HTTP_400_BAD_REQUEST
@@ -220,7 +225,7 @@ def change_password(request):
         # Set new password
         user.set_password(serializer.validated_data.get("new_password"))
         user.save()
-        logger.info(f"Password changed successfully for user {user.id}")
+        logger.info("Password changed successfully for user %s", user.id)
         
         return Response({"detail": "Password updated successfully."}, status=status.HTTP_200_OK)
 
@@ -274,6 +279,7 @@ Smart Shop Team
 """
 
         try:
+            EMAILS_QUEUED.labels(kind="password_reset").inc()
             send_mail(
                 subject,
                 message,
@@ -281,9 +287,10 @@ Smart Shop Team
                 [email],
                 fail_silently=False,
             )
-            logger.info(f"Password reset email sent to {email}")
+            logger.info("Password reset email sent to %s", email)
         except Exception as e:
-            logger.error(f"Failed to send reset email to {email}: {str(e)}")
+            EMAIL_FAILURES.labels(kind="password_reset").inc()
+            logger.error("Failed to send reset email to %s: %s", email, e)
 
     # Always return success message (security best practice)
     return Response(
@@ -328,7 +335,7 @@ def reset_password(request, uid, token):
         if default_token_generator.check_token(user, token):
             user.set_password(new_password)
             user.save()
-            logger.info(f"Password reset successful for user {user.id}")
+            logger.info("Password reset successful for user %s", user.id)
             return Response(
                 {"detail": "Password reset successful! You can now log in."},
                 status=status.HTTP_200_OK
@@ -362,6 +369,7 @@ class CustomPagination(PageNumberPagination):
             'count': self.page.paginator.count
         })
 
+@cache_policy("admin")
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def get_users(request):
@@ -391,7 +399,7 @@ def delete_user(request, pk):
         
         user_email = user.email
         user.delete()
-        logger.info(f"User deleted: {pk} ({user_email}) by admin {request.user.id}")
+        logger.info("User deleted: %s (%s) by admin %s", pk, user_email, request.user.id)
         return Response({"detail": "User deleted successfully."})
 
     except User.DoesNotExist:
@@ -401,6 +409,7 @@ def delete_user(request, pk):
         )
 
 
+@cache_policy("admin")
 @api_view(["GET"])
 @permission_classes([IsAdminUser])
 def get_user_by_id(request, pk):
@@ -443,7 +452,7 @@ def update_user(request, pk):
         user.is_staff = is_admin
 
         user.save()
-        logger.info(f"User updated: {pk} by admin {request.user.id}")
+        logger.info("User updated: %s by admin %s", pk, request.user.id)
 
         serializer = UserSerializer(user, many=False, context={"request": request})
         return Response(serializer.data)
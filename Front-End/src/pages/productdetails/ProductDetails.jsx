@@ -146,6 +146,10 @@ const SkeletonLoader = () => (
     </div>
 );
 
+/** The `cursor` query param of a review page's `next` link (null on the last page) */
+const cursorOf = (nextUrl) =>
+    nextUrl ? new URL(nextUrl, window.location.origin).searchParams.get('cursor') : null;
+
 /** Star rating selector for review form */
 const StarSelector = ({ value, onChange }) => (
     <div className="flex gap-1.5" role="group" aria-label="Select rating">
@@ -197,6 +201,13 @@ const ProductDetails = () => {
     const [reviewLoading, setReviewLoading] = useState(false);
     const [isEditing, setIsEditing] = useState(false);
     const [visibleReviewsCount, setVisibleReviewsCount] = useState(3);
+    // Reviews arrive a page at a time: the product carries the first page,
+    // GET /api/products/:id/reviews/?cursor= the rest
+    const [reviews, setReviews] = useState([]);
+    const [reviewsCursor, setReviewsCursor] = useState(null);
+    const [reviewsLoading, setReviewsLoading] = useState(false);
+    // The logged-in user's own review, wherever it is in the list
+    const [userReview, setUserReview] = useState(null);
 
     // Ref for smooth scroll to review form
     const reviewFormRef = useRef(null);
@@ -223,24 +234,32 @@ const ProductDetails = () => {
             const { data: currentProduct } = await apiService.getProductDetails(slug);
             setProduct(currentProduct);
             setGalleryIndex(0); // reset gallery on product change
+            setReviews(currentProduct.reviews || []);
+            setReviewsCursor(cursorOf(currentProduct.reviews_next));
+            setVisibleReviewsCount(3);
 
-            // Fetch related products from same category
-            if (currentProduct.category) {
+            if (userInfo?.id) {
                 try {
-                    const { data: responseData } = await api.get(
-                        // التعديل هنا: استخدمنا category_slug
-                        `/api/products/?category=${currentProduct.category_slug}`
-                    );
-                    const productsList = responseData.products || responseData || [];
-                    const related = productsList.filter(
-                        (p) =>
-                            String(p.id || p._id) !==
-                            String(currentProduct.id || currentProduct._id)
+                    const { data: ownReviews } = await api.get(
+                        `/api/products/${currentProduct.id}/reviews/`,
+                        { params: { user: userInfo.id } }
                     );
-                    setRelatedProducts(related.slice(0, 4));
-                } catch (relError) {
-                    console.error('Error fetching related products:', relError);
+                    setUserReview(ownReviews.reviews?.[0] ?? null);
+                } catch (ownError) {
+                    console.error('Error fetching your review:', ownError);
                 }
+            } else {
+                setUserReview(null);
+            }
+
+            // Precomputed similar products (content similarity within the category)
+            try {
+                const { data: responseData } = await api.get(
+                    `/api/products/${currentProduct.id}/related/?kind=similar`
+                );
+                setRelatedProducts((responseData.products || []).slice(0, 4));
+            } catch (relError) {
+                console.error('Error fetching related products:', relError);
             }
         } catch (err) {
             console.error('Error fetching product:', err);
@@ -250,7 +269,7 @@ const ProductDetails = () => {
         } finally {
             setLoading(false);
         }
-    }, [slug]);
+    }, [slug, userInfo?.id]);
 
     useEffect(() => {
         fetchProduct();
@@ -376,15 +395,26 @@ const ProductDetails = () => {
     // REVIEW HANDLERS
     // -------------------------------------------------------------------------
 
-    const userReview = useMemo(
-        () =>
-            product?.reviews?.find(
-                (r) =>
-                    String(r.user) === String(userInfo?.id) ||
-                    String(r.user_id) === String(userInfo?.id)
-            ),
-        [product?.reviews, userInfo?.id]
-    );
+    /** Reveal 5 more reviews, fetching the next page when the loaded ones run out */
+    const showMoreReviews = useCallback(async () => {
+        const wanted = visibleReviewsCount + 5;
+        if (wanted > reviews.length && reviewsCursor) {
+            setReviewsLoading(true);
+            try {
+                const { data } = await api.get(`/api/products/${product.id}/reviews/`, {
+                    params: { cursor: reviewsCursor },
+                });
+                setReviews((prev) => [...prev, ...(data.reviews || [])]);
+                setReviewsCursor(cursorOf(data.next));
+            } catch (err) {
+                toast.error(err.response?.data?.detail || 'Failed to load more reviews');
+                return;
+            } finally {
+                setReviewsLoading(false);
+            }
+        }
+        setVisibleReviewsCount(wanted);
+    }, [visibleReviewsCount, reviews.length, reviewsCursor, product?.id]);
 
     const editReviewHandler = useCallback(() => {
         if (userReview) {
@@ -688,7 +718,7 @@ const ProductDetails = () => {
                                 </div>
                                 <span className="w-px h-4 bg-neutral-200 dark:bg-neutral-700" />
                                 <span className="text-sm text-neutral-500 dark:text-neutral-400 group-hover:text-primary transition-colors">
-                                    {product.num_reviews || product.reviews?.length || 0}{' '}
+                                    {product.num_reviews || 0}{' '}
                                     {t('reviews') || 'Reviews'}
                                 </span>
                             </button>
@@ -822,9 +852,9 @@ const ProductDetails = () => {
                         <h2 className="text-2xl md:text-3xl font-bold text-neutral-900 dark:text-white">
                             {t('customerReviews') || 'Customer Reviews'}
                         </h2>
-                        {product.reviews?.length > 0 && (
+                        {product.num_reviews > 0 && (
                             <span className="ml-auto text-sm text-neutral-400 dark:text-neutral-500 font-medium">
-                                {product.reviews.length} review{product.reviews.length !== 1 ? 's' : ''}
+                                {product.num_reviews} review{product.num_reviews !== 1 ? 's' : ''}
                             </span>
                         )}
                     </div>
@@ -955,13 +985,13 @@ const ProductDetails = () => {
 
                         {/* ── Reviews list column ───────────────────────── */}
                         <div className="lg:col-span-7 relative">
-                            {product.reviews && product.reviews.length > 0 ? (
+                            {reviews.length > 0 ? (
                                 <div className="relative">
                                     <motion.div
                                         layout
                                         className="space-y-3 overflow-hidden"
                                     >
-                                        {product.reviews
+                                        {reviews
                                             .slice(0, visibleReviewsCount)
                                             .map((review, index) => {
                                                 const reviewerName =
@@ -1034,17 +1064,20 @@ const ProductDetails = () => {
                                     </motion.div>
 
                                     {/* Fade-out + load more */}
-                                    {product.reviews.length > visibleReviewsCount && (
+                                    {(reviews.length > visibleReviewsCount || reviewsCursor) && (
                                         <div className="absolute bottom-0 left-0 w-full h-36 bg-gradient-to-t from-neutral-50 dark:from-neutral-950 to-transparent flex items-end justify-center pb-3 z-10 pointer-events-none">
                                             <button
-                                                onClick={() =>
-                                                    setVisibleReviewsCount((prev) => prev + 5)
-                                                }
+                                                onClick={showMoreReviews}
+                                                disabled={reviewsLoading}
                                                 className="pointer-events-auto bg-white dark:bg-neutral-900 text-primary dark:text-white font-semibold py-2.5 px-7 rounded-full shadow-lg border border-neutral-200 dark:border-neutral-700 hover:bg-neutral-50 dark:hover:bg-neutral-800 hover:scale-105 transition-all flex items-center gap-2 text-sm"
                                             >
                                                 Show more reviews
                                                 <span className="bg-primary/10 text-primary dark:bg-white/10 dark:text-white px-2 py-0.5 rounded-full text-xs font-bold">
-                                                    +{product.reviews.length - visibleReviewsCount}
+                                                    +{Math.max(
+                                                        (product.num_reviews || reviews.length) -
+                                                            visibleReviewsCount,
+                                                        0
+                                                    )}
                                                 </span>
                                             </button>
                                         </div>
@@ -1052,7 +1085,8 @@ const ProductDetails = () => {
 
                                     {/* Collapse all */}
                                     {visibleReviewsCount > 3 &&
-                                        visibleReviewsCount >= product.reviews.length && (
+                                        visibleReviewsCount >= reviews.length &&
+                                        !reviewsCursor && (
                                             <div className="flex justify-center mt-6">
                                                 <button
                                                     onClick={() => {